@@ -3,19 +3,30 @@ Flask Backend for Sentiment Classification App
 Enhanced version with logging, better error handling, and input validation
 """
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
 from flask_cors import CORS
 import os
+import itertools
+import json
 import logging
-import pandas as pd
 from datetime import datetime
+from sqlalchemy import text
 from backend.extensions import db, jwt, limiter
 from backend.routes.auth import auth_bp
+from backend.routes.jobs import export_response, jobs_bp
+from backend.services.jobs import job_manager
 from backend.models.models import Analysis
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, jwt_required
-from backend.services.model_loader import predict_sentiment_bert, predict_aspect_sentiment, is_model_loaded, reload_model
+from backend.services.model_loader import dedup_stats, predict_sentiment_many, predict_with_aspects, is_model_loaded, reload_model, get_batcher_stats, get_cache_stats, get_cascade_stats, get_model_status, start_background_load
 from backend.services.scraper import get_youtube_comments
-from backend.scripts.train import train
+from backend.services.history_writer import WRITE_BEHIND_ENABLED, history_query, history_writer
+from backend.services.sqlite_profile import apply_sqlite_profile
+from backend.services import stats_rollups, term_index
+from backend.services.stats_rollups import CORRECTION, TREND_BUCKETS, user_totals, user_trend
+from backend.services.term_index import ALL_SENTIMENTS, SENTIMENTS, top_terms
+from backend.services.near_duplicates import NEAR_DEDUP_ENABLED, classify_clustered, cluster_summary
+from backend.services.batch_processing import EXPORT_FORMATS, BatchAggregator, classify_chunk, export_frame, \
+    find_columns, iter_upload_chunks, results_to_records, spool_upload, validate_upload
 import threading
 
 # Configure logging
@@ -34,7 +45,7 @@ app = Flask(__name__)
 CORS(app)  # Enable CORS for API access
 
 # Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///sentiment.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SENTIMENT_DATABASE_URI', 'sqlite:///sentiment.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = 'super-secret-key-change-this-in-production'
 
@@ -52,14 +63,83 @@ limiter.init_app(app)
 
 # Register Blueprints
 app.register_blueprint(auth_bp)
+app.register_blueprint(jobs_bp)
+job_manager.init_app(app)
+history_writer.init_app(app)
 
 # Create Database Tables
 with app.app_context():
+    # Connection PRAGMAs (WAL, busy timeout, ...) must be registered before the first connection opens
+    apply_sqlite_profile(db.engine)
     db.create_all()
+    # Databases from before the stats rollups or the term index existed: fill them once from analyses
+    stats_rollups.backfill_if_empty(db.engine)
+    term_index.backfill_if_empty(db.engine)
 
 # Configuration constants
 MIN_TEXT_LENGTH = 10
 MAX_TEXT_LENGTH = 1000
+BULK_MAX_ITEMS = 1000
+BATCH_MAX_ROWS = 1000
+BATCH_STREAM_CHUNK_ROWS = 256
+TREND_MAX_DAYS = 366
+
+# Load and warm the model in the background at import time (for WSGI servers)
+EAGER_MODEL_LOAD = os.environ.get('SENTIMENT_EAGER_LOAD', '0') == '1'
+
+def get_batch_upload():
+    """
+    Validate the uploaded batch file
+    Returns: (file, None) or (None, error response)
+    """
+    file, message = validate_upload(request.files)
+    if message:
+        return None, (jsonify({'status': 'error', 'message': message}), 400)
+    return file, None
+
+def validate_text_input(text_input):
+    """
+    Validate a single text input against the classification limits
+    Returns: error message, or None if the text is valid
+    """
+    if not isinstance(text_input, str) or text_input.strip() == '':
+        return 'Teks tidak boleh kosong'
+
+    text_length = len(text_input.strip())
+    if text_length < MIN_TEXT_LENGTH:
+        return f'Teks terlalu pendek (minimal {MIN_TEXT_LENGTH} karakter)'
+    if text_length > MAX_TEXT_LENGTH:
+        return f'Teks terlalu panjang (maksimal {MAX_TEXT_LENGTH} karakter)'
+    return None
+
+def get_near_dedup(data):
+    """
+    Read the optional near_dedup flag of a scrape request; strings such as "false" are rejected
+    Returns: (flag, None) or (None, error response)
+    """
+    near_dedup = data.get('near_dedup', NEAR_DEDUP_ENABLED)
+    if not isinstance(near_dedup, bool):
+        return None, (jsonify({'status': 'error', 'message': 'near_dedup harus berupa boolean (true/false)'}), 400)
+    return near_dedup, None
+
+def classify_comments(comments, near_dedup=False):
+    """
+    Classify scraped comments; with near_dedup, near-identical variants (spam,
+    copy-pasted reviews) are clustered and only one comment per cluster is classified
+    Returns: (predictions, representatives or None, dedup stats)
+    """
+    if not near_dedup:
+        predictions, dedup = predict_sentiment_many(comments, with_stats=True)
+        return predictions, None, dedup
+
+    unique_counts = []
+    def predict(texts):
+        predictions, stats = predict_sentiment_many(texts, with_stats=True)
+        unique_counts.append(stats['unique_texts'])
+        return predictions
+
+    predictions, representatives = classify_clustered(comments, predict)
+    return predictions, representatives, dedup_stats(len(comments), sum(unique_counts))
 
 @app.route('/')
 def index():
@@ -84,6 +164,7 @@ def classify_sentiment():
     Returns JSON format:
     {
         "status": "success",
+        "analysis_id": 42,  (null when not logged in or the history save failed)
         "sentiment": "Positif/Negatif/Netral",
         "text_length": 123
     }
@@ -149,17 +230,18 @@ def classify_sentiment():
         # Log the analysis
         logger.info(f"Analyzing text ({text_length} characters): {text_input[:100]}...")
         
-        # Get sentiment prediction
-        sentiment, confidence = predict_sentiment_bert(text_input)
-        
-        # Get aspect-based sentiment
-        aspects = predict_aspect_sentiment(text_input)
+        # Get overall and aspect-based sentiment in one model call
+        sentiment, confidence, aspects = predict_with_aspects(text_input)
         
         # Save to DB if authenticated
+        analysis_id = None
         try:
             verify_jwt_in_request(optional=True)
             current_user_id = get_jwt_identity()
-            if current_user_id:
+            if current_user_id and WRITE_BEHIND_ENABLED:
+                # Group-committed by the background writer; the id is reserved up front
+                analysis_id = history_writer.enqueue(current_user_id, text_input, sentiment, confidence)
+            elif current_user_id:
                 analysis = Analysis(
                     user_id=current_user_id,
                     text=text_input,
@@ -168,6 +250,7 @@ def classify_sentiment():
                 )
                 db.session.add(analysis)
                 db.session.commit()
+                analysis_id = analysis.id
                 logger.info(f"Analysis saved for user {current_user_id}")
         except Exception as e:
             logger.warning(f"Failed to save analysis history: {e}")
@@ -176,6 +259,7 @@ def classify_sentiment():
         # Return successful response
         response = {
             'status': 'success',
+            'analysis_id': analysis_id,
             'sentiment': sentiment,
             'confidence': confidence,
             'aspects': aspects,
@@ -202,6 +286,96 @@ def classify_sentiment():
         }), 500
 
 
+@app.route('/api/classify/bulk', methods=['POST'])
+def classify_bulk():
+    """
+    API endpoint to classify many texts in one call
+    Accepts either a JSON array or {"items": [...]}; each item is a string
+    or an object {"id": "optional-client-id", "text": "Your text here"}
+    
+    Returns JSON format:
+    {
+        "status": "success",
+        "results": [{"index": 0, "id": ..., "status": "success", "sentiment": ..., "confidence": ...}, ...],
+        "total": 2, "succeeded": 1, "failed": 1,
+        "dedup": {"texts": 1, "unique_texts": 1, "dedup_ratio": 0.0}
+    }
+    
+    Invalid items get {"status": "error", "message": ...} in their slot and
+    do not fail the rest of the request.
+    """
+    try:
+        if not request.is_json:
+            return jsonify({
+                'status': 'error',
+                'message': 'Content-Type harus application/json'
+            }), 400
+
+        data = request.get_json(silent=True)
+        items = data.get('items') if isinstance(data, dict) else data
+
+        if not isinstance(items, list) or not items:
+            return jsonify({
+                'status': 'error',
+                'message': 'Body harus berupa array teks atau {"items": [...]}'
+            }), 400
+
+        if len(items) > BULK_MAX_ITEMS:
+            return jsonify({
+                'status': 'error',
+                'message': f'Terlalu banyak item (maksimal {BULK_MAX_ITEMS} per request)'
+            }), 400
+
+        logger.info(f"Received bulk classification request ({len(items)} items) from {request.remote_addr}")
+
+        results = []
+        valid_indices = []
+        valid_texts = []
+
+        for index, item in enumerate(items):
+            item_id = None
+            text_input = item
+            if isinstance(item, dict):
+                item_id = item.get('id')
+                text_input = item.get('text', item.get('text_input'))
+
+            entry = {'index': index, 'id': item_id}
+            error = validate_text_input(text_input)
+            if error:
+                entry.update({'status': 'error', 'message': error})
+            else:
+                valid_indices.append(index)
+                valid_texts.append(text_input.strip())
+            results.append(entry)
+
+        predictions, dedup = predict_sentiment_many(valid_texts, with_stats=True)
+
+        for index, text_input, (sentiment, confidence) in zip(valid_indices, valid_texts, predictions):
+            results[index].update({
+                'status': 'success',
+                'sentiment': sentiment,
+                'confidence': confidence,
+                'text_length': len(text_input)
+            })
+
+        return jsonify({
+            'status': 'success',
+            'results': results,
+            'total': len(results),
+            'succeeded': len(valid_texts),
+            'failed': len(results) - len(valid_texts),
+            'dedup': dedup,
+            'timestamp': datetime.now().isoformat()
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Bulk classification error: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': 'Terjadi kesalahan pada server. Silakan coba lagi.'
+        }), 500
+
+
 @app.route('/api/history', methods=['GET'])
 @jwt_required()
 def get_history():
@@ -212,9 +386,7 @@ def get_history():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     
-    pagination = Analysis.query.filter_by(user_id=current_user_id)\
-        .order_by(Analysis.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
+    pagination = history_query(current_user_id).paginate(page=page, per_page=per_page, error_out=False)
         
     history = [item.to_dict() for item in pagination.items]
     
@@ -231,53 +403,27 @@ def get_history():
 @jwt_required()
 def get_sentiment_trend():
     """
-    Get daily sentiment counts for the last 7 days
+    Get sentiment counts per day (or per week with ?bucket=week) for the last
+    ?days= days (default 7, at most TREND_MAX_DAYS), read from the daily rollup
     """
     current_user_id = get_jwt_identity()
-    from sqlalchemy import func, text
-    from datetime import timedelta
-    
-    # Calculate date 7 days ago
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    
-    # Query to group by date and sentiment
-    # SQLite-specific date formatting
-    results = db.session.query(
-        func.date(Analysis.created_at).label('date'),
-        Analysis.sentiment,
-        func.count(Analysis.id)
-    ).filter(
-        Analysis.user_id == current_user_id,
-        Analysis.created_at >= seven_days_ago
-    ).group_by(
-        func.date(Analysis.created_at),
-        Analysis.sentiment
-    ).all()
-    
-    # Process results
-    dates = []
-    # Create a map for easy lookup
-    data_map = {}
-    
-    # Initialize last 7 days
-    for i in range(7):
-        d = (seven_days_ago + timedelta(days=i+1)).strftime('%Y-%m-%d')
-        dates.append(d)
-        data_map[d] = {'Positif': 0, 'Negatif': 0, 'Netral': 0}
-        
-    for r in results:
-        date_str = r[0]
-        sentiment = r[1]
-        count = r[2]
-        if date_str in data_map:
-            data_map[date_str][sentiment] = count
+    days = request.args.get('days', 7, type=int)
+    bucket = request.args.get('bucket', 'day')
+    if not days or not 1 <= days <= TREND_MAX_DAYS:
+        return jsonify({'status': 'error', 'message': f'Rentang hari harus 1-{TREND_MAX_DAYS}'}), 400
+    if bucket not in TREND_BUCKETS:
+        return jsonify({'status': 'error', 'message': f"Bucket harus salah satu dari: {', '.join(TREND_BUCKETS)}"}), 400
+
+    dates, data_map = user_trend(current_user_id, days=days, bucket=bucket)
             
     # Format for Chart.js
     response = {
         'dates': dates,
-        'positive': [data_map[d]['Positif'] for d in dates],
-        'negative': [data_map[d]['Negatif'] for d in dates],
-        'neutral': [data_map[d]['Netral'] for d in dates]
+        'positive': [data_map[d].get('Positif', 0) for d in dates],
+        'negative': [data_map[d].get('Negatif', 0) for d in dates],
+        'neutral': [data_map[d].get('Netral', 0) for d in dates],
+        'days': days,
+        'bucket': bucket
     }
     
     return jsonify(response), 200
@@ -288,21 +434,19 @@ def get_sentiment_trend():
 def get_sentiment_summary():
     """
     Get summary stats (Total, Positive, Negative) for the dashboard
+    Read from the materialized per-user totals; corrections counts user feedback by label.
     """
     current_user_id = get_jwt_identity()
     
-    # Get all analyses for the user
-    total = Analysis.query.filter_by(user_id=current_user_id).count()
-    positive = Analysis.query.filter_by(user_id=current_user_id, sentiment='Positif').count()
-    negative = Analysis.query.filter_by(user_id=current_user_id, sentiment='Negatif').count()
-    neutral = Analysis.query.filter_by(user_id=current_user_id, sentiment='Netral').count()
+    totals = user_totals(current_user_id)
     
     return jsonify({
         'status': 'success',
-        'total': total,
-        'positive': positive,
-        'negative': negative,
-        'neutral': neutral
+        'total': sum(totals.values()),
+        'positive': totals.get('Positif', 0),
+        'negative': totals.get('Negatif', 0),
+        'neutral': totals.get('Netral', 0),
+        'corrections': user_totals(current_user_id, kind=CORRECTION)
     }), 200
 
 
@@ -311,44 +455,19 @@ def get_sentiment_summary():
 def get_wordcloud_data():
     """
     Get word frequency for word cloud
+    Optional ?sentiment=Positif|Negatif|Netral limits it to one sentiment.
+    Served from the incrementally maintained term index (backend.services.term_index).
     """
     current_user_id = get_jwt_identity()
-    import re
-    from collections import Counter
-    
-    # Get all text from user's history
-    analyses = Analysis.query.filter_by(user_id=current_user_id).all()
-    
-    if not analyses:
-        return jsonify([]), 200
-        
-    all_text = " ".join([a.text.lower() for a in analyses])
-    
-    # Simple tokenization and cleanup
-    # Remove non-alphanumeric characters
-    words = re.findall(r'\w+', all_text)
-    
-    # Indonesian Stopwords (Basic list)
-    stopwords = set([
-        'yang', 'di', 'dan', 'itu', 'dengan', 'untuk', 'tidak', 'ini', 'dari',
-        'dalam', 'akan', 'pada', 'juga', 'saya', 'ke', 'karena', 'tersebut',
-        'bisa', 'ada', 'mereka', 'lebih', 'sudah', 'atau', 'saat', 'oleh',
-        'sebagai', 'adalah', 'apa', 'kita', 'kamu', 'dia', 'anda', 'aku',
-        'sangat', 'tapi', 'namun', 'jika', 'kalau', 'maka', 'sehingga',
-        'banyak', 'sedikit', 'kurang', 'cukup', 'paling', 'seperti', 'hanya'
-    ])
-    
-    # Filter words
-    filtered_words = [w for w in words if w not in stopwords and len(w) > 3]
-    
-    # Count frequency
-    word_counts = Counter(filtered_words)
+    sentiment = request.args.get('sentiment', ALL_SENTIMENTS)
+    if sentiment not in SENTIMENTS and sentiment != ALL_SENTIMENTS:
+        return jsonify({'status': 'error', 'message': f"Sentimen tidak valid: {sentiment}"}), 400
     
     # Format for word cloud library (e.g., [{text: 'word', weight: 10}])
     # Return top 50
     result = [
-        {'text': word, 'weight': count} 
-        for word, count in word_counts.most_common(50)
+        {'text': term, 'weight': count}
+        for term, count in top_terms(current_user_id, sentiment, limit=50)
     ]
     
     return jsonify(result), 200
@@ -365,6 +484,9 @@ def scrape_youtube():
         
         if not url:
             return jsonify({'status': 'error', 'message': 'URL is required'}), 400
+        near_dedup, error = get_near_dedup(data)
+        if error:
+            return error
             
         logger.info(f"Scraping YouTube URL: {url}")
         
@@ -378,25 +500,33 @@ def scrape_youtube():
         results = []
         stats = {'Positif': 0, 'Negatif': 0, 'Netral': 0}
         
-        for comment in comments:
-            if len(comment) < 3:
-                continue
-                
-            sentiment, confidence = predict_sentiment_bert(comment)
-            
-            results.append({
+        comments = [comment for comment in comments if len(comment) >= 3]
+        predictions, representatives, dedup = classify_comments(comments, near_dedup)
+        
+        for i, (comment, (sentiment, confidence)) in enumerate(zip(comments, predictions)):
+            result = {
                 'text': comment,
                 'sentiment': sentiment,
                 'confidence': confidence
-            })
-            stats[sentiment] += 1
+            }
+            if representatives is not None:
+                result['cluster'] = representatives[i]
+                result['inferred'] = representatives[i] != i
+            results.append(result)
+            # Near-duplicates reuse their cluster's label and are counted once in the stats
+            if representatives is None or representatives[i] == i:
+                stats[sentiment] += 1
             
-        return jsonify({
+        response = {
             'status': 'success',
             'results': results,
             'stats': stats,
-            'total': len(results)
-        }), 200
+            'total': len(results),
+            'dedup': dedup
+        }
+        if representatives is not None:
+            response['near_duplicates'] = cluster_summary(comments, predictions, representatives)
+        return jsonify(response), 200
         
     except Exception as e:
         logger.error(f"YouTube scraping error: {e}")
@@ -416,16 +546,22 @@ def brand_battle():
         if not url_a or not url_b:
             return jsonify({'status': 'error', 'message': 'Both URLs are required'}), 400
             
+        near_dedup, error = get_near_dedup(data)
+        if error:
+            return error
+
         # Helper function to analyze a single URL
         def analyze_url(url):
             comments = get_youtube_comments(url, limit=30) # Limit 30 for speed
             if not comments: return None
             
             stats = {'Positif': 0, 'Negatif': 0, 'Netral': 0}
-            for comment in comments:
-                if len(comment) < 3: continue
-                sentiment, _ = predict_sentiment_bert(comment)
-                stats[sentiment] += 1
+            comments = [comment for comment in comments if len(comment) >= 3]
+            predictions, representatives, dedup = classify_comments(comments, near_dedup)
+            for i, (sentiment, _) in enumerate(predictions):
+                # Spam variants count once, so a flood of copies does not skew the comparison
+                if representatives is None or representatives[i] == i:
+                    stats[sentiment] += 1
             
             total = sum(stats.values())
             positive_pct = round((stats['Positif'] / total * 100), 1) if total > 0 else 0
@@ -433,7 +569,10 @@ def brand_battle():
             return {
                 'stats': stats,
                 'total': total,
-                'positive_pct': positive_pct
+                'positive_pct': positive_pct,
+                'dedup': dedup,
+                'near_duplicates': cluster_summary(comments, predictions, representatives)
+                if representatives is not None else None
             }
             
         # Analyze both
@@ -496,18 +635,14 @@ def save_youtube_analysis():
         except Exception:
             pass  # Not authenticated
         
-        # Save to database using raw SQL
-        import json
-        conn = db.engine.raw_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        # saved_youtube_analysis has no model; plain SQL on the pooled session
+        result = db.session.execute(text("""
             INSERT INTO saved_youtube_analysis (user_id, label, video_url, analysis_data, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (user_id, label, video_url, json.dumps(analysis_data), datetime.now()))
-        conn.commit()
-        saved_id = cursor.lastrowid
-        cursor.close()
-        conn.close()
+            VALUES (:user_id, :label, :video_url, :analysis_data, :created_at)
+        """), {'user_id': user_id, 'label': label, 'video_url': video_url,
+               'analysis_data': json.dumps(analysis_data), 'created_at': datetime.now()})
+        db.session.commit()
+        saved_id = result.lastrowid
         
         return jsonify({
             'status': 'success',
@@ -532,28 +667,22 @@ def get_saved_youtube():
         except Exception:
             pass
         
-        conn = db.engine.raw_connection()
-        cursor = conn.cursor()
         if user_id:
-            cursor.execute("""
+            rows = db.session.execute(text("""
                 SELECT id, label, video_url, created_at
                 FROM saved_youtube_analysis
-                WHERE user_id = ?
+                WHERE user_id = :user_id
                 ORDER BY created_at DESC
                 LIMIT 10
-            """, (user_id,))
+            """), {'user_id': user_id}).all()
         else:
-            cursor.execute("""
+            rows = db.session.execute(text("""
                 SELECT id, label, video_url, created_at
                 FROM saved_youtube_analysis
                 WHERE user_id IS NULL
                 ORDER BY created_at DESC
                 LIMIT 10
-            """)
-        
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
+            """)).all()
 
         saved = [{
             'id': row[0],
@@ -574,169 +703,50 @@ def batch_classify():
     """
     Classify sentiment for a batch of texts from CSV/Excel file
     Enhanced with product grouping for UMKM
+    Reads at most BATCH_MAX_ROWS rows; use /api/batch-classify/stream for larger files
     """
     try:
-        if 'file' not in request.files:
-            return jsonify({'status': 'error', 'message': 'No file part'}), 400
-            
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'status': 'error', 'message': 'No selected file'}), 400
-            
-        if not (file.filename.endswith('.csv') or file.filename.endswith('.xlsx')):
-            return jsonify({'status': 'error', 'message': 'File must be CSV or Excel'}), 400
-            
-        # Read file
+        file, error = get_batch_upload()
+        if error:
+            return error
+
+        chunks = iter_upload_chunks(file, file.filename)
         try:
-            if file.filename.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-        except Exception as e:
-            return jsonify({'status': 'error', 'message': f'Error reading file: {str(e)}'}), 400
-            
-        # Find text column
-        text_col = None
-        possible_cols = ['text', 'review', 'content', 'komentar', 'ulasan', 'comment']
-        
-        for col in df.columns:
-            if col.lower() in possible_cols:
-                text_col = col
-                break
-                
-        if not text_col:
-            # If no matching column, take the first string column
-            for col in df.columns:
-                if df[col].dtype == 'object':
-                    text_col = col
+            try:
+                first_chunk = next(chunks, None)
+            except Exception as e:
+                return jsonify({'status': 'error', 'message': f'Error reading file: {str(e)}'}), 400
+
+            text_col, product_col = find_columns(first_chunk) if first_chunk is not None else (None, None)
+            if not text_col:
+                 return jsonify({'status': 'error', 'message': 'Could not find a text column in the file'}), 400
+
+            results = []
+            aggregator = BatchAggregator(has_products=product_col is not None)
+            rows_read = 0
+            truncated = False
+            for chunk in itertools.chain([first_chunk], chunks):
+                # Limit rows for performance
+                if rows_read + len(chunk) > BATCH_MAX_ROWS:
+                    chunk = chunk.head(BATCH_MAX_ROWS - rows_read)
+                    truncated = True
+                rows_read += len(chunk)
+
+                chunk_results = classify_chunk(chunk, text_col, product_col)
+                aggregator.add(chunk_results)
+                results.extend(results_to_records(chunk_results))
+                if truncated:
                     break
-                    
-        if not text_col:
-             return jsonify({'status': 'error', 'message': 'Could not find a text column in the file'}), 400
-        
-        # Check for Product column (NEW)
-        product_col = None
-        possible_product_cols = ['product', 'produk', 'nama produk', 'product name', 'item']
-        
-        for col in df.columns:
-            if col.lower() in possible_product_cols:
-                product_col = col
-                break
-             
-        # Limit rows for performance
-        if len(df) > 1000:
-            df = df.head(1000)
-            
-        results = []
-        stats = {'Positif': 0, 'Negatif': 0, 'Netral': 0}
-        product_stats = {}  # NEW: Track stats per product
-        product_reviews = {}  # NEW: Store reviews per product for insights
-        
-        for index, row in df.iterrows():
-            text = str(row[text_col])
-            if len(text) < 3:
-                continue
-                
-            sentiment, confidence = predict_sentiment_bert(text)
-            
-            result_item = {
-                'text': text,
-                'sentiment': sentiment,
-                'confidence': confidence,
-                'original_row': index
-            }
-            
-            # Add product info if available (NEW)
-            if product_col:
-                product = str(row[product_col])
-                result_item['product'] = product
-                
-                # Initialize product stats if not exists
-                if product not in product_stats:
-                    product_stats[product] = {'Positif': 0, 'Negatif': 0, 'Netral': 0, 'total': 0}
-                    product_reviews[product] = {'positive': [], 'negative': []}
-                
-                # Update product stats
-                product_stats[product][sentiment] += 1
-                product_stats[product]['total'] += 1
-                
-                # Store reviews for insights generation
-                if sentiment == 'Positif':
-                    product_reviews[product]['positive'].append(text.lower())
-                elif sentiment == 'Negatif':
-                    product_reviews[product]['negative'].append(text.lower())
-            
-            results.append(result_item)
-            stats[sentiment] += 1
-        
-        # Generate Smart Insights (NEW)
-        insights = []
-        if product_col and product_stats:
-            # Calculate percentage for each product
-            for product, pstats in product_stats.items():
-                total = pstats['total']
-                if total > 0:
-                    pos_pct = round((pstats['Positif'] / total) * 100)
-                    neg_pct = round((pstats['Negatif'] / total) * 100)
-                    pstats['positive_pct'] = pos_pct
-                    pstats['negative_pct'] = neg_pct
-            
-            # Find best performing product
-            best_product = max(product_stats.items(), key=lambda x: x[1]['positive_pct'])
-            insights.append({
-                'type': 'success',
-                'icon': '🌟',
-                'title': 'Produk Terbaik',
-                'message': f"{best_product[0]} memiliki {best_product[1]['positive_pct']}% review positif!"
-            })
-            
-            # Find worst performing product
-            worst_product = max(product_stats.items(), key=lambda x: x[1]['negative_pct'])
-            if worst_product[1]['negative_pct'] > 30:
-                insights.append({
-                    'type': 'warning',
-                    'icon': '⚠️',
-                    'title': 'Perlu Perhatian',
-                    'message': f"{worst_product[0]} mendapat {worst_product[1]['negative_pct']}% review negatif. Perlu ditingkatkan."
-                })
-            
-            # Extract common keywords from negative reviews
-            all_negative_text = ' '.join([rev for reviews in product_reviews.values() for rev in reviews['negative']])
-            if all_negative_text:
-                # Simple keyword extraction
-                import re
-                from collections import Counter
-                words = re.findall(r'\w+', all_negative_text)
-                # Filter stopwords and common words
-                stopwords = {'yang', 'dan', 'di', 'tidak', 'ini', 'ke', 'untuk', 'dari', 'dengan', 'saya', 'nya'}
-                keywords = [w for w in words if w not in stopwords and len(w) > 3]
-                common_issues = Counter(keywords).most_common(3)
-                
-                if common_issues:
-                    issue_keywords = ', '.join([f'"{word}"' for word, count in common_issues])
-                    insights.append({
-                        'type': 'info',
-                        'icon': '💡',
-                        'title': 'Keluhan Umum',
-                        'message': f'Kata yang sering muncul di review negatif: {issue_keywords}'
-                    })
-            
+        finally:
+            chunks.close()
+
         response = {
             'status': 'success',
             'results': results,
-            'stats': stats,
-            'total': len(results),
-            'filename': file.filename
+            'filename': file.filename,
+            'truncated': truncated
         }
-        
-        # Add product-specific data if available (NEW)
-        if product_col:
-            response['has_products'] = True
-            response['product_stats'] = product_stats
-            response['insights'] = insights
-        else:
-            response['has_products'] = False
-        
+        response.update(aggregator.summary())
         return jsonify(response), 200
         
     except Exception as e:
@@ -744,6 +754,100 @@ def batch_classify():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+@app.route('/api/batch-classify/stream', methods=['POST'])
+def batch_classify_stream():
+    """
+    Classify a CSV/Excel file of any size, streaming NDJSON as chunks finish
+    Lines: {"type": "meta"}, one {"type": "results"} per chunk with the running
+    stats, then {"type": "summary"} with product stats and insights
+    (or {"type": "error"} if the file breaks part way through)
+    """
+    file, error = get_batch_upload()
+    if error:
+        return error
+
+    filename = file.filename
+    upload = spool_upload(file)
+    chunks = iter_upload_chunks(upload, filename, chunk_rows=BATCH_STREAM_CHUNK_ROWS)
+    try:
+        first_chunk = next(chunks, None)
+    except Exception as e:
+        chunks.close()
+        upload.close()
+        return jsonify({'status': 'error', 'message': f'Error reading file: {str(e)}'}), 400
+
+    text_col, product_col = find_columns(first_chunk) if first_chunk is not None else (None, None)
+    if not text_col:
+        chunks.close()
+        upload.close()
+        return jsonify({'status': 'error', 'message': 'Could not find a text column in the file'}), 400
+
+    def generate():
+        aggregator = BatchAggregator(has_products=product_col is not None)
+        try:
+            yield json.dumps({'type': 'meta', 'filename': filename, 'text_column': str(text_col),
+                              'product_column': str(product_col) if product_col else None}) + '\n'
+            for chunk in itertools.chain([first_chunk], chunks):
+                chunk_results = classify_chunk(chunk, text_col, product_col)
+                aggregator.add(chunk_results)
+                yield json.dumps({'type': 'results', 'results': results_to_records(chunk_results),
+                                  'stats': aggregator.stats, 'total': aggregator.total,
+                                  'unique_texts': aggregator.unique_texts}) + '\n'
+        except Exception as e:
+            logger.error(f"Streaming batch analysis error: {e}")
+            yield json.dumps({'type': 'error', 'message': str(e)}) + '\n'
+            return
+        finally:
+            chunks.close()
+            upload.close()
+
+        summary = aggregator.summary()
+        summary.update({'type': 'summary', 'status': 'success', 'filename': filename})
+        yield json.dumps(summary) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+@app.route('/api/batch-classify/export', methods=['POST'])
+def batch_classify_export():
+    """
+    Classify a CSV/Excel file of any size and download the uploaded rows with
+    sentiment and confidence joined on, as streamed CSV (default), Parquet or Arrow (?format=)
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': f"Unknown format '{fmt}' (use {', '.join(EXPORT_FORMATS)})"}), 400
+    file, error = get_batch_upload()
+    if error:
+        return error
+
+    filename = file.filename
+    upload = spool_upload(file)
+    chunks = iter_upload_chunks(upload, filename, chunk_rows=BATCH_STREAM_CHUNK_ROWS)
+    try:
+        first_chunk = next(chunks, None)
+    except Exception as e:
+        chunks.close()
+        upload.close()
+        return jsonify({'status': 'error', 'message': f'Error reading file: {str(e)}'}), 400
+
+    text_col, product_col = find_columns(first_chunk) if first_chunk is not None else (None, None)
+    if not text_col:
+        chunks.close()
+        upload.close()
+        return jsonify({'status': 'error', 'message': 'Could not find a text column in the file'}), 400
+
+    def frames():
+        try:
+            for chunk in itertools.chain([first_chunk], chunks):
+                yield export_frame(chunk, classify_chunk(chunk, text_col, product_col))
+        finally:
+            chunks.close()
+            upload.close()
+
+    return export_response(frames(), fmt, filename)
+
+
 @app.route('/api/feedback/<int:analysis_id>', methods=['POST'])
 @jwt_required()
 def submit_feedback(analysis_id):
@@ -757,15 +861,21 @@ def submit_feedback(analysis_id):
         if not correction or correction not in ['Positif', 'Negatif', 'Netral']:
             return jsonify({'status': 'error', 'message': 'Invalid correction label'}), 400
             
+        # Feedback may arrive before a write-behind row reaches the database, and
+        # with several workers the row may sit in another worker's buffer
+        if WRITE_BEHIND_ENABLED:
+            history_writer.wait_for_row(analysis_id)
+
         analysis = Analysis.query.get(analysis_id)
         if not analysis:
             return jsonify({'status': 'error', 'message': 'Analysis not found'}), 404
             
-        # Ensure user owns this analysis
+        # Ensure user owns this analysis (the JWT identity is the user id as a string)
         current_user_id = get_jwt_identity()
-        if analysis.user_id != current_user_id:
+        if str(analysis.user_id) != current_user_id:
             return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
             
+        # The stats rollups pick the correction up in the same commit (backend.services.stats_rollups)
         analysis.correction = correction
         db.session.commit()
         
@@ -816,6 +926,8 @@ def upload_train_data():
             
             try:
                 logger.info("Starting background training...")
+                # Imported here so the app never loads the training stack (torch, datasets) until it is used
+                from backend.scripts.train import train
                 train(data_path=filepath)
                 logger.info("Background training completed.")
                 
@@ -854,14 +966,44 @@ def get_training_status():
 def health_check():
     """
     Health check endpoint to verify server is running
+    'live' means the process is serving; 'ready' means the model is loaded and warm
     """
+    model_status = get_model_status()
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'model_loaded': is_model_loaded()
+        'live': model_status['live'],
+        'ready': model_status['ready'],
+        'model_loaded': is_model_loaded(),
+        'model': model_status,
+        'batching': get_batcher_stats(),
+        'cache': get_cache_stats(),
+        'cascade': get_cascade_stats(),
+        'history_writer': history_writer.stats() if WRITE_BEHIND_ENABLED else {'enabled': False}
     }), 200
 
 
+@app.route('/api/health/live', methods=['GET'])
+def liveness_check():
+    """
+    Liveness probe: the process is up and answering requests
+    """
+    return jsonify({'status': 'alive', 'timestamp': datetime.now().isoformat()}), 200
+
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """
+    Readiness probe: 200 once the model is loaded and warmed up, 503 before that
+    """
+    model_status = get_model_status()
+    return jsonify({
+        'status': 'ready' if model_status['ready'] else model_status['state'],
+        'timestamp': datetime.now().isoformat(),
+        'model': model_status
+    }), 200 if model_status['ready'] else 503
+
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -890,6 +1032,10 @@ def internal_error(error):
     }), 500
 
 
+if EAGER_MODEL_LOAD and __name__ != '__main__':
+    start_background_load()
+
+
 if __name__ == '__main__':
     logger.info("\n" + "="*50)
     logger.info("Starting Sentiment Classification Application")
@@ -898,4 +1044,8 @@ if __name__ == '__main__':
     logger.info(f"Character limits: {MIN_TEXT_LENGTH}-{MAX_TEXT_LENGTH}")
     logger.info("="*50 + "\n")
     
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_load()
+    
     app.run(debug=True, host='127.0.0.1', port=5000)
@@ -1,4 +1,5 @@
 from backend.extensions import db
+import json
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -29,6 +30,14 @@ class User(db.Model):
 
 class Analysis(db.Model):
     __tablename__ = 'analyses'
+    # Keep in step with backend/scripts/migrate_indexes.py, which adds these to existing databases
+    __table_args__ = (
+        db.Index('ix_analyses_user_created', 'user_id', 'created_at'),
+        db.Index('ix_analyses_user_sentiment', 'user_id', 'sentiment'),
+        # Only corrected rows, for the training data query and per-user feedback lookups
+        db.Index('ix_analyses_corrected', 'user_id', 'correction',
+                 sqlite_where=db.text('correction IS NOT NULL'), postgresql_where=db.text('correction IS NOT NULL')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -47,3 +56,125 @@ class Analysis(db.Model):
             'correction': self.correction,
             'created_at': self.created_at.isoformat()
         }
+
+class IdAllocation(db.Model):
+    __tablename__ = 'id_allocations'
+    # Next unreserved primary key per table, for ids handed out before the row is written
+    # (backend.services.history_writer)
+
+    name = db.Column(db.String(50), primary_key=True)
+    next_id = db.Column(db.Integer, nullable=False)
+
+class TermFrequency(db.Model):
+    __tablename__ = 'term_frequencies'
+    # Maintained by backend.services.term_index; sentiment is a label or 'ALL' for the whole history
+    __table_args__ = (db.Index('ix_term_frequencies_top', 'user_id', 'sentiment', 'count'),)
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    sentiment = db.Column(db.String(20), primary_key=True)
+    term = db.Column(db.String(255), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class SentimentTotal(db.Model):
+    __tablename__ = 'sentiment_totals'
+    # Maintained by backend.services.stats_rollups; kind is 'sentiment' or 'correction'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    kind = db.Column(db.String(20), primary_key=True)
+    label = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class DailySentimentCount(db.Model):
+    __tablename__ = 'daily_sentiment_counts'
+    # Maintained by backend.services.stats_rollups; day is the UTC date of created_at (YYYY-MM-DD)
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    kind = db.Column(db.String(20), primary_key=True)
+    day = db.Column(db.String(10), primary_key=True)
+    label = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# Jobs a worker may still pick up. Written out as SQL so queries that filter with it
+# match the partial index literally; SQLite will not use it for bound parameters.
+PENDING_JOBS_WHERE = "status IN ('queued', 'running')"
+
+class BatchJob(db.Model):
+    __tablename__ = 'batch_jobs'
+    __table_args__ = (
+        db.Index('ix_batch_jobs_user_created', 'user_id', 'created_at'),
+        db.Index('ix_batch_jobs_status_heartbeat', 'status', 'heartbeat_at'),
+        # Only unfinished jobs, oldest first, for the resume scan
+        db.Index('ix_batch_jobs_pending', 'created_at',
+                 sqlite_where=db.text(PENDING_JOBS_WHERE), postgresql_where=db.text(PENDING_JOBS_WHERE)),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(512), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued -> running -> completed/failed/cancelled
+    text_column = db.Column(db.String(255), nullable=True)
+    product_column = db.Column(db.String(255), nullable=True)
+    rows_total = db.Column(db.Integer, nullable=True)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)  # Rows read and committed; resume point
+    results_count = db.Column(db.Integer, nullable=False, default=0)
+    stats = db.Column(db.Text, nullable=True)  # JSON summary (stats, product_stats, insights)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    owner = db.Column(db.String(128), nullable=True)  # host:pid:boot id of the process that claimed it
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # Rows processed and seconds spent in the current run, for throughput and ETA
+    run_rows = db.Column(db.Integer, nullable=False, default=0)
+    run_seconds = db.Column(db.Float, nullable=False, default=0.0)
+
+    results = db.relationship('BatchJobResult', backref='job', lazy='dynamic', cascade='all, delete-orphan')
+
+    def to_dict(self):
+        rows_per_second = round(self.run_rows / self.run_seconds, 1) if self.run_seconds else None
+        eta_seconds = None
+        if rows_per_second and self.rows_total is not None and self.status in ('queued', 'running'):
+            eta_seconds = round(max(self.rows_total - self.rows_done, 0) / rows_per_second, 1)
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'rows_total': self.rows_total,
+            'rows_done': self.rows_done,
+            'results_count': self.results_count,
+            'progress': round(self.rows_done / self.rows_total, 4) if self.rows_total else None,
+            'rows_per_second': rows_per_second,
+            'eta_seconds': eta_seconds,
+            'summary': json.loads(self.stats) if self.stats else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class BatchJobResult(db.Model):
+    __tablename__ = 'batch_job_results'
+    __table_args__ = (
+        db.Index('ix_batch_job_results_job_row', 'job_id', 'row_index'),
+        db.Index('ix_batch_job_results_job_sentiment', 'job_id', 'sentiment', 'row_index'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('batch_jobs.id'), nullable=False)
+    row_index = db.Column(db.Integer, nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    sentiment = db.Column(db.String(20), nullable=False)
+    confidence = db.Column(db.Float, nullable=True)
+    product = db.Column(db.String(255), nullable=True)
+
+    def to_dict(self):
+        result = {
+            'text': self.text,
+            'sentiment': self.sentiment,
+            'confidence': self.confidence,
+            'original_row': self.row_index
+        }
+        if self.product is not None:
+            result['product'] = self.product
+        return result
@@ -0,0 +1,201 @@
+import os
+import tempfile
+
+from flask import Blueprint, Response, request, jsonify, send_file
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, jwt_required
+from backend.extensions import db
+from backend.models.models import BatchJob, BatchJobResult
+from backend.services.batch_processing import EXPORT_FORMATS, export_frame, iter_csv_export, iter_upload_chunks, \
+    validate_upload, write_columnar_export
+from backend.services.jobs import JobQueueFull, job_manager
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+MAX_PAGE_SIZE = 1000
+EXPORT_PAGE_ROWS = 5000
+
+
+def user_jobs_query(user_id, limit=20):
+    """
+    Returns: query of the user's jobs, newest first
+    """
+    return BatchJob.query.filter_by(user_id=int(user_id)).order_by(BatchJob.created_at.desc()).limit(limit)
+
+
+def job_results_query(job_id, sentiment=None):
+    """
+    Returns: query of a job's results in row order, optionally of one sentiment
+    """
+    query = BatchJobResult.query.filter_by(job_id=job_id)
+    if sentiment:
+        query = query.filter(BatchJobResult.sentiment == sentiment)
+    return query.order_by(BatchJobResult.row_index)
+
+
+def export_range_query(job_id, first_row, last_row):
+    """
+    Returns: query of (row_index, text, sentiment, confidence, product) for rows first_row..last_row of a job
+    """
+    return db.session.query(BatchJobResult.row_index, BatchJobResult.text, BatchJobResult.sentiment,
+                            BatchJobResult.confidence, BatchJobResult.product) \
+        .filter(BatchJobResult.job_id == job_id, BatchJobResult.row_index >= first_row,
+                BatchJobResult.row_index <= last_row)
+
+
+def _optional_user_id():
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+        return int(identity) if identity is not None else None
+    except Exception:
+        return None
+
+
+def _get_job(job_id):
+    job = db.session.get(BatchJob, job_id)
+    if job is None:
+        return None, (jsonify({'status': 'error', 'message': 'Job not found'}), 404)
+    # Jobs submitted while logged in are only visible to their owner
+    if job.user_id is not None and job.user_id != _optional_user_id():
+        return None, (jsonify({'status': 'error', 'message': 'Unauthorized'}), 403)
+    return job, None
+
+
+@jobs_bp.route('', methods=['POST'])
+def submit_job():
+    file, message = validate_upload(request.files)
+    if message:
+        return jsonify({'status': 'error', 'message': message}), 400
+
+    try:
+        job = job_manager.submit(file, file.filename, user_id=_optional_user_id())
+    except JobQueueFull as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 429
+
+    return jsonify({'status': 'success', 'job': job.to_dict()}), 202
+
+
+@jobs_bp.route('', methods=['GET'])
+@jwt_required()
+def list_jobs():
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    jobs = user_jobs_query(get_jwt_identity(), limit).all()
+    return jsonify({'status': 'success', 'jobs': [job.to_dict() for job in jobs]}), 200
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job, error = _get_job(job_id)
+    if error:
+        return error
+    return jsonify({'status': 'success', 'job': job.to_dict()}), 200
+
+
+@jobs_bp.route('/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job, error = _get_job(job_id)
+    if error:
+        return error
+    if not job_manager.cancel(job):
+        return jsonify({'status': 'error', 'message': f'Job is already {job.status}'}), 409
+    db.session.refresh(job)
+    return jsonify({'status': 'success', 'job': job.to_dict()}), 200
+
+
+@jobs_bp.route('/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """
+    Paginated results; available while the job runs (committed chunks only)
+    """
+    job, error = _get_job(job_id)
+    if error:
+        return error
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 100, type=int), 1), MAX_PAGE_SIZE)
+    sentiment = request.args.get('sentiment')
+
+    query = job_results_query(job.id, sentiment)
+    total = query.order_by(None).count()
+    results = query.offset((page - 1) * per_page).limit(per_page).all()
+
+    return jsonify({
+        'status': 'success',
+        'job_status': job.status,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page,
+        'results': [result.to_dict() for result in results]
+    }), 200
+
+
+@jobs_bp.route('/<job_id>/export', methods=['GET'])
+def export_job_results(job_id):
+    """
+    Download all results of a job as streamed CSV (default), Parquet or Arrow (?format=)
+    The uploaded file's columns are joined back on while the upload is still on disk.
+    """
+    job, error = _get_job(job_id)
+    if error:
+        return error
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': f"Unknown format '{fmt}' (use {', '.join(EXPORT_FORMATS)})"}), 400
+
+    return export_response(iter_job_export_frames(job_manager.app, job_id), fmt, job.filename)
+
+
+def iter_job_export_frames(app, job_id):
+    """
+    Export frames of a job, one per EXPORT_PAGE_ROWS rows
+    Runs in its own app context, since a streamed body is generated after the view returns.
+    """
+    import pandas as pd
+
+    with app.app_context():
+        job = db.session.get(BatchJob, job_id)
+
+        def fetch(first_row, last_row):
+            return pd.DataFrame(export_range_query(job_id, first_row, last_row).all(),
+                                columns=['row', 'text', 'sentiment', 'confidence', 'product']).set_index('row')
+
+        if os.path.exists(job.file_path):
+            chunks = iter_upload_chunks(job.file_path, job.filename, chunk_rows=EXPORT_PAGE_ROWS)
+            try:
+                for chunk in chunks:
+                    # Rows a running job has not reached yet are left out
+                    chunk = chunk[chunk.index < (job.rows_done or 0)]
+                    if chunk.empty:
+                        break
+                    yield export_frame(chunk, fetch(chunk.index[0], chunk.index[-1]))
+            finally:
+                chunks.close()
+            return
+
+        # The upload is gone (removed by the retention sweep or by hand): export the stored text and product only
+        stored = ['text'] + (['product'] if job.product_column is not None else [])
+        first_row = 0
+        while first_row < (job.rows_done or 0):
+            results = fetch(first_row, first_row + EXPORT_PAGE_ROWS - 1)
+            if not results.empty:
+                yield export_frame(results[stored], results)
+            first_row += EXPORT_PAGE_ROWS
+
+
+def export_response(frames, fmt, filename):
+    """
+    Download response for export frames: CSV is streamed as it is produced,
+    Parquet and Arrow are written to a temporary file first since their footer comes last
+    Returns: Response
+    """
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    download_name = filename.rsplit('.', 1)[0] + '_results' + extension
+    if fmt == 'csv':
+        return Response(iter_csv_export(frames), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename="{download_name}"'})
+
+    out = tempfile.TemporaryFile()
+    write_columnar_export(frames, fmt, out)
+    out.seek(0)
+    return send_file(out, mimetype=mimetype, as_attachment=True, download_name=download_name)
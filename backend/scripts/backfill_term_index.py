@@ -0,0 +1,71 @@
+"""
+Rebuild the per-user term-frequency index (term_frequencies) from the analyses table.
+
+The app builds an empty index by itself at startup; run this after bulk
+changes to analyses that bypass the ORM events (raw SQL, Query.update()/delete()).
+
+Usage:
+    python -m backend.scripts.backfill_term_index [--db instance/sentiment.db] [--user 3]
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+from backend.services.term_index import INSERT_MISSING_SQL, build_index_rows
+
+DEFAULT_DB_PATH = os.path.join('instance', 'sentiment.db')
+
+
+def backfill(db_path=DEFAULT_DB_PATH, user_id=None, chunk_size=5000):
+    if not os.path.exists(db_path):
+        print(f"Database not found: {db_path}")
+        return
+
+    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    try:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS term_frequencies (
+            user_id INTEGER NOT NULL,
+            sentiment VARCHAR(20) NOT NULL,
+            term VARCHAR(255) NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, sentiment, term),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_term_frequencies_top ON term_frequencies (user_id, sentiment, count)')
+
+        where = 'WHERE user_id IS NOT NULL' + (' AND user_id = ?' if user_id is not None else '')
+        params = (user_id,) if user_id is not None else ()
+        with conn:
+            conn.execute(f'DELETE FROM term_frequencies {where}', params)
+            cursor = conn.execute(f'SELECT user_id, sentiment, text FROM analyses {where} ORDER BY user_id', params)
+
+            def fetch():
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        return
+                    yield from rows
+
+            written = 0
+            for rows in build_index_rows(fetch()):
+                conn.executemany(INSERT_MISSING_SQL, rows)
+                written += len(rows)
+            analyses = conn.execute(f'SELECT COUNT(*) FROM analyses {where}', params).fetchone()[0]
+
+        print(f"Indexed {analyses} analyses into {written} term rows in {time.perf_counter() - start:.1f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rebuild the word-cloud term index from analyses')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='SQLite database path')
+    parser.add_argument('--user', type=int, help='Only rebuild this user')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Analyses fetched per round trip')
+    args = parser.parse_args()
+
+    backfill(args.db, user_id=args.user, chunk_size=args.chunk_size)
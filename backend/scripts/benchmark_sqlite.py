@@ -0,0 +1,143 @@
+"""
+Concurrent read/write throughput of the app database under each SQLite profile.
+
+Writer threads insert analyses one transaction at a time, like /api/classify
+for a logged-in user (including the term-index and stats-rollup updates);
+reader threads run the history page, history count and word-cloud queries.
+Each profile runs against its own freshly seeded database file.
+
+Usage:
+    python -m backend.scripts.benchmark_sqlite [--seconds 10] [--writers 4] [--readers 4] [--seed-rows 20000]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.extensions import db
+from backend.models.models import Analysis, TermFrequency, User
+from backend.services import stats_rollups, term_index  # noqa: F401  (ORM listeners, as in the app)
+from backend.services.sqlite_profile import PROFILES, apply_sqlite_profile
+
+USERS = 20
+WORDS = ['barang', 'bagus', 'pengiriman', 'cepat', 'lambat', 'kualitas', 'harga', 'murah', 'rusak', 'penjual',
+         'sesuai', 'gambar', 'kemasan', 'mantap', 'kecewa', 'original', 'respon', 'ramah', 'ukuran', 'warna']
+LABELS = ('Positif', 'Negatif', 'Netral')
+
+
+def random_text(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 20)))
+
+
+def build_database(path, profile, seed_rows):
+    engine = create_engine(f'sqlite:///{path}', pool_size=16, max_overflow=0)
+    apply_sqlite_profile(engine, profile)
+    db.metadata.create_all(engine)
+
+    rng = random.Random(0)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add_all(User(id=i, username=f'user{i}', email=f'user{i}@example.com', password_hash='x')
+                        for i in range(1, USERS + 1))
+        session.commit()
+        now = datetime.utcnow()
+        for start in range(0, seed_rows, 1000):
+            session.add_all(Analysis(user_id=rng.randint(1, USERS), text=random_text(rng), sentiment=rng.choice(LABELS),
+                                     confidence=0.9, created_at=now - timedelta(minutes=rng.randint(0, 525600)))
+                            for _ in range(min(1000, seed_rows - start)))
+            session.commit()
+    return engine, Session
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def run(profile, seconds, writers, readers, seed_rows):
+    directory = tempfile.mkdtemp(prefix='sqlite-bench-')
+    engine, Session = build_database(os.path.join(directory, 'bench.db'), profile, seed_rows)
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {'write': [], 'read': [], 'errors': 0}
+
+    def record(kind, seconds_taken):
+        with lock:
+            results[kind].append(seconds_taken)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with Session() as session:
+                    session.add(Analysis(user_id=rng.randint(1, USERS), text=random_text(rng),
+                                         sentiment=rng.choice(LABELS), confidence=0.9))
+                    session.commit()
+                record('write', time.perf_counter() - start)
+            except Exception:
+                with lock:
+                    results['errors'] += 1
+
+    def reader(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            user_id = rng.randint(1, USERS)
+            start = time.perf_counter()
+            try:
+                with Session() as session:
+                    session.query(Analysis).filter_by(user_id=user_id) \
+                        .order_by(Analysis.created_at.desc()).limit(10).all()
+                    session.query(Analysis).filter_by(user_id=user_id).count()
+                    session.query(TermFrequency.term, TermFrequency.count) \
+                        .filter_by(user_id=user_id, sentiment=term_index.ALL_SENTIMENTS) \
+                        .order_by(TermFrequency.count.desc()).limit(50).all()
+                record('read', time.perf_counter() - start)
+            except Exception:
+                with lock:
+                    results['errors'] += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)] + \
+              [threading.Thread(target=reader, args=(100 + i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'profile': profile,
+        'writes_per_second': len(results['write']) / seconds,
+        'reads_per_second': len(results['read']) / seconds,
+        'write_p95_ms': percentile(results['write'], 0.95) * 1000,
+        'read_p95_ms': percentile(results['read'], 0.95) * 1000,
+        'errors': results['errors']
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark concurrent SQLite reads/writes per connection profile')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of each run')
+    parser.add_argument('--writers', type=int, default=4, help='Writer threads')
+    parser.add_argument('--readers', type=int, default=4, help='Reader threads')
+    parser.add_argument('--seed-rows', type=int, default=20000, help='Analyses in the database before the run')
+    parser.add_argument('--profiles', nargs='+', default=['default', 'tuned'], choices=sorted(PROFILES))
+    args = parser.parse_args()
+
+    print(f"{'profile':<10} {'writes/s':>9} {'reads/s':>9} {'write p95':>10} {'read p95':>10} {'errors':>7}")
+    for profile in args.profiles:
+        result = run(profile, args.seconds, args.writers, args.readers, args.seed_rows)
+        print(f"{result['profile']:<10} {result['writes_per_second']:>9.1f} {result['reads_per_second']:>9.1f} "
+              f"{result['write_p95_ms']:>8.1f}ms {result['read_p95_ms']:>8.1f}ms {result['errors']:>7}")
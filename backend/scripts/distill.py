@@ -0,0 +1,231 @@
+"""
+Distill the serving model into a smaller student for cheap CPU inference.
+
+The current serving model (fine-tuned if present, base otherwise) is the
+teacher: it soft-labels an unlabeled corpus built from analysis history,
+saved YouTube analyses and any extra CSVs. A student with fewer layers
+(initialized from a subset of the teacher's layers) is trained on the
+teacher's temperature-softened probabilities with a KL loss and saved in
+Hugging Face format.
+
+Usage:
+    python -m backend.scripts.distill [--layers 4] [--csv comments.csv] [--epochs 3]
+
+Serve the student with SENTIMENT_SERVING_MODEL=student and reload the model.
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.nn import functional as F
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+from backend.services import model_loader
+from backend.tests.test_comprehensive_accuracy import comprehensive_test_cases
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join('instance', 'sentiment.db')
+MAX_LENGTH = 128
+
+
+def _texts_from_json(value):
+    # Saved YouTube analyses are free-form JSON; collect every 'text' field in them
+    if isinstance(value, dict):
+        if isinstance(value.get('text'), str):
+            yield value['text']
+        for item in value.values():
+            yield from _texts_from_json(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _texts_from_json(item)
+
+
+def load_corpus(db_path=DEFAULT_DB_PATH, csv_paths=(), max_texts=50000):
+    texts = []
+    if db_path and os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            texts += [row[0] for row in conn.execute('SELECT DISTINCT text FROM analyses')]
+            try:
+                for (analysis_data,) in conn.execute('SELECT analysis_data FROM saved_youtube_analysis'):
+                    texts += list(_texts_from_json(json.loads(analysis_data or 'null')))
+            except sqlite3.OperationalError:
+                pass  # Table only exists once a YouTube analysis has been saved
+        finally:
+            conn.close()
+        print(f"Loaded {len(texts)} texts from {db_path}")
+
+    for path in csv_paths:
+        df = pd.read_csv(path)
+        column = 'text' if 'text' in df.columns else df.columns[0]
+        texts += df[column].dropna().astype(str).tolist()
+        print(f"Loaded {len(df)} texts from {path}")
+
+    texts = list(dict.fromkeys(t.strip() for t in texts if isinstance(t, str) and len(t.strip()) >= 3))
+    return texts[:max_texts]
+
+
+def teacher_logits(tokenizer, teacher, texts, batch_size=32):
+    """
+    Returns: array of teacher logits for texts (input order)
+    """
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, len(texts), batch_size):
+            encoded = tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                max_length=MAX_LENGTH, return_tensors='pt')
+            outputs.append(teacher(**encoded).logits.float().numpy())
+    return np.concatenate(outputs) if outputs else np.zeros((0, teacher.config.num_labels))
+
+
+def build_student(teacher, num_layers, hidden_size=None):
+    """
+    Create a student with num_layers encoder layers
+    With the teacher's hidden size, embeddings, evenly spaced layers and the
+    classification head are copied from the teacher as initialization.
+    """
+    config = copy.deepcopy(teacher.config)
+    config.num_hidden_layers = num_layers
+    copy_weights = hidden_size is None or hidden_size == teacher.config.hidden_size
+    if not copy_weights:
+        config.hidden_size = hidden_size
+        config.intermediate_size = hidden_size * 4
+        config.num_attention_heads = max(1, hidden_size // 64)
+
+    student = AutoModelForSequenceClassification.from_config(config)
+    if copy_weights:
+        teacher_layers = teacher.base_model.encoder.layer
+        keep = np.linspace(0, len(teacher_layers) - 1, num_layers).round().astype(int)
+        student.base_model.embeddings.load_state_dict(teacher.base_model.embeddings.state_dict())
+        for student_layer, teacher_index in zip(student.base_model.encoder.layer, keep):
+            student_layer.load_state_dict(teacher_layers[int(teacher_index)].state_dict())
+        student.classifier.load_state_dict(teacher.classifier.state_dict())
+    return student
+
+
+def train_student(student, tokenizer, texts, soft_logits, epochs=3, batch_size=32, learning_rate=5e-5,
+                  temperature=2.0):
+    optimizer = torch.optim.AdamW(student.parameters(), lr=learning_rate, weight_decay=0.01)
+    targets = torch.tensor(soft_logits)
+    student.train()
+    for epoch in range(epochs):
+        order = np.random.permutation(len(texts))
+        total_loss = 0.0
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encoded = tokenizer([texts[i] for i in batch], padding=True, truncation=True,
+                                max_length=MAX_LENGTH, return_tensors='pt')
+            logits = student(**encoded).logits
+            # Soft-target KL, scaled by T^2 so gradients keep their magnitude across temperatures
+            loss = F.kl_div(F.log_softmax(logits / temperature, dim=-1),
+                            F.softmax(targets[batch] / temperature, dim=-1),
+                            reduction='batchmean') * temperature ** 2
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(batch)
+        print(f"Epoch {epoch + 1}/{epochs}: distillation loss {total_loss / len(texts):.4f}")
+    student.eval()
+    return student
+
+
+def benchmark(tokenizer, model, texts, batch_size=32):
+    """
+    Returns: dict with single-text latency, batched throughput and accuracy on the test cases
+    """
+    single = texts[:50]
+    start = time.perf_counter()
+    for text in single:
+        model_loader.predict_probabilities(tokenizer, model, [text], batch_size=1)
+    latency_ms = (time.perf_counter() - start) / len(single) * 1000
+
+    start = time.perf_counter()
+    probs = model_loader.predict_probabilities(tokenizer, model, texts, batch_size=batch_size)
+    throughput = len(texts) / (time.perf_counter() - start)
+
+    id2label = model.config.id2label
+    predicted = [model_loader.map_label(id2label[int(i)]) for i in np.asarray(probs).argmax(axis=-1)]
+    correct = sum(p == case['expected'] for p, case in zip(predicted, comprehensive_test_cases))
+    return {
+        'latency_ms': round(latency_ms, 2),
+        'texts_per_second': round(throughput, 1),
+        'accuracy': round(correct / len(comprehensive_test_cases), 4),
+        'parameters': sum(p.numel() for p in model.parameters())
+    }
+
+
+def distill(db_path=DEFAULT_DB_PATH, csv_paths=(), num_layers=4, hidden_size=None, epochs=3,
+            batch_size=32, temperature=2.0, output_dir=model_loader.STUDENT_DIR):
+    teacher_name = model_loader.resolve_serving_model()
+    if teacher_name == output_dir:
+        teacher_name = model_loader.FINE_TUNED_DIR if os.path.isdir(model_loader.FINE_TUNED_DIR) \
+            else model_loader.MODEL_NAME
+    print(f"Teacher: {teacher_name}")
+    tokenizer = AutoTokenizer.from_pretrained(teacher_name)
+    teacher = AutoModelForSequenceClassification.from_pretrained(teacher_name).eval()
+
+    texts = load_corpus(db_path, csv_paths)
+    # The test cases measure accuracy, so keep them out of the training corpus
+    held_out = {case['text'] for case in comprehensive_test_cases}
+    texts = [text for text in texts if text not in held_out]
+    if len(texts) < 100:
+        print(f"Corpus too small to distill ({len(texts)} texts); add CSVs with --csv")
+        return None
+
+    print(f"\nSoft-labelling {len(texts)} texts with the teacher...")
+    soft_logits = teacher_logits(tokenizer, teacher, texts, batch_size=batch_size)
+
+    student = build_student(teacher, num_layers, hidden_size)
+    print(f"Student: {num_layers} layers, hidden size {student.config.hidden_size}")
+    train_student(student, tokenizer, texts, soft_logits, epochs=epochs, batch_size=batch_size,
+                  temperature=temperature)
+
+    os.makedirs(output_dir, exist_ok=True)
+    student.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+
+    eval_texts = [case['text'] for case in comprehensive_test_cases]
+    report = {'teacher': teacher_name, 'corpus_size': len(texts), 'temperature': temperature}
+    print(f"\n{'model':10s} {'params':>12s} {'latency':>10s} {'texts/s':>9s} {'accuracy':>9s}")
+    for name, model in (('teacher', teacher), ('student', student)):
+        with torch.no_grad():
+            report[name] = benchmark(tokenizer, model, eval_texts, batch_size=batch_size)
+        result = report[name]
+        print(f"{name:10s} {result['parameters']:12,d} {result['latency_ms']:8.2f}ms "
+              f"{result['texts_per_second']:9.1f} {result['accuracy']:9.1%}")
+    report['speedup'] = round(report['teacher']['latency_ms'] / report['student']['latency_ms'], 2)
+    print(f"\nStudent speedup: {report['speedup']}x")
+
+    with open(os.path.join(output_dir, 'distill_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Student model saved to {output_dir} (serve with SENTIMENT_SERVING_MODEL=student)")
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Distill the serving model into a smaller student')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='Path to sentiment.db')
+    parser.add_argument('--csv', action='append', default=[], help='Extra unlabeled texts (repeatable)')
+    parser.add_argument('--layers', type=int, default=4, help='Encoder layers in the student')
+    parser.add_argument('--hidden-size', type=int, help="Student hidden size (default: teacher's, enables weight copy)")
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--temperature', type=float, default=2.0)
+    parser.add_argument('--output', default=model_loader.STUDENT_DIR)
+    args = parser.parse_args()
+
+    csv_paths = args.csv or (['dummy_train.csv'] if os.path.exists('dummy_train.csv') else [])
+    distill(db_path=args.db, csv_paths=csv_paths, num_layers=args.layers, hidden_size=args.hidden_size,
+            epochs=args.epochs, batch_size=args.batch_size, temperature=args.temperature,
+            output_dir=args.output)
@@ -0,0 +1,79 @@
+"""
+Export the serving model to ONNX (fp32 + dynamic int8) and check parity with PyTorch.
+
+Usage:
+    python -m backend.scripts.export_onnx [--csv dummy_train.csv] [--samples 500]
+
+Set SENTIMENT_INFERENCE_BACKEND=onnx or onnx-int8 afterwards to serve the export.
+"""
+import argparse
+import logging
+import sys
+import time
+
+import pandas as pd
+from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification
+
+from backend.services import model_loader, onnx_backend
+from backend.tests.test_comprehensive_accuracy import comprehensive_test_cases
+
+logger = logging.getLogger(__name__)
+
+
+def load_parity_texts(csv_path=None, samples=500):
+    texts = [case['text'] for case in comprehensive_test_cases]
+    if csv_path:
+        df = pd.read_csv(csv_path)
+        column = 'text' if 'text' in df.columns else df.columns[0]
+        texts += df[column].dropna().astype(str).head(samples).tolist()
+    return texts
+
+
+def timed_probabilities(tokenizer, model, texts, batch_size):
+    start = time.perf_counter()
+    probs = model_loader.predict_probabilities(tokenizer, model, texts, batch_size=batch_size)
+    return probs, time.perf_counter() - start
+
+
+def export_and_check(csv_path=None, samples=500, batch_size=32):
+    target_model = model_loader.resolve_serving_model()
+    fingerprint = model_loader.model_fingerprint(target_model)
+    print(f"Serving model: {target_model} (fingerprint {fingerprint})")
+
+    tokenizer = AutoTokenizer.from_pretrained(target_model)
+    torch_model = AutoModelForSequenceClassification.from_pretrained(target_model).eval()
+    paths = onnx_backend.export_model(torch_model, tokenizer, fingerprint, quantize=True)
+    for variant, path in paths.items():
+        print(f"  {variant}: {path}")
+
+    texts = load_parity_texts(csv_path, samples)
+    print(f"\nParity check on {len(texts)} texts (batch size {batch_size})")
+    reference, reference_time = timed_probabilities(tokenizer, torch_model, texts, batch_size)
+    print(f"{'pytorch':10s} {len(texts) / reference_time:8.1f} texts/s")
+
+    config = AutoConfig.from_pretrained(target_model)
+    reports = {}
+    for variant, path in paths.items():
+        session = onnx_backend.OnnxSequenceClassifier(path, config)
+        candidate, elapsed = timed_probabilities(tokenizer, session, texts, batch_size)
+        report = onnx_backend.parity_report(reference, candidate)
+        report['texts_per_second'] = round(len(texts) / elapsed, 1)
+        report['speedup'] = round(reference_time / elapsed, 2)
+        reports[variant] = report
+        print(f"{'onnx-' + variant:10s} {report['texts_per_second']:8.1f} texts/s  "
+              f"speedup {report['speedup']}x  agreement {report['label_agreement']:.2%}  "
+              f"max prob delta {report['max_prob_delta']}")
+
+    return reports
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Export the serving model to ONNX and check parity')
+    parser.add_argument('--csv', help='Optional CSV with a text column to add to the parity set')
+    parser.add_argument('--samples', type=int, default=500, help='Max rows taken from --csv')
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    export_and_check(csv_path=args.csv, samples=args.samples, batch_size=args.batch_size)
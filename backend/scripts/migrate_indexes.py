@@ -0,0 +1,121 @@
+"""
+Versioned index and column migrations for the SQLite database.
+
+db.create_all() only builds indexes and columns together with new tables, so
+databases created before one was declared in backend/models/models.py get it
+from here. Applied migrations are tracked in PRAGMA user_version; each one runs in
+its own transaction and is safe to re-run against a database that create_all
+already built with the indexes. Statements for tables that do not exist yet
+are skipped (create_all will create those tables with their indexes), and
+so are ADD COLUMN statements for columns the table already has.
+
+Usage:
+    python -m backend.scripts.migrate_indexes [--db instance/sentiment.db] [--dry-run]
+"""
+import argparse
+import os
+import re
+import sqlite3
+
+DEFAULT_DB_PATH = os.path.join('instance', 'sentiment.db')
+
+# (version, description, [(table, statement), ...]), in order
+MIGRATIONS = [
+    (1, 'Composite and partial indexes for history, stats, training data and batch jobs', [
+        ('analyses', 'CREATE INDEX IF NOT EXISTS ix_analyses_user_created ON analyses (user_id, created_at)'),
+        ('analyses', 'CREATE INDEX IF NOT EXISTS ix_analyses_user_sentiment ON analyses (user_id, sentiment)'),
+        ('analyses', 'CREATE INDEX IF NOT EXISTS ix_analyses_corrected ON analyses (user_id, correction) '
+                     'WHERE correction IS NOT NULL'),
+        ('batch_jobs', 'CREATE INDEX IF NOT EXISTS ix_batch_jobs_user_created ON batch_jobs (user_id, created_at)'),
+        ('batch_jobs', 'CREATE INDEX IF NOT EXISTS ix_batch_jobs_status_heartbeat ON batch_jobs (status, heartbeat_at)'),
+        ('batch_job_results', 'CREATE INDEX IF NOT EXISTS ix_batch_job_results_job_row '
+                              'ON batch_job_results (job_id, row_index)'),
+        ('batch_job_results', 'CREATE INDEX IF NOT EXISTS ix_batch_job_results_job_sentiment '
+                              'ON batch_job_results (job_id, sentiment, row_index)'),
+        # Superseded by ix_batch_job_results_job_row
+        ('batch_job_results', 'DROP INDEX IF EXISTS ix_batch_job_results_job_id'),
+        ('term_frequencies', 'CREATE INDEX IF NOT EXISTS ix_term_frequencies_top '
+                             'ON term_frequencies (user_id, sentiment, count)'),
+        ('saved_youtube_analysis', 'CREATE INDEX IF NOT EXISTS ix_saved_youtube_analysis_user_created '
+                                   'ON saved_youtube_analysis (user_id, created_at)'),
+    ]),
+    (2, 'Owner of running batch jobs, so a restarted server reclaims its jobs at once', [
+        ('batch_jobs', 'ALTER TABLE batch_jobs ADD COLUMN owner VARCHAR(128)'),
+    ]),
+    (3, 'Partial index over unfinished batch jobs for the resume scan', [
+        ('batch_jobs', "CREATE INDEX IF NOT EXISTS ix_batch_jobs_pending ON batch_jobs (created_at) "
+                       "WHERE status IN ('queued', 'running')"),
+    ]),
+]
+
+ADD_COLUMN = re.compile(r'ADD COLUMN (\w+)', re.IGNORECASE)
+
+
+def _tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def migrate(db_path=DEFAULT_DB_PATH, dry_run=False):
+    """
+    Apply every migration newer than the database's user_version
+    Returns: the database's schema version afterwards
+    """
+    if not os.path.exists(db_path):
+        print(f"Database not found: {db_path}")
+        return None
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        pending = [migration for migration in MIGRATIONS if migration[0] > version]
+        if not pending:
+            print(f"Schema is up to date (version {version}).")
+            return version
+
+        tables = _tables(conn)
+        for number, description, statements in pending:
+            print(f"Migration {number}: {description}")
+            conn.execute('BEGIN')
+            try:
+                for table, statement in statements:
+                    if table not in tables:
+                        print(f"  skip (no table {table}): {statement}")
+                        continue
+                    column = ADD_COLUMN.search(statement)
+                    if column and column.group(1) in _columns(conn, table):
+                        print(f"  skip (column exists): {statement}")
+                        continue
+                    print(f"  {statement}")
+                    if not dry_run:
+                        conn.execute(statement)
+                if dry_run:
+                    conn.execute('ROLLBACK')
+                    continue
+                # PRAGMA user_version is transactional in SQLite, so it commits with the indexes
+                conn.execute(f'PRAGMA user_version = {number}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            version = number
+
+        if not dry_run:
+            # Fresh statistics, so the planner picks the new indexes
+            conn.execute('ANALYZE')
+        print(f"Schema version {version}.")
+        return version
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Apply pending index and column migrations')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='SQLite database path')
+    parser.add_argument('--dry-run', action='store_true', help='Print the statements without applying them')
+    args = parser.parse_args()
+
+    migrate(args.db, dry_run=args.dry_run)
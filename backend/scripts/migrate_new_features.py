@@ -55,7 +55,12 @@ def migrate():
             FOREIGN KEY (user_id) REFERENCES user(id)
         )
         ''')
-        
+        # Same index as migration 1 in migrate_indexes.py, for databases that get this table afterwards
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS ix_saved_youtube_analysis_user_created
+        ON saved_youtube_analysis (user_id, created_at)
+        ''')
+
         print("✓ saved_youtube_analysis table created")
         
         # Create tags table
@@ -0,0 +1,71 @@
+"""
+Recompute the materialized stats tables (sentiment_totals, daily_sentiment_counts)
+from the analyses table.
+
+The app fills empty rollups by itself at startup; run this after bulk
+changes to analyses that bypass the ORM events (raw SQL, Query.update()/delete()).
+
+Usage:
+    python -m backend.scripts.rebuild_stats_rollups [--db instance/sentiment.db]
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+from backend.services.stats_rollups import REBUILD_DAILY_SQL, REBUILD_TOTALS_SQL, ROLLUP_COLUMNS
+
+DEFAULT_DB_PATH = os.path.join('instance', 'sentiment.db')
+
+
+def rebuild(db_path=DEFAULT_DB_PATH):
+    if not os.path.exists(db_path):
+        print(f"Database not found: {db_path}")
+        return
+
+    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    try:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_sentiment_counts (
+            user_id INTEGER NOT NULL,
+            kind VARCHAR(20) NOT NULL,
+            day VARCHAR(10) NOT NULL,
+            label VARCHAR(20) NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind, day, label),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        ''')
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS sentiment_totals (
+            user_id INTEGER NOT NULL,
+            kind VARCHAR(20) NOT NULL,
+            label VARCHAR(20) NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind, label),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        ''')
+
+        # One transaction, so the dashboard never reads half-rebuilt tables
+        with conn:
+            conn.execute('DELETE FROM daily_sentiment_counts')
+            conn.execute('DELETE FROM sentiment_totals')
+            for kind, column in ROLLUP_COLUMNS:
+                conn.execute(REBUILD_DAILY_SQL.format(column=column), {'kind': kind})
+            conn.execute(REBUILD_TOTALS_SQL)
+
+        days = conn.execute('SELECT COUNT(*) FROM daily_sentiment_counts').fetchone()[0]
+        totals = conn.execute('SELECT COUNT(*) FROM sentiment_totals').fetchone()[0]
+        print(f"Rebuilt {days} daily rows and {totals} total rows in {time.perf_counter() - start:.1f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recompute the dashboard stats rollups from analyses')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='SQLite database path')
+    args = parser.parse_args()
+
+    rebuild(args.db)
@@ -0,0 +1,54 @@
+"""
+Run the shared inference daemon that owns the sentiment model for all web workers.
+
+Usage:
+    python -m backend.scripts.run_inference_server [--socket instance/inference.sock]
+
+Then start the web workers with SENTIMENT_INFERENCE_SOCKET pointing at the same
+path; they forward predictions here instead of loading their own model copy.
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+
+from backend.services import model_loader
+from backend.services.inference_server import InferenceServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = os.path.join('instance', 'inference.sock')
+
+
+def serve(socket_path=DEFAULT_SOCKET_PATH):
+    # This process is the one that owns the model, whatever the environment says
+    model_loader.use_local_inference()
+
+    server = InferenceServer(socket_path, model_loader)
+    # Workers get "not ready" from the status op until load and warmup finish
+    model_loader.start_background_load()
+
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, shutdown)
+    print(f"🚀 Inference server listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("Inference server stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Serve sentiment predictions to local workers over a Unix socket')
+    parser.add_argument('--socket', default=os.environ.get('SENTIMENT_INFERENCE_SOCKET') or DEFAULT_SOCKET_PATH,
+                        help='Path of the Unix domain socket to listen on')
+    args = parser.parse_args()
+
+    serve(socket_path=args.socket)
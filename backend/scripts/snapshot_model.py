@@ -0,0 +1,79 @@
+"""
+Materialize the base and fine-tuned models as versioned local safetensors snapshots.
+
+Run this on a node with Hub access (or copy the snapshot directory over), then
+start air-gapped nodes with SENTIMENT_OFFLINE=1: the loader reads the current
+snapshot with local_files_only and memory-mapped weights.
+
+Usage:
+    python -m backend.scripts.snapshot_model [--only base|fine_tuned] [--keep 3] [--verify]
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+
+from backend.services import model_loader, model_snapshots
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_sources():
+    sources = {'base': model_loader.MODEL_NAME}
+    if os.path.exists(model_loader.FINE_TUNED_DIR) and os.listdir(model_loader.FINE_TUNED_DIR):
+        sources['fine_tuned'] = model_loader.FINE_TUNED_DIR
+    return sources
+
+
+def prune(name, keep, root=model_snapshots.SNAPSHOT_DIR):
+    # Versions sort by their timestamp prefix; the current one is never removed
+    directory = os.path.join(root, name)
+    current = model_snapshots.current_snapshot(name, root)
+    versions = sorted(v for v in os.listdir(directory)
+                      if not v.startswith('.') and os.path.isdir(os.path.join(directory, v)))
+    for version in versions[:-keep] if keep else []:
+        path = os.path.join(directory, version)
+        if current and os.path.samefile(path, current):
+            continue
+        shutil.rmtree(path)
+        print(f"  removed old snapshot {name}/{version}")
+
+
+def snapshot(only=None, keep=3, root=model_snapshots.SNAPSHOT_DIR):
+    for name, source in snapshot_sources().items():
+        if only and name != only:
+            continue
+        print(f"Snapshotting {name} from {source}...")
+        manifest = model_snapshots.create_snapshot(name, source, root)
+        size_mb = sum(info['bytes'] for info in manifest['files'].values()) / (1024 * 1024)
+        print(f"  {name}/{manifest['version']} ({len(manifest['files'])} files, {size_mb:.1f} MB)")
+        prune(name, keep, root)
+
+
+def verify(root=model_snapshots.SNAPSHOT_DIR):
+    ok = True
+    for name in ('base', 'fine_tuned'):
+        path = model_snapshots.current_snapshot(name, root)
+        if path is None:
+            print(f"{name}: no snapshot")
+            continue
+        problems = model_snapshots.verify_snapshot(path)
+        ok = ok and not problems
+        print(f"{name}: {path} {'OK' if not problems else '; '.join(problems)}")
+    return ok
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Write versioned safetensors snapshots of the serving models')
+    parser.add_argument('--only', choices=('base', 'fine_tuned'), help='Snapshot a single model')
+    parser.add_argument('--keep', type=int, default=3, help='Snapshots to keep per model (0 keeps all)')
+    parser.add_argument('--root', default=model_snapshots.SNAPSHOT_DIR, help='Snapshot directory')
+    parser.add_argument('--verify', action='store_true', help='Check the current snapshots against their manifests')
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify(args.root) else 1)
+    snapshot(only=args.only, keep=args.keep, root=args.root)
@@ -0,0 +1,120 @@
+"""
+Train the fast TF-IDF + logistic regression stage of the sentiment cascade.
+
+Training data comes from the analyses table (the user's correction wins over
+the stored prediction) plus any labelled CSVs with 'text' and 'label' columns.
+A held-out split is used to report how many texts the fast stage would answer
+at each margin and how often it agrees with IndoBERT there.
+
+Usage:
+    python -m backend.scripts.train_cascade [--csv dummy_train.csv] [--margin 0.5]
+
+Set SENTIMENT_CASCADE=1 afterwards to serve with the cascade.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from backend.services import cascade
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join('instance', 'sentiment.db')
+REPORT_MARGINS = (0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8)
+
+
+def load_training_data(db_path=DEFAULT_DB_PATH, csv_paths=()):
+    frames = []
+    if db_path and os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            df = pd.read_sql_query(
+                'SELECT text, COALESCE(correction, sentiment) AS label FROM analyses', conn
+            )
+        finally:
+            conn.close()
+        print(f"Loaded {len(df)} rows from {db_path}")
+        frames.append(df)
+
+    for path in csv_paths:
+        df = pd.read_csv(path)
+        if 'text' not in df.columns or 'label' not in df.columns:
+            print(f"Skipping {path}: CSV must contain 'text' and 'label' columns")
+            continue
+        print(f"Loaded {len(df)} rows from {path}")
+        frames.append(df[['text', 'label']])
+
+    if not frames:
+        return pd.DataFrame(columns=['text', 'label'])
+
+    data = pd.concat(frames, ignore_index=True).dropna()
+    data['text'] = data['text'].astype(str).str.strip()
+    data = data[(data['text'] != '') & data['label'].isin(cascade.LABELS)]
+    # The newest label for a text wins (later sources and rows override earlier ones)
+    return data.drop_duplicates(subset='text', keep='last').reset_index(drop=True)
+
+
+def train_cascade(db_path=DEFAULT_DB_PATH, csv_paths=(), margin=0.5, test_size=0.2,
+                  compare_bert=True, output_path=cascade.CASCADE_MODEL_PATH):
+    from sklearn.model_selection import train_test_split
+
+    data = load_training_data(db_path, csv_paths)
+    if len(data) < 20 or data['label'].nunique() < 2:
+        print(f"Not enough labelled data to train the cascade ({len(data)} rows)")
+        return None
+
+    train_df, held_out = train_test_split(data, test_size=test_size, random_state=42, stratify=data['label'])
+    print(f"\nTraining on {len(train_df)} texts, holding out {len(held_out)}")
+
+    pipeline = cascade.build_pipeline()
+    pipeline.fit(train_df['text'].tolist(), train_df['label'].tolist())
+
+    texts = held_out['text'].tolist()
+    references = {'labels': held_out['label'].tolist()}
+    if compare_bert:
+        from backend.services import model_loader
+
+        references['bert'] = [label for label, _ in model_loader.predict_sentiment_many(texts)]
+
+    reports = {}
+    for name, reference in references.items():
+        print(f"\nHeld-out routing vs {name}:")
+        print(f"{'margin':>8s} {'fast':>8s} {'agreement':>10s}")
+        reports[name] = []
+        for threshold in sorted(set(REPORT_MARGINS + (margin,))):
+            report = cascade.routing_report(pipeline, texts, reference, threshold)
+            reports[name].append(report)
+            agreement = report['fast_agreement']
+            print(f"{threshold:8.2f} {report['fast_fraction']:8.1%} "
+                  f"{agreement if agreement is None else format(agreement, '.1%'):>10s}"
+                  f"{'  <- configured' if threshold == margin else ''}")
+
+    # Ship a model fitted on everything; the held-out numbers above describe it closely enough
+    pipeline.fit(data['text'].tolist(), data['label'].tolist())
+    cascade.save_cascade(pipeline, output_path, trained_at=datetime.now().isoformat(),
+                         samples=int(len(data)), margin=margin, reports=reports)
+    print(f"\n✅ Cascade model saved to {output_path}")
+    return reports
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Train the fast first stage of the sentiment cascade')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='Path to sentiment.db')
+    parser.add_argument('--csv', action='append', default=[],
+                        help="Labelled CSV with 'text' and 'label' columns (repeatable)")
+    parser.add_argument('--margin', type=float, default=float(os.environ.get('SENTIMENT_CASCADE_MARGIN', '0.5')),
+                        help='Top-two probability margin the fast stage must reach to answer')
+    parser.add_argument('--no-bert', action='store_true', help='Skip the IndoBERT agreement report')
+    parser.add_argument('--output', default=cascade.CASCADE_MODEL_PATH)
+    args = parser.parse_args()
+
+    csv_paths = args.csv or (['dummy_train.csv'] if os.path.exists('dummy_train.csv') else [])
+    train_cascade(db_path=args.db, csv_paths=csv_paths, margin=args.margin,
+                  compare_bert=not args.no_bert, output_path=args.output)
@@ -0,0 +1,70 @@
+"""
+Warm the persistent prediction store from the texts in the analyses table.
+
+Usage:
+    python -m backend.scripts.warm_prediction_cache [--store instance/prediction_cache.db]
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+
+from backend.services import model_loader
+from backend.services.prediction_cache import make_cache_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join('instance', 'sentiment.db')
+DEFAULT_STORE_PATH = os.path.join('instance', 'prediction_cache.db')
+
+
+def iter_texts(db_path, chunk_size):
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute('SELECT DISTINCT text FROM analyses')
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [row[0] for row in rows if row[0] and row[0].strip()]
+    finally:
+        conn.close()
+
+
+def warm(db_path=DEFAULT_DB_PATH, store_path=DEFAULT_STORE_PATH, batch_size=64):
+    if not os.path.exists(db_path):
+        print(f"Database not found: {db_path}")
+        return
+
+    store = model_loader.enable_prediction_store(store_path)
+    model_loader.load_model()
+    fingerprint = model_loader.get_model_fingerprint()
+
+    seen = 0
+    computed = 0
+    for texts in iter_texts(db_path, chunk_size=batch_size * 8):
+        seen += len(texts)
+        keys = [make_cache_key(text, fingerprint) for text in texts]
+        stored = store.get_many(keys)
+        missing = [text for text, key in zip(texts, keys) if key not in stored]
+        if missing:
+            model_loader.predict_sentiment_many(missing, batch_size=batch_size)
+            computed += len(missing)
+        print(f"Processed {seen} texts ({computed} newly classified)")
+
+    store.flush()
+    print(f"\n✅ Prediction store warmed: {seen} texts, {computed} classified, {seen - computed} already cached")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Warm the persistent prediction store from analysis history')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='Path to sentiment.db')
+    parser.add_argument('--store', default=os.environ.get('SENTIMENT_PREDICTION_STORE') or DEFAULT_STORE_PATH,
+                        help='Path to the prediction store database')
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+
+    warm(db_path=args.db, store_path=args.store, batch_size=args.batch_size)
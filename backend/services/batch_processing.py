@@ -0,0 +1,340 @@
+"""
+Shared pieces of batch classification for uploaded CSV/Excel review files.
+
+Files are read in fixed-size chunks (pandas chunked CSV reader, openpyxl
+read-only mode for Excel), each chunk is classified with one batched model
+call, and BatchAggregator keeps the running totals, per-product stats and
+negative-review keywords without holding the rows themselves.
+"""
+import re
+import shutil
+import tempfile
+from collections import Counter
+
+from backend.services.model_loader import dedup_stats, predict_sentiment_many
+
+CHUNK_ROWS = 512
+TEXT_COLUMNS = ['text', 'review', 'content', 'komentar', 'ulasan', 'comment']
+PRODUCT_COLUMNS = ['product', 'produk', 'nama produk', 'product name', 'item']
+SENTIMENT_LABELS = ('Positif', 'Negatif', 'Netral')
+# format -> (mimetype, file extension) of the export endpoints
+EXPORT_FORMATS = {
+    'csv': ('text/csv', '.csv'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+    'arrow': ('application/vnd.apache.arrow.file', '.arrow')
+}
+STOPWORDS = {'yang', 'dan', 'di', 'tidak', 'ini', 'ke', 'untuk', 'dari', 'dengan', 'saya', 'nya'}
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def spool_upload(file):
+    """
+    Copy an uploaded file into a temporary file owned by the caller
+    Flask closes request files when the view returns, before a streamed
+    response is generated, so streaming readers need their own handle.
+    Returns: seekable temporary file positioned at the start
+    """
+    spooled = tempfile.TemporaryFile()
+    shutil.copyfileobj(file.stream, spooled, 1024 * 1024)
+    spooled.seek(0)
+    return spooled
+
+
+def iter_upload_chunks(file, filename, chunk_rows=CHUNK_ROWS):
+    """
+    Read an uploaded CSV or .xlsx file chunk by chunk
+    Returns: generator of DataFrames whose index is the 0-based data row number
+    """
+    import pandas as pd
+
+    if filename.endswith('.csv'):
+        yield from pd.read_csv(file, chunksize=chunk_rows)
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) if name is not None else f'Unnamed: {i}' for i, name in enumerate(header)]
+        offset = 0
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) == chunk_rows:
+                yield pd.DataFrame.from_records(buffer, columns=columns, index=range(offset, offset + len(buffer)))
+                offset += len(buffer)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame.from_records(buffer, columns=columns, index=range(offset, offset + len(buffer)))
+    finally:
+        workbook.close()
+
+
+def count_upload_rows(path, filename):
+    """
+    Count the data rows of a saved upload without keeping it in memory
+    Returns: number of rows below the header
+    """
+    if filename.endswith('.csv'):
+        import pandas as pd
+
+        return sum(len(chunk) for chunk in pd.read_csv(path, usecols=[0], chunksize=10000))
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True)
+    try:
+        sheet = workbook.active
+        # max_row comes from the sheet's stored dimensions, which some writers omit
+        if sheet.max_row is not None:
+            return max(sheet.max_row - 1, 0)
+        return max(sum(1 for _ in sheet.iter_rows(values_only=True)) - 1, 0)
+    finally:
+        workbook.close()
+
+
+def validate_upload(files):
+    """
+    Validate the 'file' part of a batch upload
+    Returns: (file, None) or (None, error message)
+    """
+    if 'file' not in files:
+        return None, 'No file part'
+    file = files['file']
+    if file.filename == '':
+        return None, 'No selected file'
+    if not (file.filename.endswith('.csv') or file.filename.endswith('.xlsx')):
+        return None, 'File must be CSV or Excel'
+    return file, None
+
+
+def find_columns(df):
+    """
+    Pick the review text column (known names first, else the first string
+    column) and the optional product column
+    Returns: (text_col, product_col), either may be None
+    """
+    text_col = next((col for col in df.columns if str(col).lower() in TEXT_COLUMNS), None)
+    if text_col is None:
+        text_col = next((col for col in df.columns if df[col].dtype == 'object'), None)
+    product_col = next((col for col in df.columns if str(col).lower() in PRODUCT_COLUMNS), None)
+    return text_col, product_col
+
+
+def classify_chunk(df, text_col, product_col=None):
+    """
+    Classify one chunk with a single batched model call
+    Missing, blank and too-short texts are filtered out column-wise first;
+    repeated texts are classified once and fanned back out to their rows.
+    Returns: DataFrame with text, sentiment, confidence, original_row (and
+    product) columns, indexed like the input rows; attrs['unique_texts'] holds
+    the number of distinct texts classified
+    """
+    import pandas as pd
+
+    texts = df[text_col]
+    texts = texts[texts.notna()].astype(str)
+    texts = texts[texts.str.strip().str.len() >= 3]
+
+    predictions, stats = predict_sentiment_many(texts.tolist(), with_stats=True)
+    frame = pd.DataFrame({
+        'text': texts,
+        'sentiment': [sentiment for sentiment, _ in predictions],
+        'confidence': [float(confidence) for _, confidence in predictions],
+        'original_row': texts.index.astype('int64')
+    }, index=texts.index)
+    if product_col:
+        frame['product'] = df.loc[texts.index, product_col].astype(str)
+    frame.attrs['unique_texts'] = stats['unique_texts']
+    return frame
+
+
+def results_to_records(frame):
+    """
+    Returns: list of result dicts in the API's response shape
+    """
+    return frame.to_dict(orient='records')
+
+
+def export_frame(rows, results):
+    """
+    Join predictions back onto the uploaded rows with compact dtypes
+    Rows without a prediction (blank or too-short text) keep empty sentiment/confidence.
+    Original columns are written as strings, so every chunk of a file has the same schema;
+    a clashing column name gets a '_predicted' suffix on the prediction side.
+    Returns: DataFrame with the original columns, then row (int32),
+    sentiment (categorical) and confidence (float32)
+    """
+    import pandas as pd
+
+    frame = rows.astype('string')
+    frame.columns = [str(column) for column in frame.columns]
+    predicted = pd.DataFrame({
+        'row': rows.index.astype('int32'),
+        'sentiment': pd.Categorical(results['sentiment'].reindex(rows.index), categories=SENTIMENT_LABELS),
+        'confidence': results['confidence'].reindex(rows.index).astype('float32')
+    }, index=rows.index)
+    return frame.join(predicted, rsuffix='_predicted')
+
+
+def iter_csv_export(frames):
+    """
+    frames is a generator of export frames; it is closed when the output is
+    Returns: generator of CSV text, one piece per export frame, header first
+    """
+    header = True
+    try:
+        for frame in frames:
+            yield frame.to_csv(index=False, header=header)
+            header = False
+    finally:
+        frames.close()
+
+
+def write_columnar_export(frames, fmt, out):
+    """
+    Write export frames to a binary file object as Parquet or an Arrow IPC file,
+    one row group / record batch per frame
+    Returns: number of rows written
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    schema = None
+    rows = 0
+    try:
+        for frame in frames:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = pq.ParquetWriter(out, schema, compression='zstd') if fmt == 'parquet' \
+                    else pa.ipc.new_file(out, schema)
+            else:
+                table = table.cast(schema)
+            writer.write_table(table)
+            rows += table.num_rows
+        if writer is None:
+            # No rows at all: still write a valid file with the prediction columns
+            empty = export_frame(pd.DataFrame(index=pd.RangeIndex(0)),
+                                 pd.DataFrame({'sentiment': [], 'confidence': []}))
+            table = pa.Table.from_pandas(empty, preserve_index=False)
+            writer = pq.ParquetWriter(out, table.schema) if fmt == 'parquet' else pa.ipc.new_file(out, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+        frames.close()
+    return rows
+
+
+class BatchAggregator:
+    """
+    Running sentiment totals, per-product stats and negative-review keyword
+    counts for a batch; memory grows with the number of products, not rows.
+    Each chunk is folded in with value_counts/groupby over its result frame.
+    """
+
+    def __init__(self, has_products=False):
+        import pandas as pd
+
+        self.has_products = has_products
+        self.stats = {label: 0 for label in SENTIMENT_LABELS}
+        self.product_counts = pd.DataFrame(columns=list(SENTIMENT_LABELS), dtype='int64')
+        self.negative_keywords = Counter()
+        self.total = 0
+        self.unique_texts = 0
+
+    def add(self, frame):
+        if frame.empty:
+            return
+        for label, count in frame['sentiment'].value_counts().items():
+            self.stats[label] += int(count)
+        self.total += len(frame)
+        # Frames not produced by classify_chunk (e.g. restored results) count every row as unique
+        self.unique_texts += frame.attrs.get('unique_texts', len(frame))
+
+        if not self.has_products or 'product' not in frame:
+            return
+        counts = frame.groupby('product', sort=False)['sentiment'].value_counts() \
+            .unstack(fill_value=0).reindex(columns=list(SENTIMENT_LABELS), fill_value=0)
+        # Keep products in order of first appearance
+        new_products = counts.index[~counts.index.isin(self.product_counts.index)]
+        self.product_counts = self.product_counts.reindex(self.product_counts.index.append(new_products), fill_value=0)
+        self.product_counts.loc[counts.index] += counts.astype('int64')
+
+        # Only negative reviews feed the "common complaints" insight
+        words = frame.loc[frame['sentiment'] == 'Negatif', 'text'].str.lower().str.findall(WORD_PATTERN).explode()
+        words = words[words.notna() & (words.str.len() > 3) & ~words.isin(STOPWORDS)]
+        self.negative_keywords.update(words.value_counts().to_dict())
+
+    def product_table(self):
+        """
+        Returns: DataFrame of per-product counts, total and percentages
+        """
+        table = self.product_counts.copy()
+        table['total'] = table[list(SENTIMENT_LABELS)].sum(axis=1)
+        table['positive_pct'] = (table['Positif'] / table['total'] * 100).round().astype('int64')
+        table['negative_pct'] = (table['Negatif'] / table['total'] * 100).round().astype('int64')
+        return table
+
+    def product_stats(self, table=None):
+        """
+        Returns: dict of product -> counts, total and percentages
+        """
+        table = self.product_table() if table is None else table
+        return {
+            str(product): {column: int(value) for column, value in row.items()}
+            for product, row in table.iterrows()
+        }
+
+    def insights(self, table=None):
+        """
+        Returns: list of insight cards (best product, product needing attention, common complaints)
+        """
+        if not self.has_products or self.product_counts.empty:
+            return []
+        table = self.product_table() if table is None else table
+
+        insights = []
+        best_product = table['positive_pct'].idxmax()
+        insights.append({
+            'type': 'success',
+            'icon': '🌟',
+            'title': 'Produk Terbaik',
+            'message': f"{best_product} memiliki {table.at[best_product, 'positive_pct']}% review positif!"
+        })
+
+        worst_product = table['negative_pct'].idxmax()
+        if table.at[worst_product, 'negative_pct'] > 30:
+            insights.append({
+                'type': 'warning',
+                'icon': '⚠️',
+                'title': 'Perlu Perhatian',
+                'message': f"{worst_product} mendapat {table.at[worst_product, 'negative_pct']}% review negatif. Perlu ditingkatkan."
+            })
+
+        common_issues = self.negative_keywords.most_common(3)
+        if common_issues:
+            issue_keywords = ', '.join([f'"{word}"' for word, count in common_issues])
+            insights.append({
+                'type': 'info',
+                'icon': '💡',
+                'title': 'Keluhan Umum',
+                'message': f'Kata yang sering muncul di review negatif: {issue_keywords}'
+            })
+        return insights
+
+    def summary(self):
+        summary = {'stats': self.stats, 'total': self.total, 'has_products': self.has_products,
+                   'dedup': dedup_stats(self.total, self.unique_texts)}
+        if self.has_products:
+            table = self.product_table()
+            summary['product_stats'] = self.product_stats(table)
+            summary['insights'] = self.insights(table)
+        return summary
@@ -0,0 +1,107 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collects single-item requests from many threads into micro-batches.
+
+    Callers block in submit() while a background worker groups pending items
+    (up to max_batch_size, waiting at most max_wait_ms after the first one)
+    and runs batch_fn once per group. batch_fn must return one result per
+    input, in order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=8, name='micro-batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self.batches_run = 0
+        self.items_processed = 0
+
+    def submit(self, item, timeout=None):
+        """
+        Queue one item and wait for its result.
+        Exceptions raised by batch_fn are re-raised in the calling thread.
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future.result(timeout=timeout)
+
+    def submit_many(self, items, timeout=None):
+        """
+        Queue several items at once so they can share a batch with other callers.
+        Returns: list of results in input order
+        """
+        self._ensure_worker()
+        futures = []
+        for item in items:
+            future = Future()
+            self._queue.put((item, future))
+            futures.append(future)
+        return [future.result(timeout=timeout) for future in futures]
+
+    def stats(self):
+        return {
+            'batches_run': self.batches_run,
+            'items_processed': self.items_processed,
+            'avg_batch_size': round(self.items_processed / self.batches_run, 2) if self.batches_run else 0,
+            'pending': self._queue.qsize(),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0
+        }
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        # Block for the first item, then drain whatever arrives before the deadline
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"{self.name}: batch_fn returned {len(results)} results for {len(items)} items"
+                    )
+            except Exception as e:
+                logger.error(f"Batch inference failed ({len(items)} items): {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.items_processed += len(items)
+            for future, result in zip(futures, results):
+                future.set_result(result)
@@ -0,0 +1,147 @@
+"""
+Confidence-gated cascade: a TF-IDF + logistic regression model answers the
+texts it is sure about, everything else falls through to IndoBERT.
+
+Confidence is measured as the margin between the two most likely classes;
+only predictions with a margin of at least the configured threshold are
+accepted from the fast stage.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CASCADE_MODEL_PATH = os.environ.get('SENTIMENT_CASCADE_MODEL', os.path.join('cascade_model', 'cascade.joblib'))
+LABELS = ('Positif', 'Netral', 'Negatif')
+
+
+def build_pipeline():
+    """
+    Word and character n-gram TF-IDF features into a multinomial logistic regression
+    Character n-grams keep slang, elongated words and typos from becoming unknown tokens.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import FeatureUnion, Pipeline
+
+    features = FeatureUnion([
+        ('word', TfidfVectorizer(lowercase=True, ngram_range=(1, 2), min_df=1, sublinear_tf=True)),
+        ('char', TfidfVectorizer(lowercase=True, analyzer='char_wb', ngram_range=(3, 5), min_df=2,
+                                 sublinear_tf=True, max_features=200000))
+    ])
+    return Pipeline([
+        ('features', features),
+        ('classifier', LogisticRegression(max_iter=2000, C=4.0, class_weight='balanced'))
+    ])
+
+
+def top_two_margin(probabilities):
+    """
+    Returns: per-row difference between the highest and second-highest probability
+    """
+    ordered = np.sort(probabilities, axis=-1)
+    return ordered[:, -1] - ordered[:, -2]
+
+
+class CascadeClassifier:
+    """
+    Fast first stage of the cascade, wrapping a fitted scikit-learn pipeline
+    """
+
+    def __init__(self, pipeline, margin_threshold, metadata=None):
+        self.pipeline = pipeline
+        self.margin_threshold = margin_threshold
+        self.metadata = metadata or {}
+        self._lock = threading.Lock()
+        self.fast = 0
+        self.fallback = 0
+        self.fast_seconds = 0.0
+
+    def predict(self, texts):
+        """
+        Classify texts with the fast model
+        Returns: list with (sentiment_label, confidence_score) for confident texts
+        and None for the ones that must go to the next stage
+        """
+        if not texts:
+            return []
+        start = time.perf_counter()
+        probabilities = self.pipeline.predict_proba(texts)
+        margins = top_two_margin(probabilities)
+        best = probabilities.argmax(axis=-1)
+        classes = self.pipeline.classes_
+
+        results = [
+            (str(classes[label_id]), float(probabilities[i, label_id])) if margins[i] >= self.margin_threshold else None
+            for i, label_id in enumerate(best)
+        ]
+        accepted = sum(1 for result in results if result is not None)
+        with self._lock:
+            self.fast += accepted
+            self.fallback += len(results) - accepted
+            self.fast_seconds += time.perf_counter() - start
+        return results
+
+    def stats(self):
+        with self._lock:
+            total = self.fast + self.fallback
+            return {
+                'margin_threshold': self.margin_threshold,
+                'fast': self.fast,
+                'fallback': self.fallback,
+                'fast_fraction': round(self.fast / total, 4) if total else 0.0,
+                'avg_fast_us': round(self.fast_seconds / total * 1e6, 1) if total else 0.0,
+                'trained_at': self.metadata.get('trained_at'),
+                'samples': self.metadata.get('samples')
+            }
+
+
+def save_cascade(pipeline, path=CASCADE_MODEL_PATH, **metadata):
+    import joblib
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_path = path + '.tmp'
+    joblib.dump({'pipeline': pipeline, 'metadata': metadata}, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_cascade(path=CASCADE_MODEL_PATH, margin_threshold=0.5):
+    """
+    Returns: CascadeClassifier, or None if no trained cascade exists at path
+    """
+    if not os.path.exists(path):
+        return None
+    import joblib
+
+    saved = joblib.load(path)
+    return CascadeClassifier(saved['pipeline'], margin_threshold, saved.get('metadata'))
+
+
+def routing_report(pipeline, texts, reference_labels, margin_threshold):
+    """
+    Evaluate the cascade routing on a held-out set against reference labels
+    (IndoBERT predictions, or gold labels)
+    Returns: dict with the fraction routed to each stage and label agreement
+    """
+    probabilities = pipeline.predict_proba(texts)
+    predicted = pipeline.classes_[probabilities.argmax(axis=-1)]
+    confident = top_two_margin(probabilities) >= margin_threshold
+    reference = np.asarray(reference_labels)
+    agree = predicted == reference
+
+    return {
+        'margin_threshold': margin_threshold,
+        'samples': int(len(texts)),
+        'fast_fraction': round(float(confident.mean()), 4) if len(texts) else 0.0,
+        'fallback_fraction': round(float(1 - confident.mean()), 4) if len(texts) else 0.0,
+        # Agreement on the texts the fast stage would actually answer
+        'fast_agreement': round(float(agree[confident].mean()), 4) if confident.any() else None,
+        # Agreement of the fast model on everything, i.e. without gating
+        'ungated_agreement': round(float(agree.mean()), 4) if len(texts) else None
+    }
@@ -0,0 +1,353 @@
+"""
+Write-behind buffer for analysis history rows.
+
+With SENTIMENT_WRITE_BEHIND=1, /api/classify hands its Analysis row to
+HistoryWriter instead of committing it on the request path. A background
+thread writes queued rows in one transaction (a group commit) every
+flush_rows rows or flush_ms milliseconds, whichever comes first, so many
+requests share one fsync. Rows go through the ORM, so the term index and
+stats rollup listeners still run in the same transaction.
+
+Ids are reserved in blocks from id_allocations before the row is written,
+so the response can already carry the analysis id. While write-behind is
+on, other code must not insert analyses with autoincrement ids, or they
+could take an id that is reserved but not yet written.
+
+The buffer is bounded: enqueue blocks while it is full and raises
+HistoryBufferFull after enqueue_timeout seconds. Pending rows are drained
+on shutdown. A batch that keeps failing is retried row by row, so only the
+rows that cannot be written are dropped; those are logged by id and counted
+in stats().
+
+With several worker processes, feedback may reach a worker other than the
+one whose buffer still holds the row; wait_for_row then polls the database
+for up to ROW_WAIT_INTERVALS flush intervals (at least a second) before the
+caller gives up with a 404.
+"""
+import atexit
+import logging
+from collections import deque
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from backend.extensions import db
+from backend.models.models import Analysis
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = os.environ.get('SENTIMENT_WRITE_BEHIND', '0') == '1'
+WRITE_BEHIND_MAX_PENDING = int(os.environ.get('SENTIMENT_WRITE_BEHIND_MAX_PENDING', '1000'))
+WRITE_BEHIND_FLUSH_ROWS = int(os.environ.get('SENTIMENT_WRITE_BEHIND_FLUSH_ROWS', '64'))
+WRITE_BEHIND_FLUSH_MS = float(os.environ.get('SENTIMENT_WRITE_BEHIND_FLUSH_MS', '50'))
+WRITE_BEHIND_ENQUEUE_TIMEOUT = float(os.environ.get('SENTIMENT_WRITE_BEHIND_ENQUEUE_TIMEOUT', '2'))
+ID_BLOCK_SIZE = int(os.environ.get('SENTIMENT_WRITE_BEHIND_ID_BLOCK', '100'))
+FLUSH_ATTEMPTS = 3
+# How long wait_for_row polls for a row another worker still buffers, in flush intervals
+ROW_WAIT_INTERVALS = 4
+ROW_WAIT_MIN_SECONDS = 1.0
+ROW_WAIT_POLL_SECONDS = 0.02
+
+_ENSURE_ALLOCATION = text(
+    'INSERT INTO id_allocations (name, next_id) '
+    # WHERE true: SQLite needs it to tell the upsert clause apart from a join constraint
+    'SELECT :name, COALESCE(MAX(id), 0) + 1 FROM analyses WHERE true '
+    'ON CONFLICT (name) DO NOTHING'
+)
+# Never hand out an id at or below one that already exists, whoever wrote it
+_ID_HANDED_OUT = text('SELECT 1 FROM id_allocations WHERE name = :name AND next_id > :id')
+_ROW_EXISTS = text('SELECT 1 FROM analyses WHERE id = :id')
+_RESERVE_BLOCK = text(
+    'UPDATE id_allocations '
+    'SET next_id = MAX(next_id, (SELECT COALESCE(MAX(id), 0) + 1 FROM analyses)) + :size '
+    'WHERE name = :name RETURNING next_id'
+)
+
+
+class HistoryBufferFull(Exception):
+    pass
+
+
+def history_query(user_id):
+    """
+    Returns: query over the user's analyses, newest first (what /api/history pages through)
+    """
+    return Analysis.query.filter_by(user_id=int(user_id)).order_by(Analysis.created_at.desc())
+
+
+class IdBlockAllocator:
+    """
+    Hands out analysis ids from blocks reserved in id_allocations; one atomic
+    UPDATE per block, so worker processes never share an id
+    """
+
+    def __init__(self, name='analyses', block_size=ID_BLOCK_SIZE):
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def allocate(self):
+        with self._lock:
+            if self._next >= self._end:
+                with db.engine.begin() as connection:
+                    connection.execute(_ENSURE_ALLOCATION, {'name': self.name})
+                    end = connection.execute(_RESERVE_BLOCK, {'name': self.name, 'size': self.block_size}).scalar()
+                self._next, self._end = end - self.block_size, end
+            allocated = self._next
+            self._next += 1
+            return allocated
+
+
+class HistoryWriter:
+    """
+    Bounded in-memory queue of Analysis rows flushed in group commits by one background thread
+    """
+
+    def __init__(self, max_pending=WRITE_BEHIND_MAX_PENDING, flush_rows=WRITE_BEHIND_FLUSH_ROWS,
+                 flush_ms=WRITE_BEHIND_FLUSH_MS, enqueue_timeout=WRITE_BEHIND_ENQUEUE_TIMEOUT):
+        self.max_pending = max_pending
+        self.flush_rows = flush_rows
+        self.flush_ms = flush_ms
+        self.enqueue_timeout = enqueue_timeout
+        self.app = None
+        self.allocator = IdBlockAllocator()
+        self._condition = threading.Condition()
+        # (sequence, row) in queue order, plus id -> sequence for lookups
+        self._pending = deque()
+        self._pending_ids = {}
+        self._in_flight = set()
+        self._oldest = None
+        # Rows up to this sequence number are written without waiting for the next interval
+        self._flush_through = 0
+        self._closed = False
+        self._thread = None
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.backpressure_waits = 0
+        self.row_retries = 0
+        self.dropped_ids = deque(maxlen=20)
+        self.last_error = None
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['history_writer'] = self
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def enqueue(self, user_id, text_value, sentiment, confidence):
+        """
+        Queue an analysis row for the next group commit
+        Blocks while the buffer is full; raises HistoryBufferFull after enqueue_timeout seconds.
+        Returns: the id the row will be written with
+        """
+        row = {
+            'id': self.allocator.allocate(),
+            'user_id': int(user_id),
+            'text': text_value,
+            'sentiment': sentiment,
+            'confidence': confidence,
+            'created_at': datetime.utcnow()
+        }
+        deadline = time.monotonic() + self.enqueue_timeout
+        with self._condition:
+            if self._closed:
+                raise HistoryBufferFull('History writer is shut down')
+            self._ensure_started()
+            while len(self._pending) >= self.max_pending:
+                self.backpressure_waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise HistoryBufferFull(f'History buffer full ({self.max_pending} rows pending)')
+                self._condition.wait(remaining)
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self.queued += 1
+            self._pending.append((self.queued, row))
+            self._pending_ids[row['id']] = self.queued
+            self._condition.notify_all()
+        return row['id']
+
+    def _is_pending(self, analysis_id):
+        return analysis_id in self._pending_ids or analysis_id in self._in_flight
+
+    def is_pending(self, analysis_id):
+        with self._condition:
+            return self._is_pending(analysis_id)
+
+    def flush(self, analysis_id=None, timeout=5.0):
+        """
+        Write queued rows now instead of at the next interval: only as far as
+        analysis_id when one is given, otherwise everything queued so far
+        Returns: True if those rows left the buffer within timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if analysis_id is not None:
+                through = self._pending_ids.get(analysis_id)
+                waiting_for = {analysis_id}
+            else:
+                through = self.queued
+                waiting_for = set(self._pending_ids) | self._in_flight
+            if self._thread is None:
+                return not any(self._is_pending(i) for i in waiting_for)
+            if through is not None and through > self._flush_through:
+                self._flush_through = through
+                self._condition.notify_all()
+            while any(self._is_pending(i) for i in waiting_for):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def wait_for_row(self, analysis_id, timeout=None):
+        """
+        Wait until a write-behind row is in the database: flush it when this
+        process holds it, otherwise poll, since another worker may still buffer it.
+        Ids that were never handed out return at once.
+        Returns: True if the row is stored
+        """
+        if self.is_pending(analysis_id):
+            self.flush(analysis_id)
+        if timeout is None:
+            timeout = max(ROW_WAIT_MIN_SECONDS, ROW_WAIT_INTERVALS * self.flush_ms / 1000)
+        deadline = time.monotonic() + timeout
+        checked_allocation = False
+        while True:
+            # A new connection per attempt, so each read sees the latest commit
+            with db.engine.connect() as connection:
+                if connection.execute(_ROW_EXISTS, {'id': analysis_id}).first() is not None:
+                    return True
+                if not checked_allocation:
+                    if connection.execute(_ID_HANDED_OUT, {'name': self.allocator.name,
+                                                           'id': analysis_id}).first() is None:
+                        return False
+                    checked_allocation = True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(ROW_WAIT_POLL_SECONDS)
+
+    def close(self, timeout=10.0):
+        # Drain and stop; registered with atexit when the writer thread starts
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.error(f"History writer did not drain within {timeout}s; {len(self._pending)} rows lost")
+
+    def stats(self):
+        with self._condition:
+            return {
+                'enabled': True,
+                'pending': len(self._pending) + len(self._in_flight),
+                'max_pending': self.max_pending,
+                'queued': self.queued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'dropped_ids': list(self.dropped_ids),
+                'last_error': self.last_error,
+                'batches': self.batches,
+                'largest_batch': self.largest_batch,
+                'row_retries': self.row_retries,
+                'backpressure_waits': self.backpressure_waits
+            }
+
+    def _batch_due(self):
+        return (self._closed or self._pending[0][0] <= self._flush_through
+                or len(self._pending) >= self.flush_rows
+                or time.monotonic() >= self._oldest + self.flush_ms / 1000.0)
+
+    def _take_batch(self):
+        # Wait until a batch is due: enough rows, the oldest row is flush_ms old, a flush asked for it or shutdown
+        with self._condition:
+            while not self._pending or not self._batch_due():
+                if not self._pending:
+                    if self._closed:
+                        return None
+                    self._condition.wait()
+                else:
+                    self._condition.wait(self._oldest + self.flush_ms / 1000.0 - time.monotonic())
+            batch = [self._pending.popleft()[1] for _ in range(min(len(self._pending), self.flush_rows * 4))]
+            for row in batch:
+                del self._pending_ids[row['id']]
+            self._oldest = time.monotonic() if self._pending else None
+            self._in_flight = {row['id'] for row in batch}
+            # Room in the buffer again: wake producers blocked on backpressure
+            self._condition.notify_all()
+            return batch
+
+    def _commit(self, rows):
+        try:
+            db.session.add_all(Analysis(**row) for row in rows)
+            db.session.commit()
+            return None
+        except Exception as e:
+            db.session.rollback()
+            return e
+        finally:
+            db.session.expunge_all()
+
+    def _write(self, batch):
+        """
+        Commit a batch, retrying it FLUSH_ATTEMPTS times and then row by row
+        Returns: (rows written, ids dropped, last error)
+        """
+        error = None
+        for attempt in range(1, FLUSH_ATTEMPTS + 1):
+            error = self._commit(batch)
+            if error is None:
+                return len(batch), [], None
+            logger.error(f"History flush of {len(batch)} rows failed (attempt {attempt}/{FLUSH_ATTEMPTS}): {error}")
+            time.sleep(0.1 * attempt)
+
+        # One bad row must not cost the rest of the batch; their ids are already with the clients
+        written, dropped = 0, []
+        for row in batch:
+            row_error = self._commit([row])
+            if row_error is None:
+                written += 1
+            else:
+                error = row_error
+                dropped.append(row['id'])
+                logger.error(f"Dropping analysis {row['id']} of user {row['user_id']}: {row_error}")
+        return written, dropped, error
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                batch = self._take_batch()
+                if batch is None:
+                    break
+                written, dropped, error = self._write(batch)
+                with self._condition:
+                    self._in_flight = set()
+                    self.written += written
+                    self.batches += 1
+                    self.largest_batch = max(self.largest_batch, len(batch))
+                    if error is not None:
+                        # The batch itself failed and was retried row by row
+                        self.row_retries += len(batch)
+                        self.last_error = str(error)
+                    self.dropped += len(dropped)
+                    self.dropped_ids.extend(dropped)
+                    self._condition.notify_all()
+            db.session.remove()
+
+
+history_writer = HistoryWriter()
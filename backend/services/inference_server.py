@@ -0,0 +1,217 @@
+"""
+Standalone inference daemon that owns the model for every web worker on the host.
+
+Web workers started with SENTIMENT_INFERENCE_SOCKET set do not load the model
+themselves; model_loader forwards predictions to this process over a Unix
+domain socket instead. Requests from all workers meet in the daemon's
+micro-batcher and prediction cache, so one well-batched model serves them all.
+
+Framing: each message is a 5-byte header (1-byte codec id, 4-byte big-endian
+payload length) followed by the payload, encoded with msgpack when it is
+installed and JSON otherwise. Replies use the codec of the request.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+HEADER = struct.Struct('>BI')
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+DEFAULT_TIMEOUT = float(os.environ.get('SENTIMENT_INFERENCE_TIMEOUT', '120'))
+
+
+class InferenceServerError(RuntimeError):
+    pass
+
+
+def encode_message(message, codec=None):
+    if codec is None:
+        codec = CODEC_MSGPACK if msgpack is not None else CODEC_JSON
+    if codec == CODEC_MSGPACK:
+        payload = msgpack.packb(message, use_bin_type=True)
+    else:
+        payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    return HEADER.pack(codec, len(payload)) + payload
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise ConnectionError('Connection closed mid-message')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def read_message(sock):
+    """
+    Read one framed message
+    Returns: (message, codec), or (None, None) if the peer closed the connection cleanly
+    """
+    first = sock.recv(HEADER.size)
+    if not first:
+        return None, None
+    header = first + _recv_exact(sock, HEADER.size - len(first))
+    codec, size = HEADER.unpack(header)
+    if size > MAX_MESSAGE_BYTES:
+        raise InferenceServerError(f'Message too large: {size} bytes')
+    payload = _recv_exact(sock, size)
+
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise InferenceServerError('Received msgpack message but msgpack is not installed')
+        return msgpack.unpackb(payload, raw=False), codec
+    if codec == CODEC_JSON:
+        return json.loads(payload.decode('utf-8')), codec
+    raise InferenceServerError(f'Unknown codec id {codec}')
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        # One connection per client thread; it carries any number of requests
+        while True:
+            try:
+                message, codec = read_message(self.request)
+            except (ConnectionError, InferenceServerError) as e:
+                logger.warning(f"Dropping inference client: {e}")
+                return
+            if message is None:
+                return
+
+            try:
+                reply = {'ok': True, 'result': self.server.dispatch(message)}
+            except Exception as e:
+                logger.error(f"Inference request failed: {e}")
+                reply = {'ok': False, 'error': str(e)}
+            self.request.sendall(encode_message(reply, codec))
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Threaded Unix socket server that answers requests with the local model_loader
+    """
+    daemon_threads = True
+    # Every web worker thread holds its own connection, so bursts of connects are normal
+    request_queue_size = 128
+
+    def __init__(self, socket_path, loader):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        directory = os.path.dirname(socket_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.socket_path = socket_path
+        self.loader = loader
+        super().__init__(socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o660)
+
+    def dispatch(self, message):
+        op = message.get('op')
+        if op == 'predict':
+            # Goes through the shared micro-batcher so requests from all workers batch together
+            return self.loader.predict_sentiment_scheduled(message['texts'])
+        if op == 'predict_many':
+            return self.loader.predict_sentiment_many(message['texts'],
+                                                      batch_size=message.get('batch_size', self.loader.DEFAULT_BATCH_SIZE))
+        if op == 'aspects':
+            return self.loader.predict_with_aspects(message['text'])
+        if op == 'status':
+            return {
+                'model': self.loader.get_model_status(),
+                'batching': self.loader.get_batcher_stats(),
+                'cache': self.loader.get_cache_stats(),
+                'cascade': self.loader.get_cascade_stats()
+            }
+        if op == 'reload':
+            self.loader.reload_model()
+            return self.loader.get_model_status()
+        raise InferenceServerError(f'Unknown op: {op}')
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class InferenceClient:
+    """
+    Thin client for InferenceServer; each calling thread keeps its own connection
+    """
+
+    def __init__(self, socket_path, timeout=DEFAULT_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def call(self, op, **params):
+        """
+        Send one request and wait for its reply
+        A stale connection (e.g. after a server restart) is retried once on a fresh one.
+        Returns: the 'result' of the reply
+        """
+        params['op'] = op
+        request = encode_message(params)
+        for attempt in (1, 2):
+            sock = getattr(self._local, 'sock', None)
+            reused = sock is not None
+            try:
+                if sock is None:
+                    sock = self._connect()
+                sock.sendall(request)
+                reply, _ = read_message(sock)
+                if reply is None:
+                    raise ConnectionError('Inference server closed the connection')
+                break
+            except socket.timeout:
+                # The request may still be running on the server; do not send it twice
+                self._close()
+                raise InferenceServerError(f'Inference server timed out after {self.timeout}s')
+            except (OSError, ConnectionError) as e:
+                self._close()
+                if attempt == 2 or not reused:
+                    raise InferenceServerError(f'Inference server unavailable at {self.socket_path}: {e}')
+
+        if not reply.get('ok'):
+            raise InferenceServerError(reply.get('error', 'Unknown inference server error'))
+        return reply['result']
+
+    def predict(self, texts, batch_size=None):
+        """
+        Returns: list of (sentiment_label, confidence_score) in input order
+        """
+        if not texts:
+            return []
+        if batch_size is None:
+            result = self.call('predict', texts=list(texts))
+        else:
+            result = self.call('predict_many', texts=list(texts), batch_size=batch_size)
+        return [tuple(prediction) for prediction in result]
@@ -0,0 +1,423 @@
+"""
+Background batch-classification jobs persisted in SQLite.
+
+A submitted file is saved under JOB_UPLOAD_DIR and recorded as a BatchJob.
+A bounded pool of worker threads classifies it chunk by chunk; every chunk's
+results and the job's resume point (rows_done) are committed in one
+transaction, so a restarted server picks unfinished jobs up from the last
+committed chunk instead of starting over.
+
+A claimed job records its owner (host, pid and this process's boot id). On
+startup, running jobs whose owner process is gone (same host, pid no longer
+alive or reused by this process after a restart) are reclaimed at once;
+every JOB_STALE_SECONDS the manager also rescans for jobs whose heartbeat
+went stale, which covers owners on other hosts.
+
+Uploads stay on disk after a job finishes, so exports can join the original
+columns back on; the same rescan deletes them JOB_UPLOAD_RETENTION_HOURS
+after the job finished (exports then fall back to the stored text).
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from backend.extensions import db
+from backend.models.models import PENDING_JOBS_WHERE, BatchJob, BatchJobResult
+from backend.services.batch_processing import BatchAggregator, classify_chunk, count_upload_rows, find_columns, \
+    iter_upload_chunks
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get('SENTIMENT_JOB_WORKERS', '2'))
+JOB_QUEUE_MAX = int(os.environ.get('SENTIMENT_JOB_QUEUE_MAX', '20'))
+JOB_CHUNK_ROWS = int(os.environ.get('SENTIMENT_JOB_CHUNK_ROWS', '256'))
+# A running job whose heartbeat is older than this belongs to a dead process and can be taken over
+JOB_STALE_SECONDS = int(os.environ.get('SENTIMENT_JOB_STALE_SECONDS', '120'))
+# How often a running job refreshes its heartbeat, also while a slow chunk (or the cold model load) runs
+JOB_HEARTBEAT_SECONDS = float(os.environ.get('SENTIMENT_JOB_HEARTBEAT_SECONDS', str(JOB_STALE_SECONDS / 4)))
+JOB_UPLOAD_DIR = os.path.join('uploads', 'jobs')
+# Uploads of finished jobs are deleted this long after the job finished; 0 keeps them forever
+JOB_UPLOAD_RETENTION_HOURS = float(os.environ.get('SENTIMENT_JOB_UPLOAD_RETENTION_HOURS', '168'))
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+BOOT_ID = uuid.uuid4().hex[:12]
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        # os.kill(pid, 0) would signal the process on Windows; leave these to the heartbeat rescan
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def owner_is_gone(owner, current_owner):
+    """
+    Whether the process recorded as a job's owner has certainly stopped
+    Only owners on this host can be checked; anything else waits for its heartbeat to go stale.
+    Returns: True if the job can be reclaimed now
+    """
+    if not owner or owner == current_owner:
+        return False
+    try:
+        host, pid, _boot = owner.rsplit(':', 2)
+        pid = int(pid)
+    except ValueError:
+        return False
+    current_host, current_pid, _ = current_owner.rsplit(':', 2)
+    if host != current_host:
+        return False
+    # Our pid with another boot id: an earlier run of this server that restarted with the same pid
+    return pid == int(current_pid) or not _pid_alive(pid)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def pending_jobs_query():
+    """
+    Returns: query of queued and running jobs, oldest first; resume_pending picks from these
+    """
+    return BatchJob.query.filter(db.text(PENDING_JOBS_WHERE)).order_by(BatchJob.created_at)
+
+
+class JobHeartbeat:
+    """
+    Refreshes a claimed job's heartbeat_at from a side thread while it runs
+    Sets .lost once the job is no longer running under this owner (cancelled or taken over).
+    """
+
+    def __init__(self, app, job_id, owner, interval=None):
+        self.app = app
+        self.job_id = job_id
+        self.owner = owner
+        self.interval = JOB_HEARTBEAT_SECONDS if interval is None else interval
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def beat(self):
+        with db.engine.begin() as connection:
+            updated = connection.execute(
+                BatchJob.__table__.update()
+                .where(BatchJob.id == self.job_id, BatchJob.owner == self.owner, BatchJob.status == 'running')
+                .values(heartbeat_at=datetime.utcnow())
+            ).rowcount
+        if not updated:
+            self.lost.set()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.beat()
+                except Exception as e:
+                    logger.warning(f"Heartbeat of batch job {self.job_id} failed: {e}")
+                if self.lost.is_set():
+                    return
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name=f'batch-job-heartbeat-{self.job_id[:8]}', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+class JobManager:
+    """
+    Bounded worker pool for BatchJobs
+    At most max_workers jobs run at once and at most max_queued more wait in
+    this process; further submissions are rejected with JobQueueFull.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, max_queued=JOB_QUEUE_MAX):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.app = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._active = set()
+        self._started = False
+        self._stop = threading.Event()
+        self._rescan_thread = None
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{BOOT_ID}'
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['job_manager'] = self
+
+        # Resume on the first request, so CLI scripts that import the app never pick up jobs
+        @app.before_request
+        def _start_job_manager():
+            if not self._started:
+                self.start()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.resume_pending()
+        self.sweep_uploads()
+        self._rescan_thread = threading.Thread(target=self._rescan, name='batch-job-rescan', daemon=True)
+        self._rescan_thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _rescan(self):
+        # Jobs of a crashed process on another host only become claimable once their heartbeat is stale
+        while not self._stop.wait(JOB_STALE_SECONDS):
+            try:
+                self.resume_pending()
+            except Exception as e:
+                logger.error(f"Batch job rescan failed: {e}")
+            try:
+                self.sweep_uploads()
+            except Exception as e:
+                logger.error(f"Batch job upload cleanup failed: {e}")
+
+    def sweep_uploads(self):
+        """
+        Delete uploads of jobs that finished more than JOB_UPLOAD_RETENTION_HOURS ago,
+        and old files no job refers to
+        Returns: list of the deleted paths
+        """
+        if JOB_UPLOAD_RETENTION_HOURS <= 0 or not os.path.isdir(JOB_UPLOAD_DIR):
+            return []
+        cutoff = datetime.utcnow() - timedelta(hours=JOB_UPLOAD_RETENTION_HOURS)
+        # Start from the files still on disk, so the sweep does not grow with the job history
+        files = {os.path.splitext(name)[0]: os.path.join(JOB_UPLOAD_DIR, name) for name in os.listdir(JOB_UPLOAD_DIR)}
+        if not files:
+            return []
+        with self.app.app_context():
+            jobs = {job.id: job for job in BatchJob.query.filter(BatchJob.id.in_(list(files))).all()}
+
+        removed = []
+        for job_id, path in files.items():
+            job = jobs.get(job_id)
+            if job is not None:
+                expired = job.status in FINISHED_STATUSES and job.finished_at is not None and job.finished_at < cutoff
+            else:
+                # Written by a submit that never recorded its job, or the job row was deleted
+                expired = datetime.utcfromtimestamp(os.path.getmtime(path)) < cutoff
+            if not expired:
+                continue
+            try:
+                os.remove(path)
+                removed.append(path)
+            except OSError as e:
+                # Another worker's sweep may have got there first
+                logger.debug(f"Could not remove {path}: {e}")
+        if removed:
+            logger.info(f"Removed {len(removed)} expired batch job uploads")
+        return removed
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='batch-job')
+            return self._executor
+
+    def stats(self):
+        with self._lock:
+            return {'workers': self.max_workers, 'max_queued': self.max_queued, 'active': len(self._active)}
+
+    def submit(self, file, filename, user_id=None):
+        """
+        Save the uploaded file and queue a job for it
+        Returns: the new BatchJob
+        """
+        with self._lock:
+            if len(self._active) >= self.max_workers + self.max_queued:
+                raise JobQueueFull(f'Too many batch jobs in progress (max {self.max_workers + self.max_queued})')
+
+        if not os.path.exists(JOB_UPLOAD_DIR):
+            os.makedirs(JOB_UPLOAD_DIR)
+        job_id = uuid.uuid4().hex
+        file_path = os.path.join(JOB_UPLOAD_DIR, job_id + os.path.splitext(filename)[1].lower())
+        file.save(file_path)
+
+        job = BatchJob(id=job_id, user_id=user_id, filename=filename, file_path=file_path, status='queued')
+        db.session.add(job)
+        db.session.commit()
+
+        self._enqueue(job_id)
+        return job
+
+    def cancel(self, job):
+        """
+        Cancel a queued or running job; a running job stops at its next chunk boundary
+        Returns: True if the job was cancelled
+        """
+        updated = BatchJob.query.filter(BatchJob.id == job.id, BatchJob.status.in_(('queued', 'running'))) \
+            .update({'status': 'cancelled', 'finished_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        return bool(updated)
+
+    def resume_pending(self):
+        """
+        Queue jobs nobody is working on: queued jobs, running jobs with a stale
+        heartbeat and running jobs whose owner process is gone
+        Returns: list of the job ids queued here
+        """
+        with self.app.app_context():
+            stale = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+            pending = pending_jobs_query().all()
+            resumable = []
+            for job in pending:
+                if job.status == 'queued' or (job.heartbeat_at is not None and job.heartbeat_at < stale):
+                    resumable.append((job.id, None))
+                elif owner_is_gone(job.owner, self.owner):
+                    resumable.append((job.id, job.owner))
+
+        resumed = []
+        for job_id, previous_owner in resumable:
+            with self._lock:
+                if job_id in self._active:
+                    continue
+            logger.info(f"Resuming batch job {job_id}")
+            self._enqueue(job_id, previous_owner)
+            resumed.append(job_id)
+        return resumed
+
+    def _enqueue(self, job_id, previous_owner=None):
+        with self._lock:
+            self._active.add(job_id)
+        self._pool().submit(self._run, job_id, previous_owner)
+
+    def _run(self, job_id, previous_owner=None):
+        with self.app.app_context():
+            try:
+                self._process(job_id, previous_owner)
+            except Exception as e:
+                logger.error(f"Batch job {job_id} failed: {e}")
+                db.session.rollback()
+                BatchJob.query.filter_by(id=job_id, status='running', owner=self.owner).update(
+                    {'status': 'failed', 'error': str(e), 'finished_at': datetime.utcnow()}, synchronize_session=False)
+                db.session.commit()
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._active.discard(job_id)
+
+    def _claim(self, job_id, previous_owner=None):
+        # Atomic claim, so two processes resuming the same job never both run it
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=JOB_STALE_SECONDS)
+        claimable = (BatchJob.status == 'queued') | ((BatchJob.status == 'running') & (BatchJob.heartbeat_at < stale))
+        if previous_owner is not None:
+            claimable = claimable | ((BatchJob.status == 'running') & (BatchJob.owner == previous_owner))
+        claimed = BatchJob.query.filter(BatchJob.id == job_id, claimable).update(
+            {'status': 'running', 'owner': self.owner, 'heartbeat_at': now, 'run_rows': 0, 'run_seconds': 0.0},
+            synchronize_session=False)
+        db.session.commit()
+        return bool(claimed)
+
+    def _restore_aggregator(self, job):
+        # Rebuild running stats from the results already committed by an earlier run
+        import pandas as pd
+
+        aggregator = BatchAggregator(has_products=job.product_column is not None)
+        last_id = 0
+        while True:
+            page = job.results.filter(BatchJobResult.id > last_id).order_by(BatchJobResult.id).limit(1000).all()
+            if not page:
+                break
+            aggregator.add(pd.DataFrame.from_records([result.to_dict() for result in page]))
+            last_id = page[-1].id
+        # Stored rows no longer show which texts were repeats; take the count from the last progress update
+        if job.stats:
+            aggregator.unique_texts = json.loads(job.stats).get('unique_texts', aggregator.total)
+        return aggregator
+
+    def _process(self, job_id, previous_owner=None):
+        if not self._claim(job_id, previous_owner):
+            return
+        with JobHeartbeat(self.app, job_id, self.owner) as heartbeat:
+            self._process_claimed(job_id, heartbeat)
+
+    def _process_claimed(self, job_id, heartbeat):
+        job = db.session.get(BatchJob, job_id)
+        if job.started_at is None:
+            job.started_at = datetime.utcnow()
+        if job.rows_total is None:
+            job.rows_total = count_upload_rows(job.file_path, job.filename)
+        db.session.commit()
+
+        aggregator = self._restore_aggregator(job) if job.rows_done else None
+        chunks = iter_upload_chunks(job.file_path, job.filename, chunk_rows=JOB_CHUNK_ROWS)
+        try:
+            for chunk in chunks:
+                if job.text_column is None:
+                    text_col, product_col = find_columns(chunk)
+                    if text_col is None:
+                        raise ValueError('Could not find a text column in the file')
+                    job.text_column, job.product_column = str(text_col), product_col and str(product_col)
+                    db.session.commit()
+                if aggregator is None:
+                    aggregator = BatchAggregator(has_products=job.product_column is not None)
+
+                # Skip rows committed by an earlier run
+                chunk = chunk[chunk.index >= job.rows_done]
+                if chunk.empty:
+                    continue
+
+                if heartbeat.lost.is_set():
+                    logger.info(f"Batch job {job_id} was cancelled or taken over by another worker; stopping")
+                    return
+                started = time.perf_counter()
+                results = classify_chunk(chunk, job.text_column, job.product_column)
+                rows = results.rename(columns={'original_row': 'row_index'}).assign(job_id=job_id)
+                db.session.bulk_insert_mappings(BatchJobResult, rows.to_dict(orient='records'))
+                aggregator.add(results)
+
+                # The progress update doubles as the cancellation and ownership check: it only matches
+                # a job still running under our claim, so a worker that lost it never commits its rows
+                updated = BatchJob.query.filter_by(id=job_id, status='running', owner=self.owner).update({
+                    'rows_done': int(chunk.index[-1]) + 1,
+                    'results_count': BatchJob.results_count + len(results),
+                    'run_rows': BatchJob.run_rows + len(chunk),
+                    'run_seconds': BatchJob.run_seconds + (time.perf_counter() - started),
+                    'heartbeat_at': datetime.utcnow(),
+                    'stats': json.dumps({'stats': aggregator.stats, 'total': aggregator.total,
+                                         'unique_texts': aggregator.unique_texts})
+                }, synchronize_session=False)
+                if not updated:
+                    db.session.rollback()
+                    logger.info(f"Batch job {job_id} was cancelled or taken over by another worker; stopping")
+                    return
+                db.session.commit()
+                db.session.refresh(job)
+        finally:
+            chunks.close()
+
+        summary = aggregator.summary() if aggregator else BatchAggregator().summary()
+        completed = BatchJob.query.filter_by(id=job_id, status='running', owner=self.owner).update({
+            'status': 'completed',
+            'rows_total': job.rows_done,
+            'stats': json.dumps(summary),
+            'finished_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        if completed:
+            # The upload stays on disk so exports can join its original columns back on
+            logger.info(f"Batch job {job_id} completed: {job.results_count} results")
+
+
+job_manager = JobManager()
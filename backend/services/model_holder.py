@@ -0,0 +1,147 @@
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_mb():
+    """
+    Resident set size of this process in MB, or None where it cannot be read
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    try:
+        import psutil
+        return round(psutil.Process(os.getpid()).memory_info().rss / (1024.0 * 1024.0), 1)
+    except ImportError:
+        return None
+
+
+class PeakRssSampler:
+    """
+    Context manager that samples RSS in a background thread and records the peak
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.start_mb = None
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.peak_mb is None or rss > self.peak_mb):
+            self.peak_mb = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start_mb = current_rss_mb()
+        self.peak_mb = self.start_mb
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+
+class ModelHandle:
+    """
+    One loaded (tokenizer, model) pair plus the bookkeeping needed to retire it safely
+    """
+
+    def __init__(self, tokenizer, model, fingerprint, source):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.fingerprint = fingerprint
+        self.source = source
+        self.loaded_at = time.time()
+        self.refs = 0
+        self.retired = False
+        self.released = False
+
+    def release(self):
+        self.tokenizer = None
+        self.model = None
+        self.released = True
+
+
+class ModelHolder:
+    """
+    Double-buffered holder for the serving model.
+
+    Requests pin the current handle with acquire(); swap() installs a fully
+    loaded replacement atomically. The previous handle keeps serving the
+    requests that already hold it and is released when its refcount drops to
+    zero.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = None
+        self.swaps = 0
+        self.last_release = None
+
+    @property
+    def current(self):
+        return self._current
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            handle = self._current
+            if handle is None:
+                raise RuntimeError('No model is loaded')
+            handle.refs += 1
+        try:
+            yield handle
+        finally:
+            with self._lock:
+                handle.refs -= 1
+                release = handle.retired and handle.refs == 0 and not handle.released
+            if release:
+                self._release(handle)
+
+    def swap(self, handle):
+        """
+        Install handle as the serving model
+        Returns: the previous handle (already released if nothing was using it)
+        """
+        with self._lock:
+            previous = self._current
+            self._current = handle
+            self.swaps += 1
+            release = False
+            if previous is not None:
+                previous.retired = True
+                release = previous.refs == 0
+        if release:
+            self._release(previous)
+        return previous
+
+    def _release(self, handle):
+        source = handle.source
+        handle.release()
+        gc.collect()
+        self.last_release = {
+            'source': source,
+            'released_at': time.time(),
+            'rss_after_release_mb': current_rss_mb()
+        }
+        logger.info(f"Released previous model ({source}), RSS now {self.last_release['rss_after_release_mb']} MB")
@@ -1,132 +1,861 @@
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
+# torch and transformers are imported inside the functions that need them, so
+# importing this module (and the app) stays cheap for workers that never run the model
 import logging
 import re
 
 logger = logging.getLogger(__name__)
 
 import os
+import hashlib
+import atexit
+import threading
+import time
+import numpy as np
+from datetime import datetime
+from backend.services.batcher import MicroBatcher
+from backend.services.prediction_cache import PredictionCache, make_cache_key, normalize_text
+from backend.services.prediction_store import PredictionStore
+from backend.services import cascade, model_snapshots, onnx_backend
+from backend.services.model_holder import ModelHandle, ModelHolder, PeakRssSampler, current_rss_mb
+from backend.services.inference_server import InferenceClient, InferenceServerError
 
 MODEL_NAME = "w11wo/indonesian-roberta-base-sentiment-classifier"
 FINE_TUNED_DIR = "./fine_tuned_model"
-_sentiment_pipeline = None
+STUDENT_DIR = "./student_model"
+# Optional override of the serving model: 'student' (the distilled model from
+# backend.scripts.distill), a local directory or a hub model name
+SERVING_MODEL = os.environ.get('SENTIMENT_SERVING_MODEL', '')
+# Serving model, swapped atomically on reload; requests pin it with _holder.acquire()
+_holder = ModelHolder()
+
+# Offline mode: never touch the network; the base model comes from the local
+# safetensors snapshot written by backend.scripts.snapshot_model
+OFFLINE_MODE = os.environ.get('SENTIMENT_OFFLINE', '0') == '1'
+if OFFLINE_MODE:
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+# Load weights straight into place (memory-mapped with safetensors) instead of
+# allocating a random init first, so RSS does not double during load
+LOW_CPU_MEM_USAGE = os.environ.get('SENTIMENT_LOW_CPU_MEM_USAGE', '1') == '1'
+
+# Inference backend: 'pytorch' (fp32 eager), 'onnx' (onnxruntime fp32) or 'onnx-int8' (dynamic int8)
+INFERENCE_BACKEND = os.environ.get('SENTIMENT_INFERENCE_BACKEND', 'pytorch')
+INFERENCE_BACKENDS = ('pytorch', 'onnx', 'onnx-int8')
+
+# When set, the model lives in a separate inference daemon (backend.scripts.run_inference_server)
+# and this process only forwards predictions to it over the Unix socket
+INFERENCE_SOCKET = os.environ.get('SENTIMENT_INFERENCE_SOCKET', '')
+_remote = InferenceClient(INFERENCE_SOCKET) if INFERENCE_SOCKET else None
+
+# Cascade: a TF-IDF + linear model (backend.scripts.train_cascade) answers texts whose
+# top-two probability margin reaches CASCADE_MARGIN; the rest go to the transformer
+CASCADE_ENABLED = os.environ.get('SENTIMENT_CASCADE', '0') == '1'
+CASCADE_MARGIN = float(os.environ.get('SENTIMENT_CASCADE_MARGIN', '0.5'))
+
+# Micro-batching: concurrent predict_sentiment_bert calls are grouped into one forward pass
+MICRO_BATCHING = os.environ.get('SENTIMENT_MICRO_BATCHING', '1') == '1'
+MAX_BATCH_SIZE = int(os.environ.get('SENTIMENT_MAX_BATCH_SIZE', '16'))
+MAX_BATCH_WAIT_MS = float(os.environ.get('SENTIMENT_MAX_BATCH_WAIT_MS', '8'))
+DEFAULT_BATCH_SIZE = 32
+
+# Inputs are truncated on tokens, then sorted by length so each batch is padded
+# only to its own longest item; MAX_BATCH_TOKENS caps the padded size of one batch
+MAX_SEQ_LENGTH = int(os.environ.get('SENTIMENT_MAX_SEQ_LENGTH', '512'))
+MAX_BATCH_TOKENS = int(os.environ.get('SENTIMENT_MAX_BATCH_TOKENS', '8192'))
+
+# Prediction cache: keyed by normalized text + model fingerprint, cleared on reload
+CACHE_MAX_ENTRIES = int(os.environ.get('SENTIMENT_CACHE_MAX_ENTRIES', '10000'))
+CACHE_MAX_BYTES = int(os.environ.get('SENTIMENT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.environ.get('SENTIMENT_CACHE_TTL_SECONDS', '0')) or None
+
+# Optional persistent prediction store shared by all workers, e.g. instance/prediction_cache.db
+PREDICTION_STORE_PATH = os.environ.get('SENTIMENT_PREDICTION_STORE', '')
+PREDICTION_STORE_MAX_ROWS = int(os.environ.get('SENTIMENT_PREDICTION_STORE_MAX_ROWS', '200000'))
+
+# Aspect mode: 'batched' runs whole text + segments in one batch,
+# 'span' runs one encoder pass and classifies each segment from its token span
+ASPECT_MODE = os.environ.get('SENTIMENT_ASPECT_MODE', 'batched')
+
+# Aspect Keywords
+ASPECT_KEYWORDS = {
+    'Makanan': ['makan', 'rasa', 'menu', 'porsi', 'bumbu', 'enak', 'lezat', 'asin', 'manis', 'pedas', 'minum'],
+    'Pelayanan': ['pelayan', 'staff', 'ramah', 'lambat', 'cepat', 'antri', 'service', 'sopan', 'jutek'],
+    'Harga': ['harga', 'mahal', 'murah', 'biaya', 'bayar', 'worth', 'kantong'],
+    'Suasana': ['suasana', 'tempat', 'bersih', 'kotor', 'nyaman', 'musik', 'ac', 'view', 'luas', 'sempit']
+}
+
+# Split by common conjunctions and punctuation
+ASPECT_SPLIT_PATTERN = re.compile(r'[,.]|tapi|namun|sedangkan|dan|serta|walaupun|meskipun')
+
+# Heads that classify from the first token's hidden state, so a pooled span can stand in for it
+SPAN_POOLING_MODEL_TYPES = ('roberta', 'xlm-roberta', 'camembert')
+
+# Common labels for this model: 'positive', 'neutral', 'negative'
+SENTIMENT_MAP = {
+    'positive': 'Positif',
+    'neutral': 'Netral',
+    'negative': 'Negatif',
+    'LABEL_0': 'Negatif',
+    'LABEL_1': 'Netral',
+    'LABEL_2': 'Positif'
+}
+
+# Warmup runs a few representative sequence lengths (in tokens) before a model is marked ready
+WARMUP_LENGTHS = tuple(int(n) for n in os.environ.get('SENTIMENT_WARMUP_LENGTHS', '16,64,256').split(',') if n)
+WARMUP_BATCH_SIZE = 4
+
+# Concurrent reload_model() calls are coalesced into as few loads as possible
+_reload_cond = threading.Condition()
+_reload_state = {'started': 0, 'finished': 0, 'running': False, 'errors': {}}
+_model_status = {
+    'state': 'not_loaded',  # not_loaded -> loading -> warming -> ready (or failed)
+    'source': None,
+    'load_seconds': None,
+    'warmup_seconds': None,
+    'loaded_at': None,
+    'error': None,
+    'reloads': 0,
+    'coalesced_reloads': 0,
+    'last_swap': None
+}
+
+_padding_stats = {'real_tokens': 0, 'padded_tokens': 0, 'forward_passes': 0}
+
+_cache = PredictionCache(max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                         ttl_seconds=CACHE_TTL_SECONDS)
+
+_store = None
+_cascade = None
+_cascade_lock = threading.Lock()
+_cascade_checked = False
+
+def enable_prediction_store(path, max_rows=PREDICTION_STORE_MAX_ROWS):
+    """
+    Open the persistent prediction store consulted after the in-memory cache
+    """
+    global _store
+    if _store is not None:
+        _store.close()
+    _store = PredictionStore(path, max_rows=max_rows)
+    atexit.register(_store.close)
+    logger.info(f"Persistent prediction store enabled at {path}")
+    return _store
+
+if PREDICTION_STORE_PATH:
+    enable_prediction_store(PREDICTION_STORE_PATH)
+
+def _fingerprint_model(target_model):
+    """
+    Identify the weights behind target_model so cached predictions never outlive them
+    Local directories are fingerprinted by file names, sizes and modification times.
+    """
+    if not os.path.isdir(target_model):
+        return f"hub:{target_model}"
+
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(target_model)):
+        path = os.path.join(target_model, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode('utf-8'))
+    return f"local:{os.path.abspath(target_model)}:{digest.hexdigest()[:16]}"
+
+def _serving_fingerprint(target_model):
+    # Different backends can disagree slightly (int8 especially), so cache them separately
+    return f"{_fingerprint_model(target_model)}|{INFERENCE_BACKEND}"
+
+def _swap_model(tokenizer, model, target_model):
+    handle = ModelHandle(tokenizer, model, _serving_fingerprint(target_model), target_model)
+    previous = _holder.swap(handle)
+    # A new model must never serve labels cached from the previous one
+    _cache.clear()
+    return previous
+
+def _resolve_target_model():
+    if SERVING_MODEL:
+        target = STUDENT_DIR if SERVING_MODEL == 'student' else SERVING_MODEL
+        if not os.path.isdir(target) or os.listdir(target):
+            return target
+        logger.warning(f"Serving model {target} is empty, ignoring override")
+    # Prefer the fine-tuned model when one has been saved
+    if os.path.exists(FINE_TUNED_DIR) and os.listdir(FINE_TUNED_DIR):
+        return FINE_TUNED_DIR
+    if OFFLINE_MODE:
+        fine_tuned_snapshot = model_snapshots.current_snapshot('fine_tuned')
+        if fine_tuned_snapshot:
+            return fine_tuned_snapshot
+    return _base_model_source()
+
+def _base_model_source():
+    if not OFFLINE_MODE:
+        return MODEL_NAME
+    snapshot = model_snapshots.current_snapshot('base')
+    if snapshot is None:
+        raise RuntimeError(f"Offline mode but no local snapshot of {MODEL_NAME} in {model_snapshots.SNAPSHOT_DIR}; "
+                           f"run python -m backend.scripts.snapshot_model first")
+    return snapshot
+
+def resolve_serving_model():
+    """
+    Pick the weights the app would serve right now (override, fine-tuned, snapshot or base model)
+    Returns: a local model directory or a hub model name
+    """
+    return _resolve_target_model()
+
+def model_fingerprint(target_model):
+    """
+    Returns: the fingerprint that identifies target_model's weights (as used for ONNX exports and caches)
+    """
+    return _fingerprint_model(target_model)
+
+def use_local_inference():
+    """
+    Serve predictions from a model loaded in this process, even if
+    SENTIMENT_INFERENCE_SOCKET is set (used by the inference daemon itself)
+    """
+    global _remote
+    _remote = None
 
 def load_model():
-    global _sentiment_pipeline
-    if _sentiment_pipeline is None:
-        reload_model()
+    # With a remote inference daemon the model is never loaded here
+    if _remote is not None:
+        return
+    # Concurrent first callers share a single load (or the one already running)
+    if _holder.current is None:
+        _coalesced_reload(fresh=False)
+
+def _warmup(tokenizer, model):
+    """
+    Run a few forward passes at representative sequence lengths so the first
+    real request does not pay for lazy initialization
+    """
+    start = time.perf_counter()
+    for length in WARMUP_LENGTHS:
+        # Special tokens take two slots; one word per token with this vocabulary is close enough
+        text = ' '.join(['ulasan'] * max(1, length - 2))
+        predict_probabilities(tokenizer, model, [text] * WARMUP_BATCH_SIZE, batch_size=WARMUP_BATCH_SIZE)
+    return time.perf_counter() - start
+
+def start_background_load():
+    """
+    Load and warm the model in a daemon thread so the app can serve liveness
+    checks (and non-ML endpoints) while it becomes ready
+    Returns: the loader thread, or None if the model is already loaded/loading
+    """
+    if _remote is not None or _holder.current is not None or _model_status['state'] in ('loading', 'warming'):
+        return None
+
+    def run():
+        try:
+            load_model()
+        except Exception as e:
+            logger.error(f"Background model load failed: {e}")
+
+    thread = threading.Thread(target=run, name='model-loader', daemon=True)
+    thread.start()
+    return thread
+
+def _remote_status():
+    try:
+        return _remote.call('status')
+    except InferenceServerError as e:
+        return {
+            'model': {'state': 'unavailable', 'error': str(e), 'live': True, 'ready': False},
+            'batching': {},
+            'cache': {}
+        }
+
+def get_model_status():
+    if _remote is not None:
+        status = _remote_status()['model']
+        status['inference_socket'] = INFERENCE_SOCKET
+        return status
+
+    status = dict(_model_status)
+    status['live'] = True
+    status['ready'] = status['state'] == 'ready'
+    status['backend'] = INFERENCE_BACKEND
+    status['swaps'] = _holder.swaps
+    status['last_release'] = _holder.last_release
+    return status
+
+def _load_onnx_model(target_model, tokenizer):
+    """
+    Load the ONNX export of target_model, exporting it first if this is the first use
+    """
+    fingerprint = _fingerprint_model(target_model)
+    quantized = INFERENCE_BACKEND == 'onnx-int8'
+    path = onnx_backend.model_path(fingerprint, quantized=quantized)
+
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+
+    if not os.path.exists(path):
+        torch_model = AutoModelForSequenceClassification.from_pretrained(
+            target_model, local_files_only=OFFLINE_MODE, low_cpu_mem_usage=LOW_CPU_MEM_USAGE)
+        onnx_backend.export_model(torch_model, tokenizer, fingerprint, quantize=quantized)
+        del torch_model
+
+    config = AutoConfig.from_pretrained(target_model, local_files_only=OFFLINE_MODE)
+    return onnx_backend.OnnxSequenceClassifier(path, config)
+
+def _load_weights(target_model):
+    """
+    Load tokenizer and model for the configured inference backend
+    Returns: (tokenizer, model)
+    """
+    if INFERENCE_BACKEND not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{INFERENCE_BACKEND}', expected one of {INFERENCE_BACKENDS}")
+
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    start = time.perf_counter()
+    with PeakRssSampler() as memory:
+        tokenizer = AutoTokenizer.from_pretrained(target_model, local_files_only=OFFLINE_MODE)
+        if INFERENCE_BACKEND == 'pytorch':
+            model = AutoModelForSequenceClassification.from_pretrained(
+                target_model, local_files_only=OFFLINE_MODE, low_cpu_mem_usage=LOW_CPU_MEM_USAGE)
+            model.eval()
+        else:
+            model = _load_onnx_model(target_model, tokenizer)
+
+    _model_status['last_load'] = {
+        'source': target_model,
+        'offline': OFFLINE_MODE,
+        'seconds': round(time.perf_counter() - start, 2),
+        'rss_before_mb': memory.start_mb,
+        'peak_rss_mb': memory.peak_mb,
+        'rss_after_mb': current_rss_mb()
+    }
+    logger.info(f"Loaded weights from {target_model} in {_model_status['last_load']['seconds']}s "
+                f"(RSS {memory.start_mb} -> peak {memory.peak_mb} MB, offline={OFFLINE_MODE})")
+    return tokenizer, model
+
+def _install_model(tokenizer, model, target_model, load_started):
+    # Warm up off to the side, so a model is never installed (or marked ready) while cold
+    if _holder.current is None:
+        _model_status['state'] = 'warming'
+    _model_status['load_seconds'] = round(time.perf_counter() - load_started, 2)
+    _model_status['warmup_seconds'] = round(_warmup(tokenizer, model), 2) if WARMUP_LENGTHS else 0.0
+
+    previous = _swap_model(tokenizer, model, target_model)
+    _model_status.update({
+        'state': 'ready',
+        'source': target_model,
+        'loaded_at': datetime.now().isoformat(),
+        'error': None
+    })
+    return previous
 
 def reload_model():
-    global _sentiment_pipeline
+    """
+    Load the current weights off to the side, warm them up and swap them in atomically
+    Requests keep using the previous model until the swap; it is released once
+    the last in-flight request using it finishes. Calls made while a reload is
+    running are coalesced into one follow-up reload that they all wait for.
+    """
+    if _remote is not None:
+        _remote.call('reload')
+        return
+    _coalesced_reload(fresh=True)
+
+def _coalesced_reload(fresh):
+    with _reload_cond:
+        if not fresh and _holder.current is not None:
+            return
+        # A reload already running may have read old weights, so a fresh reload needs the next one;
+        # a first load is satisfied by whichever load is already running
+        needed = _reload_state['started'] + (1 if fresh or not _reload_state['running'] else 0)
+        if _reload_state['running']:
+            _model_status['coalesced_reloads'] += 1
+
+        while _reload_state['finished'] < needed:
+            if not _reload_state['running']:
+                _reload_state['running'] = True
+                _reload_state['started'] += 1
+                generation = _reload_state['started']
+                break
+            _reload_cond.wait()
+        else:
+            error = next((e for g, e in _reload_state['errors'].items() if g >= needed), None)
+            if error is not None:
+                raise error
+            return
+
+    error = None
+    try:
+        _load_and_swap()
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        with _reload_cond:
+            _reload_state['running'] = False
+            _reload_state['finished'] = generation
+            # Only the latest outcome matters to waiters
+            _reload_state['errors'] = {generation: error} if error is not None else {}
+            _reload_cond.notify_all()
+
+def _load_and_swap():
+    load_started = time.perf_counter()
+    _model_status['reloads'] += 1
+    if _holder.current is None:
+        _model_status['state'] = 'loading'
+
+    with PeakRssSampler() as memory:
+        previous = _load_with_fallback(load_started)
+
+    _model_status['last_swap'] = {
+        'source': _holder.current.source,
+        'swap_seconds': round(time.perf_counter() - load_started, 2),
+        'rss_before_mb': memory.start_mb,
+        'peak_rss_mb': memory.peak_mb,
+        'rss_after_swap_mb': current_rss_mb(),
+        # The previous model is freed once the last request using it finishes
+        'previous_released': previous.released if previous is not None else None
+    }
+    logger.info(f"Model swap memory: before {memory.start_mb} MB, peak {memory.peak_mb} MB")
+
+def _is_base_model(target_model):
+    return target_model == MODEL_NAME or target_model == model_snapshots.current_snapshot('base')
+
+def _load_with_fallback(load_started):
+    target_model = None
     try:
         # Check if fine-tuned model exists
-        target_model = MODEL_NAME
-        if os.path.exists(FINE_TUNED_DIR) and os.listdir(FINE_TUNED_DIR):
+        target_model = _resolve_target_model()
+        if target_model == FINE_TUNED_DIR:
             logger.info(f"Found fine-tuned model at {FINE_TUNED_DIR}. Loading...")
-            target_model = FINE_TUNED_DIR
+        elif _is_base_model(target_model):
+            logger.info(f"Loading base IndoBERT model: {target_model}...")
         else:
-            logger.info(f"Loading base IndoBERT model: {MODEL_NAME}...")
+            logger.info(f"Loading configured serving model {target_model}...")
 
         # Load tokenizer and model explicitly
-        tokenizer = AutoTokenizer.from_pretrained(target_model)
-        model = AutoModelForSequenceClassification.from_pretrained(target_model)
+        tokenizer, model = _load_weights(target_model)
         
-        _sentiment_pipeline = pipeline(
-            "sentiment-analysis", 
-            model=model, 
-            tokenizer=tokenizer
-        )
-        logger.info(f"✅ Model loaded successfully from {target_model}!")
+        previous = _install_model(tokenizer, model, target_model, load_started)
+        logger.info(f"✅ Model loaded successfully from {target_model} ({INFERENCE_BACKEND}) "
+                    f"in {_model_status['load_seconds']}s, warmup {_model_status['warmup_seconds']}s!")
+        return previous
     except Exception as e:
         logger.error(f"Failed to load model: {e}")
-        # Fallback to base model if fine-tuned fails
-        if target_model == FINE_TUNED_DIR:
+        # Fallback to base model if the fine-tuned (or configured) model fails
+        if target_model is not None and not _is_base_model(target_model):
             logger.warning("Falling back to base model...")
             try:
-                tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-                model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
-                _sentiment_pipeline = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+                base_model = _base_model_source()
+                tokenizer, model = _load_weights(base_model)
+                previous = _install_model(tokenizer, model, base_model, load_started)
                 logger.info("✅ Base model loaded successfully!")
+                return previous
             except Exception as ex:
                 logger.error(f"Failed to load base model: {ex}")
+                _mark_load_failed(ex)
                 raise
         else:
+            _mark_load_failed(e)
             raise
 
+def _mark_load_failed(error):
+    # A failed reload keeps serving the previous model, so only a first load becomes 'failed'
+    if _holder.current is None:
+        _model_status['state'] = 'failed'
+    _model_status['error'] = str(error)
+
+def _map_label(label):
+    # Map labels to Indonesian
+    return SENTIMENT_MAP.get(label.lower(), label)
+
+def map_label(label):
+    """
+    Returns: the app's Indonesian sentiment label for a model's id2label entry
+    """
+    return _map_label(label)
+
+def _forward_probabilities(model, tokenizer, features):
+    """
+    One padded forward pass with either a PyTorch model or an ONNX session
+    Returns: numpy array of class probabilities
+    """
+    if isinstance(model, onnx_backend.OnnxSequenceClassifier):
+        encoded = tokenizer.pad(features, padding=True, return_tensors='np')
+        return onnx_backend.softmax(model.logits(encoded))
+
+    import torch
+
+    encoded = tokenizer.pad(features, padding=True, return_tensors='pt')
+    with torch.no_grad():
+        logits = model(**encoded).logits
+    return torch.softmax(logits, dim=-1).numpy()
+
+def _length_buckets(order, lengths, batch_size, max_batch_tokens):
+    # order is sorted by length, so the item being added is always the longest in its bucket
+    bucket = []
+    for index in order:
+        if bucket and (len(bucket) >= batch_size or (len(bucket) + 1) * lengths[index] > max_batch_tokens):
+            yield bucket
+            bucket = []
+        bucket.append(index)
+    if bucket:
+        yield bucket
+
+def predict_probabilities(tokenizer, model, texts, batch_size=DEFAULT_BATCH_SIZE,
+                          max_batch_tokens=MAX_BATCH_TOKENS):
+    """
+    Length-bucketed inference: truncate on tokens, sort by token length, pad
+    each bucket only to its longest item, then restore the input order
+    Returns: numpy array of class probabilities, shape (len(texts), num_labels)
+    """
+    if not texts:
+        return np.empty((0, len(model.config.id2label)))
+
+    encodings = tokenizer(list(texts), truncation=True, max_length=MAX_SEQ_LENGTH)
+    lengths = [len(ids) for ids in encodings['input_ids']]
+    order = sorted(range(len(texts)), key=lengths.__getitem__)
+
+    probs = [None] * len(texts)
+    for bucket in _length_buckets(order, lengths, batch_size, max_batch_tokens):
+        features = {key: [encodings[key][i] for i in bucket] for key in encodings.keys()}
+        for i, row in zip(bucket, _forward_probabilities(model, tokenizer, features)):
+            probs[i] = row
+
+        _padding_stats['real_tokens'] += sum(lengths[i] for i in bucket)
+        _padding_stats['padded_tokens'] += len(bucket) * lengths[bucket[-1]]
+        _padding_stats['forward_passes'] += 1
+
+    return np.stack(probs)
+
+def _run_model(texts, batch_size):
+    """
+    Run the model over length-bucketed batches of texts, bypassing the cache
+    Returns: (list of (sentiment_label, confidence_score) in input order,
+    fingerprint of the model that produced them)
+    """
+    load_model()
+
+    with _holder.acquire() as handle:
+        id2label = handle.model.config.id2label
+        probs = predict_probabilities(handle.tokenizer, handle.model, texts, batch_size=batch_size)
+        fingerprint = handle.fingerprint
+
+    predictions = [
+        (_map_label(id2label[label_id]), float(score))
+        for label_id, score in zip(probs.argmax(axis=-1).tolist(), probs.max(axis=-1).tolist())
+    ]
+    return predictions, fingerprint
+
+def _lookup_cached(texts):
+    """
+    Check the in-memory cache, then the persistent store for its misses
+    Returns: list with the cached prediction for each text, or None on a miss
+    """
+    if not _cache.enabled and _store is None:
+        return [None] * len(texts)
+
+    # Before the first load, the persistent store can still answer for the weights that would be loaded
+    current = _holder.current
+    fingerprint = current.fingerprint if current is not None else _serving_fingerprint(_resolve_target_model())
+
+    keys = [make_cache_key(text, fingerprint) for text in texts]
+    cached = [_cache.get(key) for key in keys]
+
+    if _store is not None:
+        missing = [i for i, prediction in enumerate(cached) if prediction is None]
+        if missing:
+            stored = _store.get_many([keys[i] for i in missing])
+            for i in missing:
+                if keys[i] in stored:
+                    cached[i] = stored[keys[i]]
+                    _cache.put(keys[i], cached[i])
+    return cached
+
+def _run_model_and_cache(texts, batch_size):
+    predictions, fingerprint = _run_model(texts, batch_size)
+    keys = [make_cache_key(text, fingerprint) for text in texts]
+    for key, prediction in zip(keys, predictions):
+        _cache.put(key, prediction)
+    if _store is not None:
+        _store.put_many(fingerprint, zip(keys, predictions))
+    return predictions
+
+def _get_cascade():
+    global _cascade, _cascade_checked
+    if not CASCADE_ENABLED:
+        return None
+    if not _cascade_checked:
+        with _cascade_lock:
+            if not _cascade_checked:
+                try:
+                    _cascade = cascade.load_cascade(cascade.CASCADE_MODEL_PATH, margin_threshold=CASCADE_MARGIN)
+                    if _cascade is None:
+                        logger.warning(f"Cascade enabled but no model at {cascade.CASCADE_MODEL_PATH}; using IndoBERT only")
+                    else:
+                        logger.info(f"Cascade model loaded (margin {CASCADE_MARGIN})")
+                except Exception as e:
+                    logger.error(f"Failed to load cascade model: {e}")
+                _cascade_checked = True
+    return _cascade
+
+def _cascade_or(predict_fn):
+    # Wrap predict_fn so the fast stage answers first and only uncertain texts reach it
+    fast = _get_cascade()
+    if fast is None:
+        return predict_fn
+    return lambda texts: _fill_misses(texts, fast.predict(texts), predict_fn)
+
+def _fill_misses(texts, cached, predict_fn):
+    # Run predict_fn only on the texts the cache could not answer
+    missing = [i for i, prediction in enumerate(cached) if prediction is None]
+    if missing:
+        for i, prediction in zip(missing, predict_fn([texts[i] for i in missing])):
+            cached[i] = prediction
+    return cached
+
+def dedupe_texts(texts):
+    """
+    Collapse texts that normalize to the same string (the cache key's normalization)
+    Returns: (unique_texts, positions) where texts[i] is answered by unique_texts[positions[i]]
+    """
+    first_seen = {}
+    unique_texts = []
+    positions = []
+    for text in texts:
+        key = normalize_text(text)
+        if key not in first_seen:
+            first_seen[key] = len(unique_texts)
+            unique_texts.append(text)
+        positions.append(first_seen[key])
+    return unique_texts, positions
+
+def dedup_stats(total, unique):
+    """
+    Returns: dict with the text count, unique text count and the share of model calls saved
+    """
+    return {
+        'texts': total,
+        'unique_texts': unique,
+        'dedup_ratio': round(1 - unique / total, 4) if total else 0.0
+    }
+
+def _predict_unique(texts, predict_fn, with_stats):
+    # Classify each distinct text once and fan the predictions back out in input order
+    unique_texts, positions = dedupe_texts(texts)
+    unique_predictions = predict_fn(unique_texts) if unique_texts else []
+    predictions = [unique_predictions[position] for position in positions]
+    if with_stats:
+        return predictions, dedup_stats(len(texts), len(unique_texts))
+    return predictions
+
+def predict_sentiment_many(texts, batch_size=DEFAULT_BATCH_SIZE, with_stats=False):
+    """
+    Predict sentiment for many texts, running the model over padded batches
+    Identical texts are classified once, cached predictions are reused and
+    only cache misses reach the model.
+    Returns: list of (sentiment_label, confidence_score) in input order, or
+    (predictions, dedup_stats) when with_stats is set
+    """
+    if _remote is not None:
+        return _predict_unique(texts, lambda unique: _remote.predict(unique, batch_size=batch_size), with_stats)
+    return _predict_unique(texts, lambda unique: _fill_misses(
+        unique, _lookup_cached(unique), _cascade_or(lambda misses: _run_model_and_cache(misses, batch_size))
+    ), with_stats)
+
+def _predict_batch(texts):
+    # One micro-batch from the scheduler is one padded forward pass
+    return _run_model_and_cache(texts, batch_size=len(texts))
+
+_batcher = MicroBatcher(_predict_batch, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS,
+                        name='sentiment-batcher')
+
+def _predict_scheduled(texts):
+    # Per-request lists go through the shared scheduler so they batch with other requests
+    if _remote is not None:
+        return _predict_unique(texts, _remote.predict, with_stats=False)
+    if MICRO_BATCHING:
+        return _predict_unique(texts, lambda unique: _fill_misses(
+            unique, _lookup_cached(unique), _cascade_or(_batcher.submit_many)
+        ), with_stats=False)
+    return predict_sentiment_many(texts)
+
+def predict_sentiment_scheduled(texts):
+    """
+    Predict sentiment for one request's texts through the shared micro-batch
+    scheduler, so they batch with concurrent requests (bulk jobs should use
+    predict_sentiment_many instead)
+    Returns: list of (sentiment_label, confidence_score) in input order
+    """
+    return _predict_scheduled(texts)
+
 def predict_sentiment_bert(text):
     """
     Predict sentiment using IndoBERT
+    Concurrent callers are grouped into micro-batches by the shared scheduler.
     Returns: (sentiment_label, confidence_score)
     """
-    global _sentiment_pipeline
-    if _sentiment_pipeline is None:
-        load_model()
-        
     try:
-        # Truncate text to avoid token limit issues (BERT limit is usually 512 tokens)
-        # We limit characters roughly to ensure we don't crash, pipeline handles truncation too
-        result = _sentiment_pipeline(text[:1500], truncation=True, max_length=512)[0]
-        
-        label = result['label']
-        score = result['score']
-        
-        # Map labels to Indonesian
-        # Common labels for this model: 'positive', 'neutral', 'negative'
-        sentiment_map = {
-            'positive': 'Positif',
-            'neutral': 'Netral',
-            'negative': 'Negatif',
-            'LABEL_0': 'Negatif',
-            'LABEL_1': 'Netral',
-            'LABEL_2': 'Positif'
-        }
-        
-        sentiment = sentiment_map.get(label.lower(), label)
-        
-        return sentiment, float(score)
+        return _predict_scheduled([text])[0]
     except Exception as e:
         logger.error(f"Prediction error: {e}")
         raise
 
-def predict_aspect_sentiment(text):
+def get_model_fingerprint():
+    current = _holder.current
+    return current.fingerprint if current is not None else None
+
+def get_cache_stats():
+    if _remote is not None:
+        return _remote_status()['cache']
+    stats = _cache.stats()
+    if _store is not None:
+        stats['persistent'] = _store.stats()
+    return stats
+
+def get_cascade_stats():
+    if _remote is not None:
+        return _remote_status().get('cascade', {'enabled': False})
+    fast = _get_cascade()
+    if fast is None:
+        return {'enabled': False}
+    stats = fast.stats()
+    stats['enabled'] = True
+    return stats
+
+def get_batcher_stats():
+    if _remote is not None:
+        return _remote_status()['batching']
+    stats = _batcher.stats()
+    padded = _padding_stats['padded_tokens']
+    stats['forward_passes'] = _padding_stats['forward_passes']
+    stats['padding_efficiency'] = round(_padding_stats['real_tokens'] / padded, 4) if padded else 1.0
+    return stats
+
+def _find_aspect_segments(text):
     """
-    Analyze sentiment per aspect using rule-based segmentation + BERT
-    Returns: List of dicts {aspect, sentiment, text}
+    Split text into segments and keep the ones that mention an aspect
+    Returns: list of (aspect, segment, start, end) with character offsets into text
     """
-    # 1. Define Aspect Keywords
-    aspect_keywords = {
-        'Makanan': ['makan', 'rasa', 'menu', 'porsi', 'bumbu', 'enak', 'lezat', 'asin', 'manis', 'pedas', 'minum'],
-        'Pelayanan': ['pelayan', 'staff', 'ramah', 'lambat', 'cepat', 'antri', 'service', 'sopan', 'jutek'],
-        'Harga': ['harga', 'mahal', 'murah', 'biaya', 'bayar', 'worth', 'kantong'],
-        'Suasana': ['suasana', 'tempat', 'bersih', 'kotor', 'nyaman', 'musik', 'ac', 'view', 'luas', 'sempit']
-    }
+    lowered = text.lower()
+    bounds = []
+    position = 0
+    for match in ASPECT_SPLIT_PATTERN.finditer(lowered):
+        bounds.append((position, match.start()))
+        position = match.end()
+    bounds.append((position, len(lowered)))
 
-    # 2. Split text into segments
-    # Split by common conjunctions and punctuation
-    segments = re.split(r'[,.]|tapi|namun|sedangkan|dan|serta|walaupun|meskipun', text.lower())
-    
-    results = []
-    
-    for segment in segments:
-        segment = segment.strip()
+    found = []
+    for start, end in bounds:
+        raw = lowered[start:end]
+        segment = raw.strip()
         if len(segment) < 3: continue
-        
+
         # Check which aspect this segment belongs to
-        found_aspect = None
-        for aspect, keywords in aspect_keywords.items():
+        for aspect, keywords in ASPECT_KEYWORDS.items():
             if any(k in segment for k in keywords):
-                found_aspect = aspect
+                seg_start = start + len(raw) - len(raw.lstrip())
+                found.append((aspect, segment, seg_start, seg_start + len(segment)))
                 break
-        
-        if found_aspect:
-            # Predict sentiment for this segment
-            sentiment, score = predict_sentiment_bert(segment)
-            results.append({
-                'aspect': found_aspect,
-                'sentiment': sentiment,
-                'text': segment
-            })
-            
+
+    return found
+
+def _predict_with_spans(text, spans):
+    """
+    Classify the whole text and each character span from a single encoder pass.
+    Each span is mean-pooled over its tokens (via the tokenizer offset mapping)
+    and fed to the classification head in place of the first-token state, so
+    span labels are an approximation of classifying the segment on its own.
+    Returns: list of (sentiment_label, confidence_score) for [text] + spans,
+    with None for spans that fell outside the truncated sequence
+    """
+    load_model()
+
+    with _holder.acquire() as handle:
+        return _predict_spans_with(handle.tokenizer, handle.model, text, spans)
+
+def _predict_spans_with(tokenizer, model, text, spans):
+    import torch
+
+    encoded = tokenizer(text, truncation=True, max_length=MAX_SEQ_LENGTH,
+                        return_offsets_mapping=True, return_tensors='pt')
+    offsets = encoded.pop('offset_mapping')[0].tolist()
+
+    with torch.no_grad():
+        hidden = model.base_model(**encoded).last_hidden_state[0]
+
+        features = [hidden[0]]
+        covered = []
+        for start, end in spans:
+            token_ids = [i for i, (s, e) in enumerate(offsets) if e > s and s < end and e > start]
+            covered.append(bool(token_ids))
+            if token_ids:
+                features.append(hidden[token_ids].mean(dim=0))
+
+        logits = model.classifier(torch.stack(features).unsqueeze(1))
+
+    scores, label_ids = torch.softmax(logits, dim=-1).max(dim=-1)
+    predictions = [(_map_label(model.config.id2label[label_id]), float(score))
+                   for score, label_id in zip(scores.tolist(), label_ids.tolist())]
+
+    results = [predictions[0]]
+    remaining = iter(predictions[1:])
+    for has_tokens in covered:
+        results.append(next(remaining) if has_tokens else None)
     return results
 
+def _can_use_span_mode(text):
+    # Span pooling needs the encoder's hidden states, which only the PyTorch backend exposes
+    if ASPECT_MODE != 'span' or INFERENCE_BACKEND != 'pytorch':
+        return False
+    load_model()
+    # Offsets are computed on the lowercased text, so lengths must line up
+    return _holder.current.model.config.model_type in SPAN_POOLING_MODEL_TYPES and len(text.lower()) == len(text)
+
+def predict_with_aspects(text):
+    """
+    Predict overall and per-aspect sentiment with roughly one model call
+    Returns: (sentiment_label, confidence_score, aspects) where aspects is a
+    list of dicts {aspect, sentiment, text}
+    """
+    if _remote is not None:
+        sentiment, confidence, aspects = _remote.call('aspects', text=text)
+        return sentiment, confidence, aspects
+
+    found = _find_aspect_segments(text)
+    segments = [segment for _, segment, _, _ in found]
+
+    if found and _can_use_span_mode(text):
+        predictions = _predict_with_spans(text, [(start, end) for _, _, start, end in found])
+        # Segments lost to truncation are classified on their own in one batch
+        missing = [i for i, p in enumerate(predictions[1:]) if p is None]
+        if missing:
+            for i, prediction in zip(missing, _predict_scheduled([segments[i] for i in missing])):
+                predictions[i + 1] = prediction
+    else:
+        predictions = _predict_scheduled([text] + segments)
+
+    sentiment, confidence = predictions[0]
+    aspects = [
+        {'aspect': aspect, 'sentiment': aspect_sentiment, 'text': segment}
+        for (aspect, segment, _, _), (aspect_sentiment, _) in zip(found, predictions[1:])
+    ]
+    return sentiment, confidence, aspects
+
+def predict_aspect_sentiment(text):
+    """
+    Analyze sentiment per aspect using rule-based segmentation + BERT
+    All matched segments are classified together in one batched call.
+    Returns: List of dicts {aspect, sentiment, text}
+    """
+    found = _find_aspect_segments(text)
+    if not found:
+        return []
+
+    predictions = _predict_scheduled([segment for _, segment, _, _ in found])
+    return [
+        {'aspect': aspect, 'sentiment': sentiment, 'text': segment}
+        for (aspect, segment, _, _), (sentiment, _) in zip(found, predictions)
+    ]
+
 def is_model_loaded():
-    return _sentiment_pipeline is not None
+    if _remote is not None:
+        return get_model_status().get('ready', False)
+    return _holder.current is not None
@@ -0,0 +1,109 @@
+"""
+Versioned local snapshots of the serving models for offline (air-gapped) loading.
+
+Layout under SNAPSHOT_DIR:
+
+    <name>/<version>/            tokenizer + safetensors weights + manifest.json
+    <name>/current               name of the version to load
+
+where <name> is 'base' (the hub model) or 'fine_tuned'. The pointer file is
+replaced atomically, so a loader never sees a half-written snapshot.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.environ.get('SENTIMENT_SNAPSHOT_DIR', './model_snapshots')
+MANIFEST_NAME = 'manifest.json'
+POINTER_NAME = 'current'
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def current_snapshot(name, root=SNAPSHOT_DIR):
+    """
+    Returns: path of the current snapshot for name, or None if there is none
+    """
+    pointer = os.path.join(root, name, POINTER_NAME)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        version = f.read().strip()
+    path = os.path.join(root, name, version)
+    return path if os.path.exists(os.path.join(path, MANIFEST_NAME)) else None
+
+
+def create_snapshot(name, source, root=SNAPSHOT_DIR):
+    """
+    Materialize source (hub name or local directory) as a new safetensors snapshot
+    and point name/current at it
+    Returns: dict manifest of the snapshot
+    """
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    staging = os.path.join(root, name, f'.{stamp}.tmp')
+    os.makedirs(staging)
+
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    model = AutoModelForSequenceClassification.from_pretrained(source, low_cpu_mem_usage=True)
+    tokenizer.save_pretrained(staging)
+    model.save_pretrained(staging, safe_serialization=True)
+    del model
+
+    files = {}
+    for file_name in sorted(os.listdir(staging)):
+        path = os.path.join(staging, file_name)
+        files[file_name] = {'bytes': os.path.getsize(path), 'sha256': _sha256(path)}
+    weights_digest = hashlib.sha256(
+        ''.join(info['sha256'] for file_name, info in files.items() if file_name.endswith('.safetensors')).encode()
+    ).hexdigest()
+
+    version = f'{stamp}-{weights_digest[:8]}'
+    manifest = {
+        'name': name,
+        'version': version,
+        'source': source,
+        'created_at': datetime.now().isoformat(),
+        'format': 'safetensors',
+        'files': files
+    }
+    with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    final_path = os.path.join(root, name, version)
+    os.replace(staging, final_path)
+    pointer = os.path.join(root, name, POINTER_NAME)
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(version)
+    os.replace(pointer + '.tmp', pointer)
+
+    logger.info(f"Snapshot {name}/{version} written from {source}")
+    return manifest
+
+
+def verify_snapshot(path):
+    """
+    Check every file in a snapshot against its manifest
+    Returns: list of problems (empty when the snapshot is intact)
+    """
+    with open(os.path.join(path, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    problems = []
+    for file_name, info in manifest['files'].items():
+        file_path = os.path.join(path, file_name)
+        if not os.path.exists(file_path):
+            problems.append(f'missing {file_name}')
+        elif os.path.getsize(file_path) != info['bytes'] or _sha256(file_path) != info['sha256']:
+            problems.append(f'checksum mismatch for {file_name}')
+    return problems
@@ -0,0 +1,119 @@
+"""
+Near-duplicate clustering of short texts with shingling + MinHash LSH.
+
+Each text is lowercased and stripped to its word characters (so emoji and
+punctuation variants of the same spam collapse), cut into character
+shingles and reduced to a MinHash signature. Signatures are split into
+bands; texts sharing any band bucket are candidates, and two clusters merge
+only if the estimated Jaccard similarity of their representatives reaches
+the threshold. Texts shorter than one shingle once cleaned (emoji-only or
+punctuation-only comments, "ok") carry too little to compare and always
+stay in a cluster of their own.
+"""
+import os
+import re
+import zlib
+
+import numpy as np
+
+NEAR_DEDUP_ENABLED = os.environ.get('SENTIMENT_NEAR_DEDUP', '0') == '1'
+NEAR_DEDUP_THRESHOLD = float(os.environ.get('SENTIMENT_NEAR_DEDUP_THRESHOLD', '0.8'))
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 8
+
+_NON_WORD = re.compile(r'[\W_]+')
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.int64)
+_PERM_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.int64)
+
+
+def clean_text(text):
+    """
+    Returns: the text lowercased, with emoji and punctuation runs collapsed to single spaces
+    """
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    Returns: set of character shingles of the text with emoji, punctuation and casing removed
+    """
+    cleaned = clean_text(text)
+    if len(cleaned) <= size:
+        return {cleaned}
+    return {cleaned[i:i + size] for i in range(len(cleaned) - size + 1)}
+
+
+def minhash_signature(text):
+    """
+    Returns: int64 array of NUM_PERM MinHash values for the text's shingles
+    """
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(text)), dtype=np.int64)
+    hashes %= _PRIME
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def cluster_texts(texts, threshold=NEAR_DEDUP_THRESHOLD, bands=BANDS):
+    """
+    Group near-identical texts
+    Returns: list where entry i is the index of the representative (first
+    occurrence) of text i's cluster; representatives point at themselves
+    """
+    if not texts:
+        return []
+    signatures = np.stack([minhash_signature(text) for text in texts])
+    rows = NUM_PERM // bands
+    # Union-find over text indices; a root is always its cluster's earliest text
+    parents = list(range(len(texts)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    comparable = [i for i, text in enumerate(texts) if len(clean_text(text)) >= SHINGLE_SIZE]
+    for band in range(bands):
+        buckets = {}
+        for i in comparable:
+            buckets.setdefault(signatures[i, band * rows:(band + 1) * rows].tobytes(), []).append(i)
+        for members in buckets.values():
+            for i in members[1:]:
+                first, other = find(members[0]), find(i)
+                if first == other:
+                    continue
+                if np.mean(signatures[first] == signatures[other]) >= threshold:
+                    parents[max(first, other)] = min(first, other)
+    return [find(i) for i in range(len(texts))]
+
+
+def classify_clustered(texts, predict_fn, threshold=NEAR_DEDUP_THRESHOLD):
+    """
+    Classify one representative per near-duplicate cluster and copy its label to the rest
+    Returns: (predictions, representatives) in input order; text i's label was
+    inferred from its cluster when representatives[i] != i
+    """
+    representatives = cluster_texts(texts, threshold)
+    anchors = sorted(set(representatives))
+    anchor_predictions = dict(zip(anchors, predict_fn([texts[i] for i in anchors])))
+    return [anchor_predictions[representative] for representative in representatives], representatives
+
+
+def cluster_summary(texts, predictions, representatives, top=5):
+    """
+    Returns: dict with cluster counts and the largest clusters (representative text, size, sentiment)
+    """
+    sizes = {}
+    for representative in representatives:
+        sizes[representative] = sizes.get(representative, 0) + 1
+    largest = sorted((i for i, size in sizes.items() if size > 1), key=lambda i: (-sizes[i], i))[:top]
+    return {
+        'texts': len(texts),
+        'clusters': len(sizes),
+        'inferred': len(texts) - len(sizes),
+        'largest_clusters': [
+            {'text': texts[i], 'size': sizes[i], 'sentiment': predictions[i][0]} for i in largest
+        ]
+    }
@@ -0,0 +1,148 @@
+"""
+ONNX Runtime inference backend for the sentiment classifier.
+
+The serving model (base or fine-tuned) is exported once per model fingerprint
+into ONNX_EXPORT_DIR, optionally with a dynamically int8-quantized copy, and
+run on CPU through onnxruntime.
+"""
+import hashlib
+import logging
+import os
+import uuid
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ONNX_EXPORT_DIR = os.environ.get('SENTIMENT_ONNX_DIR', './onnx_model')
+ONNX_OPSET = 14
+ONNX_THREADS = int(os.environ.get('SENTIMENT_ONNX_THREADS', '0'))
+
+
+def export_dir_for(fingerprint):
+    return os.path.join(ONNX_EXPORT_DIR, hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:16])
+
+
+def model_path(fingerprint, quantized=False):
+    return os.path.join(export_dir_for(fingerprint), 'model.int8.onnx' if quantized else 'model.onnx')
+
+
+def _temp_path(path):
+    # Unique per export, so workers exporting the same fingerprint at once never share a temp file
+    return f'{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+
+
+def _discard(tmp_path):
+    # Leftover of a failed export; a successful one was already renamed away
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def export_model(model, tokenizer, fingerprint, quantize=True):
+    """
+    Export a PyTorch sequence classifier to ONNX (and an int8 copy if quantize)
+    Existing exports for the same fingerprint are reused.
+    Returns: dict with the 'fp32' and (if quantized) 'int8' model paths
+    """
+    import torch
+
+    out_dir = export_dir_for(fingerprint)
+    os.makedirs(out_dir, exist_ok=True)
+
+    fp32_path = model_path(fingerprint)
+    paths = {'fp32': fp32_path}
+
+    if not os.path.exists(fp32_path):
+        sample = tokenizer(["Contoh ulasan untuk ekspor model"], return_tensors='pt')
+        input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+
+        class LogitsOnly(torch.nn.Module):
+            # Map positional ONNX inputs back to keyword arguments and drop everything but the logits
+            def __init__(self, wrapped):
+                super().__init__()
+                self.wrapped = wrapped
+
+            def forward(self, *inputs):
+                return self.wrapped(**dict(zip(input_names, inputs))).logits
+
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+        dynamic_axes['logits'] = {0: 'batch'}
+
+        logger.info(f"Exporting model to ONNX at {fp32_path}...")
+        tmp_path = _temp_path(fp32_path)
+        try:
+            with torch.no_grad():
+                torch.onnx.export(
+                    LogitsOnly(model.eval()),
+                    tuple(sample[name] for name in input_names),
+                    tmp_path,
+                    input_names=input_names,
+                    output_names=['logits'],
+                    dynamic_axes=dynamic_axes,
+                    opset_version=ONNX_OPSET
+                )
+            # Rename last so concurrent workers never load a half-written file
+            os.replace(tmp_path, fp32_path)
+        finally:
+            _discard(tmp_path)
+
+    if quantize:
+        int8_path = model_path(fingerprint, quantized=True)
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logger.info(f"Quantizing ONNX model to int8 at {int8_path}...")
+            tmp_path = _temp_path(int8_path)
+            try:
+                quantize_dynamic(model_input=fp32_path, model_output=tmp_path, weight_type=QuantType.QInt8)
+                os.replace(tmp_path, int8_path)
+            finally:
+                _discard(tmp_path)
+        paths['int8'] = int8_path
+
+    return paths
+
+
+def softmax(logits):
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class OnnxSequenceClassifier:
+    """
+    Minimal stand-in for a transformers sequence classifier backed by onnxruntime
+    Exposes .config so callers can keep using config.id2label.
+    """
+
+    def __init__(self, path, config):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+
+        self.path = path
+        self.config = config
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def logits(self, encoded):
+        feeds = {name: np.asarray(encoded[name], dtype=np.int64) for name in self.input_names}
+        return self.session.run(['logits'], feeds)[0]
+
+
+def parity_report(reference_probs, candidate_probs):
+    """
+    Compare two probability matrices for the same texts
+    Returns: dict with label agreement and max absolute probability delta
+    """
+    reference_probs = np.asarray(reference_probs)
+    candidate_probs = np.asarray(candidate_probs)
+    agreement = (reference_probs.argmax(axis=-1) == candidate_probs.argmax(axis=-1)).mean()
+    return {
+        'samples': int(len(reference_probs)),
+        'label_agreement': round(float(agreement), 4),
+        'max_prob_delta': round(float(np.abs(reference_probs - candidate_probs).max()), 6)
+    }
@@ -0,0 +1,167 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionStore:
+    """
+    Persistent prediction cache in a SQLite file, shared by every worker process.
+
+    Rows are keyed by the same text-hash + model-fingerprint key as the
+    in-memory cache. Writes and last-used touches are buffered and committed
+    in batches; once the table exceeds max_rows the least recently used rows
+    are evicted down to evict_to of max_rows.
+
+    The row count is tracked in memory from one COUNT(*) at open, counting
+    every buffered write as a new row (an upper bound). The exact count is
+    only taken again when that estimate passes max_rows or every
+    recount_flushes flushes, which also picks up rows other workers added.
+    """
+
+    def __init__(self, path, max_rows=200000, flush_rows=64, flush_interval=2.0, evict_to=0.9,
+                 recount_flushes=100):
+        self.path = path
+        self.max_rows = max_rows
+        self.evict_to = evict_to
+        self.recount_flushes = recount_flushes
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._touched = set()
+        self._last_flush = time.monotonic()
+        self._flushes_since_count = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS predictions (
+            key TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            sentiment VARCHAR(20) NOT NULL,
+            confidence REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_predictions_last_used ON predictions (last_used)')
+        self._conn.commit()
+        self._row_estimate = self._count_rows()
+
+    def _count_rows(self):
+        return self._conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+
+    def get_many(self, keys):
+        """
+        Returns: dict of key -> (sentiment, confidence) for the keys that are stored
+        """
+        found = {}
+        with self._lock:
+            lookup = []
+            for key in keys:
+                if key in self._pending:
+                    found[key] = self._pending[key][1:]
+                else:
+                    lookup.append(key)
+
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(lookup), 500):
+                chunk = lookup[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT key, sentiment, confidence FROM predictions WHERE key IN ({placeholders})', chunk
+                ).fetchall()
+                for key, sentiment, confidence in rows:
+                    found[key] = (sentiment, confidence)
+                    self._touched.add(key)
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            self._maybe_flush()
+        return found
+
+    def put_many(self, fingerprint, items):
+        """
+        Buffer (key, (sentiment, confidence)) pairs for the next batched write
+        """
+        with self._lock:
+            for key, (sentiment, confidence) in items:
+                self._pending[key] = (fingerprint, sentiment, float(confidence))
+            self._maybe_flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _maybe_flush(self):
+        if len(self._pending) + len(self._touched) >= self.flush_rows or \
+                time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if not self._pending and not self._touched:
+            return
+
+        now = time.time()
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO predictions (key, fingerprint, sentiment, confidence, last_used) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [(key, fp, sentiment, confidence, now) for key, (fp, sentiment, confidence) in self._pending.items()]
+                )
+                self._conn.executemany(
+                    'UPDATE predictions SET last_used = ? WHERE key = ?',
+                    [(now, key) for key in self._touched if key not in self._pending]
+                )
+
+                self._row_estimate += len(self._pending)
+                self._flushes_since_count += 1
+                if self._row_estimate > self.max_rows or self._flushes_since_count >= self.recount_flushes:
+                    self._row_estimate = self._count_rows()
+                    self._flushes_since_count = 0
+                if self._row_estimate > self.max_rows:
+                    # Evict below the cap so the next exact count is many flushes away
+                    excess = self._row_estimate - int(self.max_rows * self.evict_to)
+                    self._conn.execute(
+                        'DELETE FROM predictions WHERE key IN '
+                        '(SELECT key FROM predictions ORDER BY last_used LIMIT ?)', (excess,)
+                    )
+                    self._row_estimate -= excess
+                    self.evictions += excess
+        except sqlite3.Error as e:
+            # The store is only a cache; losing a batch of writes is acceptable
+            logger.warning(f"Prediction store flush failed: {e}")
+
+        self._pending.clear()
+        self._touched.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                # Maintained upper bound, so health checks never scan the table
+                'rows': self._row_estimate,
+                'pending_writes': len(self._pending),
+                'max_rows': self.max_rows,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
@@ -1,4 +1,3 @@
-from youtube_comment_downloader import YoutubeCommentDownloader
 from itertools import islice
 
 def get_youtube_comments(url, limit=20):
@@ -13,6 +12,9 @@ def get_youtube_comments(url, limit=20):
         list: A list of comment texts.
     """
     try:
+        # Imported on first use: it pulls in dateparser, which is slow to import
+        from youtube_comment_downloader import YoutubeCommentDownloader
+
         downloader = YoutubeCommentDownloader()
         # sort_by=0 (popular), sort_by=1 (newest)
         comments = downloader.get_comments_from_url(url, sort_by=1)
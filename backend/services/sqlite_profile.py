@@ -0,0 +1,72 @@
+"""
+SQLite connection profile for the app database.
+
+Every new DBAPI connection of the engine gets the profile's PRAGMAs. The
+'tuned' profile switches to WAL (readers no longer block behind a writer),
+relaxes fsync to synchronous=NORMAL (durable across application crashes,
+only the last transactions can be lost on power failure), waits on locks
+instead of failing with "database is locked", and gives each connection a
+larger page cache, memory-mapped reads and in-memory temp tables.
+'default' leaves SQLite's settings alone.
+
+Each PRAGMA can be overridden with SENTIMENT_SQLITE_<NAME>, e.g.
+SENTIMENT_SQLITE_BUSY_TIMEOUT=10000.
+"""
+import logging
+import os
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PROFILE = os.environ.get('SENTIMENT_SQLITE_PROFILE', 'tuned')
+
+PROFILES = {
+    'tuned': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': '5000',  # ms
+        'mmap_size': str(256 * 1024 * 1024),
+        'cache_size': '-16000',  # negative = KiB per connection
+        'temp_store': 'MEMORY'
+    },
+    'default': {}
+}
+
+
+def profile_pragmas(profile=SQLITE_PROFILE):
+    """
+    Returns: dict of PRAGMA name -> value for the profile, with environment overrides applied
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown SQLite profile '{profile}' (use {', '.join(PROFILES)})")
+    pragmas = dict(PROFILES[profile])
+    for name in PROFILES['tuned']:
+        override = os.environ.get(f'SENTIMENT_SQLITE_{name.upper()}')
+        if override:
+            pragmas[name] = override
+    return pragmas
+
+
+def apply_sqlite_profile(engine, profile=SQLITE_PROFILE):
+    """
+    Run the profile's PRAGMAs on every new connection of a SQLite engine
+    Returns: dict of the PRAGMAs applied (empty for other databases)
+    """
+    if engine.dialect.name != 'sqlite':
+        return {}
+    pragmas = profile_pragmas(profile)
+    if not pragmas:
+        return pragmas
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+    logger.info(f"SQLite profile '{profile}': {pragmas}")
+    return pragmas
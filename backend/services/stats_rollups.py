@@ -0,0 +1,182 @@
+"""
+Materialized per-user sentiment counters behind the dashboard stats.
+
+sentiment_totals holds each user's all-time count per label and
+daily_sentiment_counts the count per UTC day, both for the predicted
+sentiment (kind 'sentiment') and for user feedback (kind 'correction').
+ORM events update them in the same transaction as every Analysis insert,
+delete and sentiment/correction change, so submit_feedback keeps them
+consistent by committing the correction. Corrections are counted on the
+day of the analysis they belong to. Bulk Query.update()/delete() skip
+ORM events; recompute with backend/scripts/rebuild_stats_rollups.py after those.
+A database from before the rollups existed is filled once at startup
+(backfill_if_empty).
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect, text
+
+from backend.models.models import Analysis, DailySentimentCount, SentimentTotal
+
+logger = logging.getLogger(__name__)
+
+SENTIMENT = 'sentiment'
+CORRECTION = 'correction'
+TREND_BUCKETS = ('day', 'week')
+# (kind, analyses column it counts)
+ROLLUP_COLUMNS = ((SENTIMENT, 'sentiment'), (CORRECTION, 'correction'))
+
+# Recompute the rollups from analyses; shared with backend/scripts/rebuild_stats_rollups.py.
+# Only fills empty tables: a second worker backfilling at the same time adds nothing.
+REBUILD_DAILY_SQL = (
+    'INSERT INTO daily_sentiment_counts (user_id, kind, day, label, count) '
+    'SELECT user_id, :kind, date(created_at), {column}, COUNT(*) FROM analyses '
+    'WHERE user_id IS NOT NULL AND {column} IS NOT NULL AND NOT EXISTS (SELECT 1 FROM sentiment_totals) '
+    'GROUP BY user_id, date(created_at), {column} '
+    'ON CONFLICT DO NOTHING'
+)
+REBUILD_TOTALS_SQL = (
+    'INSERT INTO sentiment_totals (user_id, kind, label, count) '
+    # WHERE true: SQLite needs it to tell the upsert clause apart from a join constraint
+    'SELECT user_id, kind, label, SUM(count) FROM daily_sentiment_counts WHERE true '
+    'GROUP BY user_id, kind, label '
+    'ON CONFLICT DO NOTHING'
+)
+
+_UPSERT_TOTAL = text(
+    'INSERT INTO sentiment_totals (user_id, kind, label, count) VALUES (:user_id, :kind, :label, :count) '
+    'ON CONFLICT (user_id, kind, label) DO UPDATE SET count = sentiment_totals.count + excluded.count'
+)
+_UPSERT_DAILY = text(
+    'INSERT INTO daily_sentiment_counts (user_id, kind, day, label, count) '
+    'VALUES (:user_id, :kind, :day, :label, :count) '
+    'ON CONFLICT (user_id, kind, day, label) DO UPDATE SET count = daily_sentiment_counts.count + excluded.count'
+)
+
+
+def _day(created_at):
+    return (created_at or datetime.utcnow()).strftime('%Y-%m-%d')
+
+
+def _apply(connection, user_id, sentiment, correction, created_at, sign):
+    if user_id is None:
+        return
+    rows = [
+        {'user_id': int(user_id), 'kind': kind, 'label': label, 'day': _day(created_at), 'count': sign}
+        for kind, label in ((SENTIMENT, sentiment), (CORRECTION, correction))
+        if label is not None
+    ]
+    connection.execute(_UPSERT_TOTAL, rows)
+    connection.execute(_UPSERT_DAILY, rows)
+
+
+@event.listens_for(Analysis, 'after_insert')
+def _count_inserted(mapper, connection, target):
+    _apply(connection, target.user_id, target.sentiment, target.correction, target.created_at, 1)
+
+
+@event.listens_for(Analysis, 'after_delete')
+def _uncount_deleted(mapper, connection, target):
+    _apply(connection, target.user_id, target.sentiment, target.correction, target.created_at, -1)
+
+
+TRACKED_COLUMNS = ('user_id', 'sentiment', 'correction', 'created_at')
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# active_history: setting an expired attribute (e.g. on an object used after a commit) loads its
+# old value first, so _recount_updated knows what to uncount
+for _name in TRACKED_COLUMNS:
+    event.listen(getattr(Analysis, _name), 'set', _load_old_value, active_history=True)
+
+
+@event.listens_for(Analysis, 'after_update')
+def _recount_updated(mapper, connection, target):
+    state = inspect(target)
+    changed = False
+    old = {}
+    for name in TRACKED_COLUMNS:
+        history = state.attrs[name].history
+        changed = changed or history.has_changes()
+        old[name] = history.deleted[0] if history.deleted else getattr(target, name)
+    if changed:
+        _apply(connection, old['user_id'], old['sentiment'], old['correction'], old['created_at'], -1)
+        _apply(connection, target.user_id, target.sentiment, target.correction, target.created_at, 1)
+
+
+def backfill_if_empty(engine):
+    """
+    Fill the rollups from analyses in one transaction when sentiment_totals is
+    empty but analyses is not; two single-row reads otherwise
+    Returns: True if it backfilled
+    """
+    with engine.connect() as connection:
+        if connection.execute(text('SELECT 1 FROM sentiment_totals LIMIT 1')).first() is not None \
+                or connection.execute(text('SELECT 1 FROM analyses LIMIT 1')).first() is None:
+            return False
+    with engine.begin() as connection:
+        for kind, column in ROLLUP_COLUMNS:
+            connection.execute(text(REBUILD_DAILY_SQL.format(column=column)), {'kind': kind})
+        connection.execute(text(REBUILD_TOTALS_SQL))
+    logger.info("Backfilled the stats rollups from existing analyses")
+    return True
+
+
+def totals_query(user_id, kind=SENTIMENT):
+    """
+    Returns: query of (label, count) rows of the user's all-time totals
+    """
+    return SentimentTotal.query.with_entities(SentimentTotal.label, SentimentTotal.count) \
+        .filter_by(user_id=int(user_id), kind=kind)
+
+
+def user_totals(user_id, kind=SENTIMENT):
+    """
+    Returns: dict of label -> all-time count for the user
+    """
+    return {label: count for label, count in totals_query(user_id, kind).all() if count}
+
+
+def trend_query(user_id, first_day, kind=SENTIMENT):
+    """
+    Returns: query of (day, label, count) rows of the daily rollup from first_day (a date) on
+    """
+    return DailySentimentCount.query.with_entities(DailySentimentCount.day, DailySentimentCount.label,
+                                                   DailySentimentCount.count) \
+        .filter(DailySentimentCount.user_id == int(user_id), DailySentimentCount.kind == kind,
+                DailySentimentCount.day >= first_day.strftime('%Y-%m-%d'))
+
+
+def bucket_start(day, bucket):
+    """
+    Returns: first day (date) of the bucket containing day; weeks start on Monday
+    """
+    return day - timedelta(days=day.weekday()) if bucket == 'week' else day
+
+
+def user_trend(user_id, days=7, bucket='day', kind=SENTIMENT, today=None):
+    """
+    Per-bucket counts over the last days days (today included), read from the daily rollup
+    Returns: (list of bucket start dates as YYYY-MM-DD, dict of bucket -> {label: count})
+    """
+    today = today or datetime.utcnow().date()
+    first_day = today - timedelta(days=days - 1)
+
+    buckets = []
+    day = first_day
+    while day <= today:
+        start = bucket_start(day, bucket).strftime('%Y-%m-%d')
+        if not buckets or buckets[-1] != start:
+            buckets.append(start)
+        day += timedelta(days=1)
+
+    counts = {start: {} for start in buckets}
+    for day_str, label, count in trend_query(user_id, first_day, kind).all():
+        start = bucket_start(datetime.strptime(day_str, '%Y-%m-%d').date(), bucket).strftime('%Y-%m-%d')
+        if start in counts:
+            counts[start][label] = counts[start].get(label, 0) + count
+    return buckets, counts
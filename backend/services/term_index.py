@@ -0,0 +1,182 @@
+"""
+Per-user term-frequency index behind the dashboard word cloud.
+
+term_frequencies holds one row per (user, sentiment, term), where sentiment
+is an analysis label or ALL_SENTIMENTS for the user's whole history. ORM
+events keep it in step with every Analysis insert, delete and text/sentiment
+change, inside the same transaction. Bulk Query.update()/delete() skip ORM
+events; rebuild with backend/scripts/backfill_term_index.py after those.
+A database from before the index existed is filled once at startup
+(backfill_if_empty).
+"""
+import logging
+import re
+from collections import Counter
+
+from sqlalchemy import event, inspect, text
+
+from backend.models.models import Analysis, TermFrequency
+
+logger = logging.getLogger(__name__)
+
+ALL_SENTIMENTS = 'ALL'
+SENTIMENTS = ('Positif', 'Negatif', 'Netral')
+WORD_PATTERN = re.compile(r'\w+')
+MIN_TERM_LENGTH = 4
+
+# Indonesian Stopwords (Basic list)
+STOPWORDS = frozenset([
+    'yang', 'di', 'dan', 'itu', 'dengan', 'untuk', 'tidak', 'ini', 'dari',
+    'dalam', 'akan', 'pada', 'juga', 'saya', 'ke', 'karena', 'tersebut',
+    'bisa', 'ada', 'mereka', 'lebih', 'sudah', 'atau', 'saat', 'oleh',
+    'sebagai', 'adalah', 'apa', 'kita', 'kamu', 'dia', 'anda', 'aku',
+    'sangat', 'tapi', 'namun', 'jika', 'kalau', 'maka', 'sehingga',
+    'banyak', 'sedikit', 'kurang', 'cukup', 'paling', 'seperti', 'hanya'
+])
+
+_UPSERT = text(
+    'INSERT INTO term_frequencies (user_id, sentiment, term, count) VALUES (:user_id, :sentiment, :term, :count) '
+    'ON CONFLICT (user_id, sentiment, term) DO UPDATE SET count = term_frequencies.count + excluded.count'
+)
+_DECREMENT = text(
+    'UPDATE term_frequencies SET count = count - :count '
+    'WHERE user_id = :user_id AND sentiment = :sentiment AND term = :term'
+)
+_PRUNE = text('DELETE FROM term_frequencies WHERE user_id = :user_id AND count <= 0')
+# Backfill rows: skipped where another worker's backfill (or a listener since) wrote them already
+INSERT_MISSING_SQL = ('INSERT INTO term_frequencies (user_id, sentiment, term, count) '
+                      'VALUES (:user_id, :sentiment, :term, :count) ON CONFLICT DO NOTHING')
+
+
+def term_counts(text_value):
+    """
+    Tokenize a text the way the word cloud does (lowercase \\w+ words, no stopwords, at least 4 characters)
+    Returns: Counter of term -> occurrences
+    """
+    words = WORD_PATTERN.findall((text_value or '').lower())
+    return Counter(word for word in words if len(word) >= MIN_TERM_LENGTH and word not in STOPWORDS)
+
+
+def index_rows(user_id, sentiment, counts):
+    """
+    Returns: parameter dicts for counts under both the sentiment and ALL_SENTIMENTS
+    """
+    return [
+        {'user_id': user_id, 'sentiment': key, 'term': term, 'count': count}
+        for key in (ALL_SENTIMENTS, sentiment)
+        for term, count in counts.items()
+    ]
+
+
+def build_index_rows(analyses):
+    """
+    Term index rows for (user_id, sentiment, text) tuples sorted by user_id, one user at a time
+    Yields: list of parameter dicts for each user
+    """
+    current_user, counts = None, {}
+    for user_id, sentiment, text_value in analyses:
+        if user_id != current_user:
+            if current_user is not None:
+                yield _count_rows(current_user, counts)
+            current_user, counts = user_id, {}
+        terms = term_counts(text_value)
+        counts.setdefault(sentiment, Counter()).update(terms)
+        counts.setdefault(ALL_SENTIMENTS, Counter()).update(terms)
+    if current_user is not None:
+        yield _count_rows(current_user, counts)
+
+
+def _count_rows(user_id, counts):
+    return [
+        {'user_id': int(user_id), 'sentiment': sentiment, 'term': term, 'count': count}
+        for sentiment, terms in counts.items()
+        for term, count in terms.items()
+    ]
+
+
+def _apply(connection, user_id, sentiment, text_value, sign):
+    if user_id is None:
+        return
+    rows = index_rows(int(user_id), sentiment, term_counts(text_value))
+    if not rows:
+        return
+    if sign > 0:
+        connection.execute(_UPSERT, rows)
+    else:
+        connection.execute(_DECREMENT, rows)
+        connection.execute(_PRUNE, {'user_id': int(user_id)})
+
+
+@event.listens_for(Analysis, 'after_insert')
+def _index_inserted(mapper, connection, target):
+    _apply(connection, target.user_id, target.sentiment, target.text, 1)
+
+
+@event.listens_for(Analysis, 'after_delete')
+def _unindex_deleted(mapper, connection, target):
+    _apply(connection, target.user_id, target.sentiment, target.text, -1)
+
+
+TRACKED_COLUMNS = ('user_id', 'sentiment', 'text')
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# active_history: setting an expired attribute (e.g. on an object used after a commit) loads its
+# old value first, so _reindex_updated knows what to unindex
+for _name in TRACKED_COLUMNS:
+    event.listen(getattr(Analysis, _name), 'set', _load_old_value, active_history=True)
+
+
+@event.listens_for(Analysis, 'after_update')
+def _reindex_updated(mapper, connection, target):
+    state = inspect(target)
+    changed = False
+    old = {}
+    for name in TRACKED_COLUMNS:
+        history = state.attrs[name].history
+        changed = changed or history.has_changes()
+        old[name] = history.deleted[0] if history.deleted else getattr(target, name)
+    if changed:
+        _apply(connection, old['user_id'], old['sentiment'], old['text'], -1)
+        _apply(connection, target.user_id, target.sentiment, target.text, 1)
+
+
+def backfill_if_empty(engine, chunk_size=5000):
+    """
+    Build the index from analyses in one transaction when term_frequencies is
+    empty but analyses is not; two single-row reads otherwise
+    Returns: True if it backfilled
+    """
+    with engine.connect() as connection:
+        if connection.execute(text('SELECT 1 FROM term_frequencies LIMIT 1')).first() is not None \
+                or connection.execute(text('SELECT 1 FROM analyses LIMIT 1')).first() is None:
+            return False
+    written = 0
+    with engine.begin() as connection:
+        analyses = connection.execute(text('SELECT user_id, sentiment, text FROM analyses '
+                                           'WHERE user_id IS NOT NULL ORDER BY user_id')).yield_per(chunk_size)
+        for rows in build_index_rows(analyses):
+            if rows:
+                connection.execute(text(INSERT_MISSING_SQL), rows)
+                written += len(rows)
+    logger.info(f"Backfilled the term index with {written} rows from existing analyses")
+    return True
+
+
+def top_terms_query(user_id, sentiment=ALL_SENTIMENTS, limit=50):
+    """
+    Returns: query of (term, count) rows, most frequent first
+    """
+    return TermFrequency.query.with_entities(TermFrequency.term, TermFrequency.count) \
+        .filter_by(user_id=int(user_id), sentiment=sentiment) \
+        .order_by(TermFrequency.count.desc()).limit(limit)
+
+
+def top_terms(user_id, sentiment=ALL_SENTIMENTS, limit=50):
+    """
+    Returns: list of (term, count), most frequent first
+    """
+    return top_terms_query(user_id, sentiment, limit).all()
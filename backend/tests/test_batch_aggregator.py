@@ -0,0 +1,90 @@
+"""
+BatchAggregator folded over chunks must match one pass over the whole batch.
+
+The model call in batch_processing is replaced by a stub that labels each
+text from its words, so no model is loaded.
+Run with: python -m pytest backend/tests/test_batch_aggregator.py
+"""
+import random
+
+import pandas as pd
+import pytest
+
+from backend.services import batch_processing
+from backend.services.batch_processing import BatchAggregator, classify_chunk
+
+WORDS = ['bagus', 'mantap', 'jelek', 'rusak', 'lambat', 'pengiriman', 'barang', 'sesuai']
+PRODUCTS = ['Sepatu', 'Tas', 'Jaket', 'Topi']
+
+
+def fake_predict(texts, batch_size=None, with_stats=False):
+    def label(text):
+        words = set(text.split())
+        if words & {'jelek', 'rusak', 'lambat'}:
+            return 'Negatif'
+        return 'Positif' if words & {'bagus', 'mantap'} else 'Netral'
+
+    predictions = [(label(text), 0.9) for text in texts]
+    stats = batch_processing.dedup_stats(len(texts), len(set(texts)))
+    return (predictions, stats) if with_stats else predictions
+
+
+@pytest.fixture(autouse=True)
+def stub_model(monkeypatch):
+    monkeypatch.setattr(batch_processing, 'predict_sentiment_many', fake_predict)
+
+
+def upload(rows=500, seed=0):
+    rng = random.Random(seed)
+    texts = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 5))) for _ in range(rows)]
+    # Blank and too-short texts are dropped by classify_chunk
+    for i in rng.sample(range(rows), 20):
+        texts[i] = rng.choice(['', '  ', 'ok', None])
+    return pd.DataFrame({'ulasan': texts, 'produk': [rng.choice(PRODUCTS) for _ in range(rows)]})
+
+
+def aggregate(df, chunk_rows):
+    aggregator = BatchAggregator(has_products=True)
+    unique_per_chunk = 0
+    for start in range(0, len(df), chunk_rows):
+        frame = classify_chunk(df.iloc[start:start + chunk_rows], 'ulasan', 'produk')
+        unique_per_chunk += frame.attrs['unique_texts']
+        aggregator.add(frame)
+    return aggregator, unique_per_chunk
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 7, 64, 499])
+def test_chunked_summary_matches_a_single_pass(chunk_rows):
+    df = upload()
+    single, _ = aggregate(df, len(df))
+    merged, unique_per_chunk = aggregate(df, chunk_rows)
+
+    expected, summary = single.summary(), merged.summary()
+    assert summary['stats'] == expected['stats']
+    assert summary['total'] == expected['total'] == sum(expected['stats'].values())
+    assert summary['product_stats'] == expected['product_stats']
+    # Products stay in order of first appearance
+    assert list(summary['product_stats']) == list(expected['product_stats'])
+    assert merged.negative_keywords == single.negative_keywords
+    assert summary['insights'] == expected['insights']
+    # Texts are deduplicated within a chunk, so a text repeated across chunks is classified once per chunk
+    assert merged.unique_texts == unique_per_chunk
+    assert expected['dedup']['unique_texts'] <= summary['dedup']['unique_texts'] <= summary['total']
+
+
+def test_unique_texts_match_when_repeats_stay_within_a_chunk():
+    # Every text repeated three times in a row, chunks aligned to the repeats
+    texts = [f'barang nomor {i} bagus' for i in range(30) for _ in range(3)]
+    df = pd.DataFrame({'ulasan': texts, 'produk': [PRODUCTS[i % 4] for i in range(len(texts))]})
+    single, _ = aggregate(df, len(df))
+    merged, _ = aggregate(df, 9)
+    assert merged.unique_texts == single.unique_texts == 30
+    assert merged.summary()['dedup'] == single.summary()['dedup']
+
+
+def test_frames_without_dedup_stats_count_every_row():
+    aggregator = BatchAggregator()
+    aggregator.add(pd.DataFrame({'text': ['barang bagus', 'barang bagus'], 'sentiment': ['Positif', 'Positif']}))
+    aggregator.add(pd.DataFrame({'text': [], 'sentiment': []}))
+    assert (aggregator.total, aggregator.unique_texts) == (2, 2)
+    assert aggregator.stats['Positif'] == 2
@@ -0,0 +1,112 @@
+"""
+MicroBatcher grouping, flush triggers and error propagation.
+Run with: python -m pytest backend/tests/test_batcher.py
+"""
+import threading
+import time
+
+import pytest
+
+from backend.services.batcher import MicroBatcher
+
+
+class Recorder:
+    """
+    batch_fn that records every batch it sees and doubles each item
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, items):
+        with self.lock:
+            self.batches.append(list(items))
+        return [item * 2 for item in items]
+
+
+def test_submit_many_keeps_input_order():
+    batcher = MicroBatcher(Recorder(), max_batch_size=4, max_wait_ms=5)
+    assert batcher.submit_many(list(range(10))) == [item * 2 for item in range(10)]
+
+
+def test_full_batch_flushes_without_waiting_for_the_deadline():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=4, max_wait_ms=10000)
+    started = time.monotonic()
+    assert batcher.submit_many([1, 2, 3, 4]) == [2, 4, 6, 8]
+    assert time.monotonic() - started < 5
+    assert recorder.batches == [[1, 2, 3, 4]]
+
+
+def test_items_are_split_at_max_batch_size():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=3, max_wait_ms=50)
+    batcher.submit_many(list(range(7)))
+    assert [len(batch) for batch in recorder.batches] == [3, 3, 1]
+    assert batcher.stats()['batches_run'] == 3
+    assert batcher.stats()['items_processed'] == 7
+
+
+def test_partial_batch_flushes_after_max_wait():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=100, max_wait_ms=50)
+    started = time.monotonic()
+    assert batcher.submit(21) == 42
+    elapsed = time.monotonic() - started
+    assert 0.04 <= elapsed < 5
+    assert recorder.batches == [[21]]
+
+
+def test_concurrent_callers_share_a_batch():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=8, max_wait_ms=200)
+    results = {}
+    barrier = threading.Barrier(8)
+
+    def call(item):
+        barrier.wait()
+        results[item] = batcher.submit(item)
+
+    threads = [threading.Thread(target=call, args=(item,)) for item in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert results == {item: item * 2 for item in range(8)}
+    assert len(recorder.batches) < 8
+
+
+def test_batch_fn_error_reaches_every_waiting_caller():
+    def failing(items):
+        raise ValueError('model gagal')
+
+    batcher = MicroBatcher(failing, max_batch_size=4, max_wait_ms=50)
+    errors = []
+
+    def call(item):
+        try:
+            batcher.submit(item)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call, args=(item,)) for item in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert errors == ['model gagal'] * 4
+
+
+def test_wrong_result_count_is_an_error_and_the_worker_survives():
+    calls = []
+
+    def short_then_ok(items):
+        calls.append(len(items))
+        return items[:-1] if len(calls) == 1 else items
+
+    batcher = MicroBatcher(short_then_ok, max_batch_size=4, max_wait_ms=5)
+    with pytest.raises(RuntimeError, match='returned 1 results for 2 items'):
+        batcher.submit_many([1, 2])
+    assert batcher.submit(5) == 5
@@ -0,0 +1,221 @@
+"""
+Write-behind history buffer: id allocation, targeted flushes, backpressure,
+partial-failure handling and waiting for rows another worker still buffers,
+plus feedback right after a write-behind classify through the real endpoints
+(with the model call stubbed out).
+Run with: python -m pytest backend/tests/test_history_writer.py
+"""
+import importlib
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from backend.extensions import db
+from backend.models.models import Analysis, SentimentTotal, User
+from backend.services import stats_rollups, term_index  # noqa: F401  (ORM listeners, as in the app)
+from backend.services.history_writer import HistoryBufferFull, HistoryWriter, IdBlockAllocator
+
+NEVER_MS = 60000  # flush interval long enough that only row counts, flush() or close() write anything
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'history.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='pengguna', email='pengguna@example.com', password_hash='x'))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_writer(app):
+    writers = []
+
+    def make(**options):
+        writer = HistoryWriter(**options)
+        writer.init_app(app)
+        writers.append(writer)
+        return writer
+
+    with app.app_context():
+        yield make
+    for writer in writers:
+        writer.close()
+
+
+def stored_ids(app):
+    with app.app_context():
+        return {row.id for row in Analysis.query.all()}
+
+
+def test_ids_are_unique_and_written_under_concurrency(app, make_writer):
+    # A small buffer, so producers also go through backpressure
+    writer = make_writer(max_pending=20, flush_rows=8, flush_ms=20, enqueue_timeout=10)
+    ids, lock = [], threading.Lock()
+
+    def produce(worker):
+        # Like request threads: enqueue reserves id blocks through the app's engine
+        with app.app_context():
+            for i in range(25):
+                analysis_id = writer.enqueue(1, f'ulasan {worker}-{i} barang bagus', 'Positif', 0.9)
+                with lock:
+                    ids.append(analysis_id)
+
+    threads = [threading.Thread(target=produce, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+
+    assert len(set(ids)) == len(ids) == 200
+    assert stored_ids(app) == set(ids)
+    stats = writer.stats()
+    assert (stats['written'], stats['dropped'], stats['pending']) == (200, 0, 0)
+    assert stats['batches'] < 200
+    with app.app_context():
+        assert db.session.get(SentimentTotal, (1, 'sentiment', 'Positif')).count == 200
+
+
+def test_allocator_never_reuses_an_existing_id(app):
+    with app.app_context():
+        db.session.add_all(Analysis(user_id=1, text=f'lama {i}', sentiment='Netral') for i in range(5))
+        db.session.commit()
+        # Two processes each reserving blocks
+        first, second = IdBlockAllocator(block_size=3), IdBlockAllocator(block_size=3)
+        allocated = [allocator.allocate() for _ in range(4) for allocator in (first, second)]
+    assert min(allocated) > 5
+    assert len(set(allocated)) == len(allocated)
+
+
+def test_flush_waits_only_for_the_requested_row(app, make_writer):
+    writer = make_writer(flush_rows=1000, flush_ms=NEVER_MS)
+    first = writer.enqueue(1, 'ulasan pertama', 'Positif', 0.9)
+    assert writer.is_pending(first)
+    assert writer.flush(first, timeout=5)
+    assert not writer.is_pending(first)
+    assert first in stored_ids(app)
+
+    # The flush request covered only rows queued up to it; later rows wait for their interval again
+    later = writer.enqueue(1, 'ulasan berikutnya', 'Negatif', 0.8)
+    time.sleep(0.3)
+    assert writer.is_pending(later)
+    assert writer.flush(timeout=5)
+    assert later in stored_ids(app)
+
+
+def test_full_buffer_applies_backpressure(make_writer):
+    writer = make_writer(max_pending=3, flush_rows=1000, flush_ms=NEVER_MS, enqueue_timeout=0.2)
+    for i in range(3):
+        writer.enqueue(1, f'ulasan {i}', 'Positif', 0.9)
+    started = time.monotonic()
+    with pytest.raises(HistoryBufferFull):
+        writer.enqueue(1, 'ulasan berlebih', 'Positif', 0.9)
+    assert time.monotonic() - started >= 0.2
+    assert writer.stats()['backpressure_waits'] >= 1
+
+
+def test_wait_for_row_sees_another_workers_flush(app, make_writer):
+    # Two writers on one database, like two worker processes
+    holder = make_writer(flush_rows=1000, flush_ms=NEVER_MS)
+    other = make_writer(flush_rows=1000, flush_ms=NEVER_MS)
+    analysis_id = holder.enqueue(1, 'ulasan di worker lain', 'Positif', 0.9)
+    threading.Timer(0.3, holder.flush).start()
+
+    started = time.monotonic()
+    assert other.wait_for_row(analysis_id, timeout=5)
+    assert 0.2 <= time.monotonic() - started < 5
+
+
+def test_wait_for_row_gives_up(app, make_writer):
+    writer = make_writer(flush_rows=1000, flush_ms=NEVER_MS)
+    handed_out = writer.allocator.allocate()
+    # Never handed out: no waiting at all
+    started = time.monotonic()
+    assert not writer.wait_for_row(handed_out + 10000, timeout=5)
+    assert time.monotonic() - started < 1
+    # Handed out but never written (e.g. the worker died): polls until the timeout
+    started = time.monotonic()
+    assert not writer.wait_for_row(handed_out, timeout=0.2)
+    assert time.monotonic() - started >= 0.2
+
+
+def test_bad_row_is_dropped_alone(app, make_writer, monkeypatch):
+    monkeypatch.setattr('backend.services.history_writer.FLUSH_ATTEMPTS', 1)
+    writer = make_writer(flush_rows=1000, flush_ms=NEVER_MS)
+    good = [writer.enqueue(1, f'ulasan {i}', 'Positif', 0.9) for i in range(3)]
+    bad = writer.enqueue(1, 'ulasan tanpa label', None, 0.9)
+    good.append(writer.enqueue(1, 'ulasan terakhir', 'Netral', 0.7))
+    writer.close()
+
+    assert stored_ids(app) == set(good)
+    stats = writer.stats()
+    assert (stats['written'], stats['dropped'], stats['dropped_ids']) == (4, 1, [bad])
+    assert stats['row_retries'] == 5
+    assert 'NOT NULL' in stats['last_error']
+
+
+@pytest.fixture
+def web(tmp_path, monkeypatch):
+    # app.py reads its database URI and opens app.log at import: point both at a throwaway directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('SENTIMENT_DATABASE_URI', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('SENTIMENT_EAGER_LOAD', '0')
+    appmod = importlib.import_module('app')
+    appmod.app.config['RATELIMIT_ENABLED'] = False
+    monkeypatch.setattr(appmod, 'predict_with_aspects', lambda text: ('Positif', 0.9, []))
+
+    writer = HistoryWriter(flush_rows=1000, flush_ms=NEVER_MS)
+    writer.init_app(appmod.app)
+    monkeypatch.setattr(appmod, 'history_writer', writer)
+    monkeypatch.setattr(appmod, 'WRITE_BEHIND_ENABLED', True)
+
+    from flask_jwt_extended import create_access_token
+    with appmod.app.app_context():
+        user = User(username=f'web{time.time_ns()}', email=f'web{time.time_ns()}@example.com')
+        user.set_password('rahasia')
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=str(user.id))
+    yield appmod.app.test_client(), {'Authorization': f'Bearer {token}'}, writer
+    writer.close()
+
+
+def test_feedback_right_after_write_behind_classify(web):
+    client, headers, writer = web
+    response = client.post('/api/classify', json={'text_input': 'barangnya bagus sekali, pengiriman cepat'},
+                           headers=headers)
+    analysis_id = response.get_json()['analysis_id']
+    assert analysis_id is not None
+    assert writer.is_pending(analysis_id)
+
+    response = client.post(f'/api/feedback/{analysis_id}', json={'correction': 'Netral'}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    assert not writer.is_pending(analysis_id)
+    with client.application.app_context():
+        assert db.session.get(Analysis, analysis_id).correction == 'Netral'
+
+
+def test_feedback_on_another_worker_waits_for_the_row(web, monkeypatch):
+    client, headers, writer = web
+    response = client.post('/api/classify', json={'text_input': 'pengiriman lambat, barang rusak parah'},
+                           headers=headers)
+    analysis_id = response.get_json()['analysis_id']
+
+    # The feedback lands on a worker whose own buffer does not hold the row
+    other = HistoryWriter(flush_rows=1000, flush_ms=NEVER_MS)
+    other.init_app(client.application)
+    monkeypatch.setattr(importlib.import_module('app'), 'history_writer', other)
+    threading.Timer(0.3, writer.flush).start()
+
+    response = client.post(f'/api/feedback/{analysis_id}', json={'correction': 'Negatif'}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    with client.application.app_context():
+        assert db.session.get(Analysis, analysis_id).correction == 'Negatif'
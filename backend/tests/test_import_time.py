@@ -0,0 +1,47 @@
+"""
+Import-time budget for the web app.
+
+Workers that only serve auth, history or stats endpoints must not pay for the
+ML stack, so `import app` has to stay fast and must not import torch,
+transformers, datasets or pandas. Run with: python -m pytest backend/tests/test_import_time.py
+"""
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMPORT_BUDGET_SECONDS = float(os.environ.get('SENTIMENT_IMPORT_BUDGET', '1.0'))
+HEAVY_MODULES = ('torch', 'transformers', 'datasets', 'pandas', 'sklearn', 'onnxruntime')
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'heavy': [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_import(tmp_path):
+    # Fresh interpreter, throwaway database and log file, so the measurement is a cold import
+    env = dict(os.environ)
+    env['PYTHONPATH'] = REPO_ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    env['SENTIMENT_DATABASE_URI'] = f"sqlite:///{tmp_path / 'import_probe.db'}"
+    env['SENTIMENT_EAGER_LOAD'] = '0'
+    result = subprocess.run([sys.executable, '-c', PROBE], cwd=str(tmp_path), env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_app_skips_ml_stack(tmp_path):
+    probe = measure_import(tmp_path)
+    assert probe['heavy'] == [], f"import app pulled in {probe['heavy']}"
+
+
+def test_import_app_within_budget(tmp_path):
+    # Best of two runs, so a cold disk cache on the first one does not fail the test
+    seconds = min(measure_import(tmp_path)['seconds'] for _ in range(2))
+    assert seconds < IMPORT_BUDGET_SECONDS, \
+        f"import app took {seconds:.2f}s (budget {IMPORT_BUDGET_SECONDS}s)"
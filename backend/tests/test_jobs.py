@@ -0,0 +1,227 @@
+"""
+Claim and resume behaviour of the batch JobManager.
+
+Runs the real JobManager against a throwaway SQLite database in a minimal
+Flask app; the model call in batch_processing is replaced by a stub, so no
+model is loaded. Run with: python -m pytest backend/tests/test_jobs.py
+"""
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from backend.extensions import db
+from backend.models.models import BatchJob, BatchJobResult
+from backend.services import batch_processing, jobs
+from backend.services.jobs import JobManager, owner_is_gone
+
+ROWS = 10
+
+
+def fake_predict(texts, batch_size=None, with_stats=False):
+    predictions = [('Positif', 0.9) for _ in texts]
+    return (predictions, batch_processing.dedup_stats(len(texts), len(texts))) if with_stats else predictions
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_processing, 'predict_sentiment_many', fake_predict)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'jobs.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def manager(app):
+    manager = JobManager(max_workers=2)
+    manager.init_app(app)
+    yield manager
+    manager.stop()
+    if manager._executor is not None:
+        manager._executor.shutdown(wait=True)
+
+
+def add_job(app, tmp_path, job_id, **fields):
+    upload = tmp_path / f'{job_id}.csv'
+    upload.write_text('text\n' + ''.join(f'ulasan nomor {i}\n' for i in range(ROWS)))
+    with app.app_context():
+        db.session.add(BatchJob(id=job_id, filename='ulasan.csv', file_path=str(upload), **fields))
+        db.session.commit()
+
+
+def job_status(app, job_id):
+    with app.app_context():
+        return db.session.get(BatchJob, job_id).status
+
+
+def wait_for_status(app, job_id, status, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if job_status(app, job_id) == status:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_queued_job_runs_to_completion(app, manager, tmp_path):
+    add_job(app, tmp_path, 'queued', status='queued')
+    assert manager.resume_pending() == ['queued']
+    assert wait_for_status(app, 'queued', 'completed')
+    with app.app_context():
+        job = db.session.get(BatchJob, 'queued')
+        assert (job.rows_done, job.results_count, job.owner) == (ROWS, ROWS, manager.owner)
+
+
+def test_stale_running_job_is_resumed_on_restart(app, manager, tmp_path):
+    # Crashed and restarted with the same pid seconds ago: the heartbeat is far from stale
+    host, pid, _ = manager.owner.rsplit(':', 2)
+    add_job(app, tmp_path, 'restarted', status='running', owner=f'{host}:{pid}:previousboot',
+            heartbeat_at=datetime.utcnow() - timedelta(seconds=10))
+    assert manager.resume_pending() == ['restarted']
+    assert wait_for_status(app, 'restarted', 'completed')
+
+
+def test_running_job_of_dead_process_is_reclaimed(app, manager, tmp_path):
+    host = manager.owner.split(':')[0]
+    add_job(app, tmp_path, 'orphan', status='running', owner=f'{host}:{dead_pid()}:otherboot',
+            heartbeat_at=datetime.utcnow())
+    assert manager.resume_pending() == ['orphan']
+    assert wait_for_status(app, 'orphan', 'completed')
+
+
+def test_running_job_of_live_process_is_left_alone(app, manager, tmp_path):
+    host = manager.owner.split(':')[0]
+    for job_id, owner in (('sibling', f'{host}:{os.getppid()}:otherboot'),
+                          ('remote', f'other-host:{dead_pid()}:otherboot')):
+        add_job(app, tmp_path, job_id, status='running', owner=owner, heartbeat_at=datetime.utcnow())
+    assert manager.resume_pending() == []
+    assert job_status(app, 'sibling') == job_status(app, 'remote') == 'running'
+
+
+def test_rescan_picks_up_job_once_heartbeat_goes_stale(app, manager, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_STALE_SECONDS', 0.5)
+    add_job(app, tmp_path, 'elsewhere', status='running', owner='other-host:1:otherboot',
+            heartbeat_at=datetime.utcnow())
+    manager.start()
+    assert job_status(app, 'elsewhere') == 'running'
+    assert wait_for_status(app, 'elsewhere', 'completed', timeout=5.0)
+    with app.app_context():
+        assert db.session.get(BatchJob, 'elsewhere').owner == manager.owner
+
+
+def test_worker_that_lost_its_claim_commits_nothing(app, manager, tmp_path, monkeypatch):
+    def taken_over_mid_chunk(texts, batch_size=None, with_stats=False):
+        # Another worker reclaims the job while this one is still classifying
+        with db.engine.begin() as connection:
+            connection.execute(BatchJob.__table__.update().where(BatchJob.id == 'lost')
+                               .values(owner='other-host:9:otherboot', heartbeat_at=datetime.utcnow()))
+        return fake_predict(texts, batch_size, with_stats)
+
+    monkeypatch.setattr(batch_processing, 'predict_sentiment_many', taken_over_mid_chunk)
+    add_job(app, tmp_path, 'lost', status='queued')
+    manager.resume_pending()
+    deadline = time.monotonic() + 10
+    while manager.stats()['active'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    with app.app_context():
+        job = db.session.get(BatchJob, 'lost')
+        assert (job.status, job.owner, job.rows_done, job.results_count) == \
+            ('running', 'other-host:9:otherboot', 0, 0)
+        assert BatchJobResult.query.filter_by(job_id='lost').count() == 0
+
+
+def test_slow_chunk_keeps_its_heartbeat(app, manager, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_STALE_SECONDS', 0.5)
+    monkeypatch.setattr(jobs, 'JOB_HEARTBEAT_SECONDS', 0.1)
+
+    def slow_predict(texts, batch_size=None, with_stats=False):
+        time.sleep(1.5)  # e.g. the cold model load on the first chunk
+        return fake_predict(texts, batch_size, with_stats)
+
+    monkeypatch.setattr(batch_processing, 'predict_sentiment_many', slow_predict)
+    add_job(app, tmp_path, 'slow', status='queued')
+    manager.resume_pending()
+
+    time.sleep(1.0)
+    other = JobManager()
+    other.init_app(app)
+    other.owner = 'other-host:9:otherboot'
+    assert other.resume_pending() == []
+
+    assert wait_for_status(app, 'slow', 'completed')
+    with app.app_context():
+        assert db.session.get(BatchJob, 'slow').results_count == ROWS
+        assert BatchJobResult.query.filter_by(job_id='slow').count() == ROWS
+
+
+def test_sweep_removes_only_expired_uploads(app, manager, tmp_path, monkeypatch):
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    monkeypatch.setattr(jobs, 'JOB_UPLOAD_DIR', str(uploads))
+    monkeypatch.setattr(jobs, 'JOB_UPLOAD_RETENTION_HOURS', 24)
+    long_ago = datetime.utcnow() - timedelta(days=3)
+    add_job(app, uploads, 'old', status='completed', finished_at=long_ago)
+    add_job(app, uploads, 'recent', status='completed', finished_at=datetime.utcnow())
+    add_job(app, uploads, 'running', status='running', started_at=long_ago)
+    for name, age in (('orphan.csv', timedelta(days=3)), ('fresh.csv', timedelta(0))):
+        (uploads / name).write_text('text\nulasan\n')
+        mtime = time.time() - age.total_seconds()
+        os.utime(uploads / name, (mtime, mtime))
+
+    removed = manager.sweep_uploads()
+    assert sorted(os.path.basename(path) for path in removed) == ['old.csv', 'orphan.csv']
+    assert sorted(os.listdir(uploads)) == ['fresh.csv', 'recent.csv', 'running.csv']
+
+
+def test_export_after_sweep_uses_stored_text(app, manager, tmp_path, monkeypatch):
+    from backend.routes.jobs import iter_job_export_frames
+
+    monkeypatch.setattr(jobs, 'JOB_UPLOAD_DIR', str(tmp_path))
+    add_job(app, tmp_path, 'swept', status='queued')
+    manager.resume_pending()
+    assert wait_for_status(app, 'swept', 'completed')
+    with app.app_context():
+        db.session.get(BatchJob, 'swept').finished_at = datetime.utcnow() - timedelta(days=30)
+        db.session.commit()
+    assert manager.sweep_uploads() == [str(tmp_path / 'swept.csv')]
+
+    frames = list(iter_job_export_frames(app, 'swept'))
+    assert sum(len(frame) for frame in frames) == ROWS
+    assert frames[0]['text'].iloc[0] == 'ulasan nomor 0'
+
+
+def test_claim_is_exclusive(app, tmp_path):
+    add_job(app, tmp_path, 'contested', status='queued')
+    first, second = JobManager(), JobManager()
+    first.owner, second.owner = 'host:1:first', 'host:2:second'
+    with app.app_context():
+        assert first._claim('contested')
+        assert not second._claim('contested')
+        assert not second._claim('contested', previous_owner='host:3:someone-else')
+        assert db.session.get(BatchJob, 'contested').owner == 'host:1:first'
+
+
+def test_owner_is_gone():
+    current = 'web-1:100:bootnow'
+    assert not owner_is_gone(None, current)
+    assert not owner_is_gone(current, current)
+    assert owner_is_gone('web-1:100:bootbefore', current)
+    assert owner_is_gone(f'web-1:{dead_pid()}:bootbefore', current)
+    assert not owner_is_gone(f'web-2:{dead_pid()}:bootbefore', current)
+    assert not owner_is_gone('garbage', current)
@@ -0,0 +1,150 @@
+"""
+Refcounted model swaps and coalesced (re)loads.
+
+The weight loading in model_loader is replaced by a stub that only swaps in
+an empty handle, so no model is downloaded or run.
+Run with: python -m pytest backend/tests/test_model_holder.py
+"""
+import threading
+import time
+
+import pytest
+
+from backend.services import model_loader
+from backend.services.model_holder import ModelHandle, ModelHolder
+
+THREADS = 8
+
+
+def handle(name):
+    return ModelHandle(tokenizer=object(), model=object(), fingerprint=name, source=name)
+
+
+def test_swap_releases_previous_after_its_last_request():
+    holder = ModelHolder()
+    old, new = handle('old'), handle('new')
+    holder.swap(old)
+
+    with holder.acquire() as pinned:
+        assert pinned is old
+        assert holder.swap(new) is old
+        # Still serving the request that pinned it
+        assert old.retired and not old.released
+        assert pinned.model is not None
+        with holder.acquire() as fresh:
+            assert fresh is new
+    assert old.released and old.model is None
+    assert holder.last_release['source'] == 'old'
+    assert not new.retired
+
+
+def test_swap_releases_idle_previous_at_once():
+    holder = ModelHolder()
+    old = handle('old')
+    holder.swap(old)
+    holder.swap(handle('new'))
+    assert old.released
+    assert holder.swaps == 2
+
+
+def test_acquire_without_model_fails():
+    with pytest.raises(RuntimeError):
+        with ModelHolder().acquire():
+            pass
+
+
+@pytest.fixture
+def loader(monkeypatch):
+    """
+    model_loader with a fresh holder and reload state; load_gate holds each load until set
+    """
+    state = {'loads': 0, 'fail': False}
+    load_gate = threading.Event()
+    load_started = threading.Event()
+
+    def fake_load_and_swap():
+        state['loads'] += 1
+        load_started.set()
+        load_gate.wait(5)
+        if state['fail']:
+            raise RuntimeError('gagal memuat model')
+        model_loader._holder.swap(handle(f"load{state['loads']}"))
+
+    monkeypatch.setattr(model_loader, '_remote', None)
+    monkeypatch.setattr(model_loader, '_holder', ModelHolder())
+    monkeypatch.setattr(model_loader, '_reload_state', {'started': 0, 'finished': 0, 'running': False, 'errors': {}})
+    monkeypatch.setattr(model_loader, '_load_and_swap', fake_load_and_swap)
+    return state, load_gate, load_started
+
+
+def run_concurrently(target, count=THREADS):
+    errors = []
+
+    def call():
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, errors
+
+
+def join(threads):
+    for thread in threads:
+        thread.join(10)
+        assert not thread.is_alive()
+
+
+def test_concurrent_first_loads_load_once(loader):
+    state, load_gate, load_started = loader
+    threads, errors = run_concurrently(model_loader.load_model)
+    assert load_started.wait(5)
+    time.sleep(0.1)
+    load_gate.set()
+    join(threads)
+
+    assert errors == []
+    assert state['loads'] == 1
+    assert model_loader._holder.current.fingerprint == 'load1'
+    # Loaded already: nothing more to do
+    model_loader.load_model()
+    assert state['loads'] == 1
+
+
+def test_concurrent_reloads_load_once(loader):
+    state, load_gate, load_started = loader
+    load_gate.set()
+    model_loader.load_model()
+    load_gate.clear()
+    load_started.clear()
+
+    # One reload is running; everyone asking meanwhile shares a single follow-up reload
+    first, first_errors = run_concurrently(model_loader.reload_model, count=1)
+    assert load_started.wait(5)
+    waiting, errors = run_concurrently(model_loader.reload_model)
+    time.sleep(0.1)
+    load_gate.set()
+    join(first + waiting)
+
+    assert first_errors == errors == []
+    assert state['loads'] == 3  # first load, the running reload and one coalesced follow-up
+    assert model_loader._holder.current.fingerprint == 'load3'
+    assert model_loader._holder.swaps == 3
+
+
+def test_failed_load_reaches_every_waiter(loader):
+    state, load_gate, load_started = loader
+    state['fail'] = True
+    threads, errors = run_concurrently(model_loader.load_model)
+    assert load_started.wait(5)
+    time.sleep(0.1)
+    load_gate.set()
+    join(threads)
+
+    assert state['loads'] == 1
+    assert len(errors) == THREADS
+    assert all(str(e) == 'gagal memuat model' for e in errors)
+    assert model_loader._holder.current is None
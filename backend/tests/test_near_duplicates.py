@@ -0,0 +1,78 @@
+"""
+Near-duplicate clustering invariants, and the near_dedup flag of the
+scrape endpoints (scraper and model call stubbed out).
+Run with: python -m pytest backend/tests/test_near_duplicates.py
+"""
+import importlib
+import random
+
+import pytest
+
+from backend.services.near_duplicates import classify_clustered, cluster_summary, cluster_texts
+
+WORDS = ['bagus', 'jelek', 'mantap', 'kecewa', 'barang', 'cepat', 'lambat', 'sesuai']
+
+
+def test_variants_of_one_comment_share_a_cluster():
+    texts = ['mantap sekali barangnya bagus', 'Mantap sekali barangnya bagus!!! 👍', 'pengiriman lambat sekali kecewa']
+    assert cluster_texts(texts) == [0, 0, 2]
+
+
+def test_texts_without_shingles_stay_apart():
+    assert cluster_texts(['👍👍👍', '😡😡😡', '!!!', 'ok', 'ok']) == [0, 1, 2, 3, 4]
+
+
+def test_every_text_points_at_its_cluster_root():
+    rng = random.Random(0)
+    for _ in range(2000):
+        texts = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(2, 30))]
+        representatives = cluster_texts(texts, threshold=0)
+        for i, representative in enumerate(representatives):
+            assert representative <= i
+            assert representatives[representative] == representative
+
+
+def test_summary_counts_match_the_model_calls():
+    texts = ['mantap sekali barangnya bagus', 'mantap sekali barangnya bagus!!', '👍', '😡']
+    calls = []
+
+    def predict(batch):
+        calls.extend(batch)
+        return [('Positif', 0.9) for _ in batch]
+
+    predictions, representatives = classify_clustered(texts, predict)
+    summary = cluster_summary(texts, predictions, representatives)
+    assert len(calls) == summary['clusters'] == 3
+    assert summary['inferred'] == 1
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # app.py reads its database URI and opens app.log at import: point both at a throwaway directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('SENTIMENT_DATABASE_URI', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('SENTIMENT_EAGER_LOAD', '0')
+    appmod = importlib.import_module('app')
+    appmod.app.config['RATELIMIT_ENABLED'] = False
+    comments = ['mantap sekali barangnya bagus', 'mantap sekali barangnya bagus!!', 'pengiriman lambat kecewa']
+    monkeypatch.setattr(appmod, 'get_youtube_comments', lambda url, limit=20: list(comments))
+    monkeypatch.setattr(appmod, 'predict_sentiment_many', lambda texts, with_stats=False: (
+        [('Positif', 0.9) for _ in texts], appmod.dedup_stats(len(texts), len(set(texts)))))
+    return appmod.app.test_client()
+
+
+@pytest.mark.parametrize('endpoint, body', [
+    ('/api/scrape', {'url': 'https://youtu.be/a'}),
+    ('/api/brand/battle', {'url_a': 'https://youtu.be/a', 'url_b': 'https://youtu.be/b'}),
+])
+def test_near_dedup_flag_must_be_a_boolean(client, endpoint, body):
+    for flag in ('false', 'true', 0, 1, None):
+        response = client.post(endpoint, json={**body, 'near_dedup': flag})
+        assert response.status_code == 400, flag
+        assert 'near_dedup' in response.get_json()['message']
+
+    clustered = client.post(endpoint, json={**body, 'near_dedup': True})
+    plain = client.post(endpoint, json={**body, 'near_dedup': False})
+    assert clustered.status_code == plain.status_code == 200
+    if endpoint == '/api/scrape':
+        assert 'near_duplicates' in clustered.get_json() and 'near_duplicates' not in plain.get_json()
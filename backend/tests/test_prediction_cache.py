@@ -0,0 +1,86 @@
+"""
+PredictionCache eviction, byte budget, TTL and invalidation on model swaps.
+Run with: python -m pytest backend/tests/test_prediction_cache.py
+"""
+import time
+
+from backend.services import model_loader
+from backend.services.model_holder import ModelHolder
+from backend.services.prediction_cache import PredictionCache, make_cache_key
+
+PREDICTION = ('Positif', 0.9)
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = PredictionCache(max_entries=3)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, PREDICTION)
+    assert cache.get('a') == PREDICTION  # 'b' is now the least recently used
+    cache.put('d', PREDICTION)
+
+    assert cache.get('b') is None
+    assert all(cache.get(key) == PREDICTION for key in ('a', 'c', 'd'))
+    assert cache.stats()['evictions'] == 1
+
+
+def test_overwriting_a_key_does_not_evict():
+    cache = PredictionCache(max_entries=2)
+    cache.put('a', PREDICTION)
+    cache.put('b', PREDICTION)
+    cache.put('a', ('Negatif', 0.8))
+    assert cache.get('a') == ('Negatif', 0.8)
+    assert cache.get('b') == PREDICTION
+    assert cache.stats()['evictions'] == 0
+
+
+def test_byte_budget_bounds_the_cache():
+    entry_size = PredictionCache._entry_size(make_cache_key('x', 'fp'), PREDICTION)
+    cache = PredictionCache(max_entries=1000, max_bytes=entry_size * 5)
+    keys = [make_cache_key(f'ulasan {i}', 'fp') for i in range(20)]
+    for key in keys:
+        cache.put(key, PREDICTION)
+
+    stats = cache.stats()
+    assert stats['bytes'] <= entry_size * 5
+    assert stats['entries'] == 5
+    assert stats['evictions'] == 15
+    # The newest entries survive
+    assert all(cache.get(key) == PREDICTION for key in keys[-5:])
+    assert cache.get(keys[0]) is None
+
+
+def test_expired_entries_are_misses():
+    cache = PredictionCache(max_entries=10, ttl_seconds=0.05)
+    cache.put('a', PREDICTION)
+    assert cache.get('a') == PREDICTION
+    time.sleep(0.1)
+    assert cache.get('a') is None
+
+    stats = cache.stats()
+    assert (stats['expirations'], stats['entries'], stats['bytes']) == (1, 0, 0)
+
+
+def test_disabled_cache_stores_nothing():
+    cache = PredictionCache(max_entries=0)
+    cache.put('a', PREDICTION)
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_cache_key_depends_on_model_and_normalized_text():
+    assert make_cache_key('barang  bagus ', 'model-a') == make_cache_key('barang bagus', 'model-a')
+    assert make_cache_key('barang bagus', 'model-a') != make_cache_key('barang bagus', 'model-b')
+
+
+def test_model_swap_invalidates_cached_predictions(monkeypatch):
+    cache = PredictionCache(max_entries=10)
+    monkeypatch.setattr(model_loader, '_cache', cache)
+    monkeypatch.setattr(model_loader, '_holder', ModelHolder())
+
+    model_loader._swap_model(object(), object(), 'model-lama')
+    old_fingerprint = model_loader.get_model_fingerprint()
+    cache.put(make_cache_key('barang bagus', old_fingerprint), PREDICTION)
+
+    model_loader._swap_model(object(), object(), 'model-baru')
+    assert cache.stats()['entries'] == 0
+    assert model_loader.get_model_fingerprint() != old_fingerprint
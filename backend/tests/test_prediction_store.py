@@ -0,0 +1,59 @@
+"""
+PredictionStore row bookkeeping and eviction.
+Run with: python -m pytest backend/tests/test_prediction_store.py
+"""
+import pytest
+
+from backend.services.prediction_store import PredictionStore
+
+PREDICTION = ('Positif', 0.9)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PredictionStore(str(tmp_path / 'store.db'), max_rows=100, flush_rows=10, flush_interval=3600)
+    yield store
+    store.close()
+
+
+def count_calls(store, monkeypatch):
+    calls = []
+    original = store._count_rows
+
+    def counting():
+        calls.append(1)
+        return original()
+
+    monkeypatch.setattr(store, '_count_rows', counting)
+    return calls
+
+
+def test_rows_are_stored_and_read_back(store):
+    store.put_many('fp', [(f'k{i}', PREDICTION) for i in range(5)])
+    store.flush()
+    assert store.get_many(['k0', 'k4', 'missing']) == {'k0': PREDICTION, 'k4': PREDICTION}
+
+
+def test_stats_and_small_flushes_do_not_count_the_table(store, monkeypatch):
+    calls = count_calls(store, monkeypatch)
+    for batch in range(5):
+        store.put_many('fp', [(f'k{batch}-{i}', PREDICTION) for i in range(10)])
+    stats = store.stats()
+    assert calls == []
+    assert stats['rows'] == 50
+
+
+def test_store_is_evicted_below_its_cap(store, monkeypatch):
+    calls = count_calls(store, monkeypatch)
+    for batch in range(30):
+        store.put_many('fp', [(f'k{batch}-{i}', PREDICTION) for i in range(10)])
+    store.flush()
+
+    rows = store._conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+    assert rows <= 100
+    assert store.stats()['rows'] >= rows
+    assert store.stats()['evictions'] == 300 - rows
+    # An exact count only when the estimate crossed the cap, not on every flush
+    assert 0 < len(calls) < 30
+    # The most recent rows survive
+    assert store.get_many(['k29-9']) == {'k29-9': PREDICTION}
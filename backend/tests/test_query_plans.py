@@ -0,0 +1,222 @@
+"""
+Query-plan regression suite for the hot database queries.
+
+Builds a seeded SQLite database twice -- once with db.create_all() (indexes
+from the models) and once from tables stripped of their indexes -- upgrades
+both with backend/scripts/migrate_indexes.py and runs EXPLAIN QUERY PLAN for the
+query behind each endpoint. Endpoint queries come from the same ORM query
+builders the routes use, compiled for SQLite with their parameters inlined. A query that falls back to a full table scan,
+or sorts in a temp b-tree where the index should give the order, fails.
+Run with: python -m pytest backend/tests/test_query_plans.py
+"""
+import random
+import re
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+
+from backend.extensions import db
+from backend.models import models  # noqa: F401  (registers the tables on db.metadata)
+from backend.routes.jobs import export_range_query, job_results_query, user_jobs_query
+from backend.scripts.migrate_indexes import MIGRATIONS, migrate
+from backend.services.history_writer import history_query
+from backend.services.jobs import pending_jobs_query
+from backend.services.stats_rollups import SENTIMENT, totals_query, trend_query
+from backend.services.term_index import ALL_SENTIMENTS, top_terms_query
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?P<table>\w+)( AS \w+)?$')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY')
+
+SAVED_YOUTUBE_DDL = '''
+CREATE TABLE IF NOT EXISTS saved_youtube_analysis (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    label VARCHAR(255),
+    video_url TEXT NOT NULL,
+    analysis_data TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+# name -> (builder of the endpoint's ORM query, whether the ORDER BY must come from an index).
+# The builders are the ones the routes call, so the checked SQL is the SQL they run.
+ORM_QUERIES = {
+    'history_page': (lambda: history_query(7).limit(10).offset(20), True),
+    'history_count': (lambda: count_of(history_query(7)), False),
+    'stats_summary': (lambda: totals_query(7, SENTIMENT), False),
+    'stats_trend': (lambda: trend_query(7, date(2024, 1, 1), SENTIMENT), False),
+    'wordcloud': (lambda: top_terms_query(7, ALL_SENTIMENTS, 50), True),
+    'jobs_list': (lambda: user_jobs_query(7, 20), True),
+    'jobs_resume': (lambda: pending_jobs_query(), True),
+    'job_results_page': (lambda: job_results_query('job3').offset(200).limit(100), True),
+    'job_results_by_sentiment': (lambda: job_results_query('job3', 'Negatif').limit(100), True),
+    'job_results_count': (lambda: count_of(job_results_query('job3', 'Negatif')), False),
+    'job_export_range': (lambda: export_range_query('job3', 0, 4999), False),
+}
+
+# name -> (raw SQL, parameters, whether the ORDER BY must come from an index), for queries
+# written as SQL text in app.py and the scripts, and lookups the indexes exist for
+RAW_QUERIES = {
+    'user_sentiment_count': ('SELECT count(*) FROM analyses WHERE user_id = ? AND sentiment = ?',
+                             (7, 'Positif'), False),
+    'user_corrections': ('SELECT id, correction FROM analyses WHERE user_id = ? AND correction IS NOT NULL',
+                         (7,), False),
+    'training_data': ('SELECT text, correction FROM analyses WHERE correction IS NOT NULL', (), False),
+    'feedback_lookup': ('SELECT * FROM analyses WHERE id = ?', (42,), False),
+    'saved_youtube_user': ('SELECT id, label, video_url, created_at FROM saved_youtube_analysis '
+                           'WHERE user_id = ? ORDER BY created_at DESC LIMIT 10', (7,), True),
+    'saved_youtube_anonymous': ('SELECT id, label, video_url, created_at FROM saved_youtube_analysis '
+                                'WHERE user_id IS NULL ORDER BY created_at DESC LIMIT 10', (), True),
+}
+
+
+def count_of(query):
+    """
+    Returns: the SELECT count(*) Query.count() and paginate() run for query
+    """
+    return select(func.count()).select_from(query.order_by(None).subquery())
+
+
+@pytest.fixture(scope='module')
+def orm_sql():
+    """
+    Returns: dict of name -> SQL of each ORM_QUERIES entry, compiled for SQLite with its parameters inlined
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        compiled = {}
+        for name, (build, _) in ORM_QUERIES.items():
+            statement = build()
+            statement = getattr(statement, 'statement', statement)
+            compiled[name] = str(statement.compile(dialect=sqlite_dialect.dialect(),
+                                                   compile_kwargs={'literal_binds': True}))
+        db.engine.dispose()
+    return compiled
+
+
+def seed(path):
+    rng = random.Random(0)
+    now = datetime(2024, 6, 1)
+    labels = ('Positif', 'Negatif', 'Netral')
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany('INSERT INTO users (id, username, email, password_hash, created_at) VALUES (?, ?, ?, ?, ?)',
+                         [(i, f'user{i}', f'user{i}@example.com', 'x', now) for i in range(1, 51)])
+        conn.executemany(
+            'INSERT INTO analyses (user_id, text, sentiment, confidence, correction, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            [(rng.randint(1, 50), f'ulasan {i}', rng.choice(labels), 0.9,
+              rng.choice(labels) if rng.random() < 0.05 else None,
+              (now - timedelta(minutes=rng.randint(0, 525600))).isoformat(' '))
+             for i in range(20000)])
+        conn.executemany('INSERT INTO term_frequencies (user_id, sentiment, term, count) VALUES (?, ?, ?, ?)',
+                         [(user, sentiment, f'kata{t}', rng.randint(1, 500))
+                          for user in range(1, 51) for sentiment in ('ALL',) + labels for t in range(100)])
+        conn.executemany('INSERT INTO sentiment_totals (user_id, kind, label, count) VALUES (?, ?, ?, ?)',
+                         [(user, kind, label, rng.randint(0, 400))
+                          for user in range(1, 51) for kind in ('sentiment', 'correction') for label in labels])
+        conn.executemany('INSERT INTO daily_sentiment_counts (user_id, kind, day, label, count) VALUES (?, ?, ?, ?, ?)',
+                         [(user, 'sentiment', (now - timedelta(days=d)).strftime('%Y-%m-%d'), label, 1)
+                          for user in range(1, 51) for d in range(365) for label in labels])
+        conn.executemany(
+            'INSERT INTO batch_jobs (id, user_id, filename, file_path, status, rows_done, results_count, created_at, '
+            'heartbeat_at, run_rows, run_seconds) VALUES (?, ?, ?, ?, ?, 0, 0, ?, ?, 0, 0)',
+            [(f'job{i}', rng.randint(1, 50), 'a.csv', 'a.csv', rng.choice(('completed', 'failed', 'cancelled')),
+              now - timedelta(hours=i), now - timedelta(hours=i)) for i in range(500)])
+        conn.executemany(
+            'INSERT INTO batch_job_results (job_id, row_index, text, sentiment, confidence) VALUES (?, ?, ?, ?, ?)',
+            [(f'job{j}', row, f'ulasan {row}', rng.choice(labels), 0.9) for j in range(20) for row in range(2000)])
+        conn.executemany('INSERT INTO saved_youtube_analysis (user_id, label, video_url, analysis_data, created_at) '
+                         'VALUES (?, ?, ?, ?, ?)',
+                         [(rng.choice((None, rng.randint(1, 50))), 'video', 'https://youtu.be/x', '{}',
+                           now - timedelta(hours=i)) for i in range(2000)])
+        conn.execute('ANALYZE')
+    conn.close()
+
+
+def build_schema(path, migrated):
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(SAVED_YOUTUBE_DDL)
+        if migrated:
+            # Start from tables without the declared indexes, like a database created before they existed
+            names = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")]
+            for name in names:
+                conn.execute(f'DROP INDEX {name}')
+    conn.close()
+
+    # saved_youtube_analysis is not a model, so its index only ever comes from the migration
+    assert migrate(str(path)) == LATEST_VERSION
+
+
+@pytest.fixture(scope='module', params=['create_all', 'migrated'])
+def database(request, tmp_path_factory):
+    path = tmp_path_factory.mktemp(request.param) / 'plans.db'
+    build_schema(path, migrated=request.param == 'migrated')
+    seed(path)
+    conn = sqlite3.connect(path)
+    yield conn
+    conn.close()
+
+
+def query_plan(conn, sql, params):
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def assert_uses_index(name, plan, ordered):
+    scans = [detail for detail in plan if FULL_SCAN.match(detail)]
+    assert not scans, f"{name} falls back to a full table scan: {plan}"
+    if ordered:
+        assert not any(TEMP_SORT.search(detail) for detail in plan), f"{name} sorts outside the index: {plan}"
+
+
+@pytest.mark.parametrize('name', sorted(ORM_QUERIES))
+def test_endpoint_query_uses_an_index(database, orm_sql, name):
+    assert_uses_index(name, query_plan(database, orm_sql[name], ()), ORM_QUERIES[name][1])
+
+
+@pytest.mark.parametrize('name', sorted(RAW_QUERIES))
+def test_raw_query_uses_an_index(database, name):
+    sql, params, ordered = RAW_QUERIES[name]
+    assert_uses_index(name, query_plan(database, sql, params), ordered)
+
+
+def test_migration_is_idempotent(tmp_path):
+    path = tmp_path / 'fresh.db'
+    build_schema(path, migrated=True)
+    assert migrate(str(path)) == LATEST_VERSION
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == LATEST_VERSION
+    finally:
+        conn.close()
+
+
+def test_migration_adds_batch_job_owner(tmp_path):
+    path = tmp_path / 'old.db'
+    conn = sqlite3.connect(path)
+    with conn:
+        # batch_jobs as created before the owner column existed
+        conn.execute('CREATE TABLE batch_jobs (id VARCHAR(32) PRIMARY KEY, status VARCHAR(20), created_at DATETIME, '
+                     'heartbeat_at DATETIME)')
+        conn.execute('PRAGMA user_version = 1')
+    conn.close()
+
+    assert migrate(str(path)) == LATEST_VERSION
+    conn = sqlite3.connect(path)
+    try:
+        assert 'owner' in {row[1] for row in conn.execute('PRAGMA table_info(batch_jobs)')}
+    finally:
+        conn.close()
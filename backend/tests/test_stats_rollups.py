@@ -0,0 +1,118 @@
+"""
+Stats rollup listeners (insert, correction and sentiment changes, delete)
+and the startup backfill of empty rollups.
+Run with: python -m pytest backend/tests/test_stats_rollups.py
+"""
+from datetime import date, datetime
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+from backend.extensions import db
+from backend.models.models import Analysis, DailySentimentCount, SentimentTotal, User
+from backend.services import stats_rollups
+from backend.services.stats_rollups import CORRECTION, user_totals, user_trend
+
+CREATED = datetime(2024, 6, 3, 10, 30)
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'rollups.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(id=user_id, username=f'pengguna{user_id}', email=f'pengguna{user_id}@example.com',
+                                 password_hash='x') for user_id in (1, 2)])
+        db.session.commit()
+        yield app
+        db.engine.dispose()
+
+
+def add(user_id, sentiment, correction=None, created_at=CREATED):
+    analysis = Analysis(user_id=user_id, text='barangnya bagus', sentiment=sentiment, correction=correction,
+                        created_at=created_at)
+    db.session.add(analysis)
+    db.session.commit()
+    return analysis
+
+
+def rollup_rows():
+    totals = {(row.user_id, row.kind, row.label): row.count for row in SentimentTotal.query.all() if row.count}
+    daily = {(row.user_id, row.kind, row.day, row.label): row.count
+             for row in DailySentimentCount.query.all() if row.count}
+    return totals, daily
+
+
+def test_insert_counts_total_and_day(app):
+    add(1, 'Positif')
+    add(1, 'Positif')
+    add(1, 'Negatif', correction='Netral')
+    add(2, 'Netral')
+
+    assert user_totals(1) == {'Positif': 2, 'Negatif': 1}
+    assert user_totals(1, kind=CORRECTION) == {'Netral': 1}
+    assert user_totals(2) == {'Netral': 1}
+    dates, counts = user_trend(1, days=2, today=date(2024, 6, 4))
+    assert dates == ['2024-06-03', '2024-06-04']
+    assert counts == {'2024-06-03': {'Positif': 2, 'Negatif': 1}, '2024-06-04': {}}
+
+
+def test_correction_update_moves_the_count(app):
+    analysis = add(1, 'Negatif')
+    analysis.correction = 'Positif'
+    db.session.commit()
+    assert user_totals(1, kind=CORRECTION) == {'Positif': 1}
+
+    analysis.correction = 'Netral'
+    db.session.commit()
+    assert user_totals(1, kind=CORRECTION) == {'Netral': 1}
+    # The predicted sentiment is left alone
+    assert user_totals(1) == {'Negatif': 1}
+    # Counted on the day of the analysis, not of the feedback
+    _, daily = rollup_rows()
+    assert daily[(1, CORRECTION, '2024-06-03', 'Netral')] == 1
+
+
+def test_sentiment_and_owner_changes_move_the_count(app):
+    analysis = add(1, 'Negatif')
+    analysis.sentiment = 'Positif'
+    analysis.user_id = 2
+    db.session.commit()
+    assert user_totals(1) == {}
+    assert user_totals(2) == {'Positif': 1}
+
+
+def test_delete_uncounts(app):
+    add(1, 'Positif')
+    gone = add(1, 'Negatif', correction='Netral')
+    db.session.delete(gone)
+    db.session.commit()
+
+    assert user_totals(1) == {'Positif': 1}
+    assert user_totals(1, kind=CORRECTION) == {}
+
+
+def test_backfill_matches_the_listeners(app):
+    add(1, 'Positif')
+    add(1, 'Negatif', correction='Positif')
+    add(1, 'Netral', created_at=datetime(2024, 6, 1))
+    add(2, 'Positif')
+    expected = rollup_rows()
+
+    # As on a database from before the rollups existed
+    with db.engine.begin() as connection:
+        connection.execute(text('DELETE FROM sentiment_totals'))
+        connection.execute(text('DELETE FROM daily_sentiment_counts'))
+    assert stats_rollups.backfill_if_empty(db.engine)
+    assert rollup_rows() == expected
+    # Filled already: a second call (e.g. another worker starting) adds nothing
+    assert not stats_rollups.backfill_if_empty(db.engine)
+    assert rollup_rows() == expected
+
+
+def test_backfill_skips_an_empty_database(app):
+    assert not stats_rollups.backfill_if_empty(db.engine)
+    assert rollup_rows() == ({}, {})
@@ -0,0 +1,94 @@
+"""
+Term index listeners (insert, text and sentiment changes, delete) and the
+startup backfill of an empty index.
+Run with: python -m pytest backend/tests/test_term_index.py
+"""
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+from backend.extensions import db
+from backend.models.models import Analysis, TermFrequency, User
+from backend.services import term_index
+from backend.services.term_index import ALL_SENTIMENTS, top_terms
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'terms.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(id=user_id, username=f'pengguna{user_id}', email=f'pengguna{user_id}@example.com',
+                                 password_hash='x') for user_id in (1, 2)])
+        db.session.commit()
+        yield app
+        db.engine.dispose()
+
+
+def add(user_id, sentiment, text_value):
+    analysis = Analysis(user_id=user_id, text=text_value, sentiment=sentiment)
+    db.session.add(analysis)
+    db.session.commit()
+    return analysis
+
+
+def index_rows():
+    return {(row.user_id, row.sentiment, row.term): row.count for row in TermFrequency.query.all()}
+
+
+def test_insert_indexes_terms_per_sentiment_and_overall(app):
+    add(1, 'Positif', 'Barang bagus, pengiriman cepat. Bagus!')
+    add(1, 'Negatif', 'pengiriman lambat')
+    add(2, 'Positif', 'bagus sekali')
+
+    assert dict(top_terms(1)) == {'bagus': 2, 'pengiriman': 2, 'barang': 1, 'cepat': 1, 'lambat': 1}
+    assert dict(top_terms(1, 'Negatif')) == {'pengiriman': 1, 'lambat': 1}
+    # Stopwords and words under MIN_TERM_LENGTH are left out
+    assert dict(top_terms(2)) == {'bagus': 1, 'sekali': 1}
+
+
+def test_text_and_sentiment_updates_move_the_terms(app):
+    analysis = add(1, 'Positif', 'barang bagus')
+    analysis.text = 'barang rusak'
+    db.session.commit()
+    assert dict(top_terms(1)) == {'barang': 1, 'rusak': 1}
+
+    analysis.sentiment = 'Negatif'
+    db.session.commit()
+    assert dict(top_terms(1, 'Positif')) == {}
+    assert dict(top_terms(1, 'Negatif')) == {'barang': 1, 'rusak': 1}
+
+
+def test_delete_unindexes_and_prunes(app):
+    add(1, 'Positif', 'barang bagus')
+    gone = add(1, 'Positif', 'barang murah')
+    db.session.delete(gone)
+    db.session.commit()
+
+    assert dict(top_terms(1)) == {'barang': 1, 'bagus': 1}
+    # Terms that dropped to zero are removed, not kept at count 0
+    assert all(count > 0 for count in index_rows().values())
+    assert (1, ALL_SENTIMENTS, 'murah') not in index_rows()
+
+
+def test_backfill_matches_the_listeners(app):
+    add(1, 'Positif', 'barang bagus, pengiriman cepat')
+    add(1, 'Negatif', 'pengiriman lambat sekali')
+    add(2, 'Netral', 'barang sesuai deskripsi')
+    expected = index_rows()
+
+    # As on a database from before the index existed
+    with db.engine.begin() as connection:
+        connection.execute(text('DELETE FROM term_frequencies'))
+    assert term_index.backfill_if_empty(db.engine, chunk_size=2)
+    assert index_rows() == expected
+    # Filled already: a second call (e.g. another worker starting) adds nothing
+    assert not term_index.backfill_if_empty(db.engine)
+    assert index_rows() == expected
+
+
+def test_backfill_skips_an_empty_database(app):
+    assert not term_index.backfill_if_empty(db.engine)
+    assert index_rows() == {}